@@ -4,9 +4,11 @@ import os
 from typing import Any
 
 import dotenv
+import httpx
 import toml
 
-from src import TelegramBot
+from src import TelegramBot, api_client
+from src.rate_limiter import RateLimiter
 
 dotenv.load_dotenv()
 
@@ -26,15 +28,49 @@ def main() -> None:
     with open(config_file) as f:
         configs = toml.load(f)
     bot_configs = configs.get("simulacra", [])
+    pool_config = configs.get("connection_pool", {})
+    rate_config = configs.get("rate_limits")
 
     if IS_DEVELOPMENT:
-        _run_bot(bot_configs[0])
+        limiter = RateLimiter(**rate_config) if rate_config else None
+        _run_bot(bot_configs[0], pool_config, limiter)
     else:
-        for bot_config in bot_configs:
-            multiprocessing.Process(target=_run_bot, args=(bot_config,)).start()
-
-
-def _run_bot(bot_config: dict[str, Any]) -> None:
+        _run_bots(bot_configs, pool_config, rate_config)
+
+
+def _run_bots(
+    bot_configs: list[dict[str, Any]],
+    pool_config: dict[str, Any],
+    rate_config: dict[str, Any] | None,
+) -> None:
+    # Bot processes share rate limit state through a manager process, which
+    # must outlive them
+    with multiprocessing.Manager() as manager:
+        limiter = None
+        if rate_config:
+            limiter = RateLimiter(
+                **rate_config, state=manager.dict(), lock=manager.Lock()
+            )
+        processes = [
+            multiprocessing.Process(
+                target=_run_bot, args=(bot_config, pool_config, limiter)
+            )
+            for bot_config in bot_configs
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+
+def _run_bot(
+    bot_config: dict[str, Any],
+    pool_config: dict[str, Any],
+    limiter: RateLimiter | None,
+) -> None:
+    if pool_config:
+        api_client.configure_pool(httpx.Limits(**pool_config))
+    api_client.configure_rate_limits(limiter)
     TelegramBot(
         bot_config["context_filepath"],
         bot_config["telegram_token"],
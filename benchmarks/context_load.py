@@ -0,0 +1,79 @@
+"""Time reloading a context with a long conversation, as most commands do, when
+nothing has changed, after the context saves it, and after it is edited
+elsewhere.
+
+Usage: uv run python -m benchmarks.context_load [messages]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from src.context import Context
+from src.yaml_config import yaml
+
+PARAGRAPH = "She paused at the window, considering the rain. " * 8
+
+
+def write_context(directory: str, count: int) -> str:
+    os.makedirs(f"{directory}/conversations")
+    with open(f"{directory}/bench.yml", "w") as f:
+        yaml.dump(
+            {
+                "character_name": "Bench",
+                "api_params": {"model": "anthropic/claude"},
+                "system_prompt": "You are {{ character_name }}.\n" * 50,
+            },
+            f,
+        )
+    with open(f"{directory}/bench.state.yml", "w") as f:
+        yaml.dump({"conversation_file": "file://./conversations/bench_0.yml"}, f)
+    roles = ["user", "assistant"]
+    messages = [
+        {"role": roles[i % 2], "content": f"{PARAGRAPH}\n\nTurn {i}."}
+        for i in range(count)
+    ]
+    with open(f"{directory}/conversations/bench_0.yml", "w") as f:
+        yaml.dump({"created_at": "2024-01-01", "cost": 0.0, "messages": messages}, f)
+    return f"{directory}/bench.yml"
+
+
+def time_load(
+    context: Context, runs: int, save: bool = False, touch: str | None = None
+) -> float:
+    """Average CPU time per load, after saving or appending to a file before each."""
+    total = 0.0
+    for _ in range(runs):
+        if save:
+            context.save()
+        if touch:
+            with open(touch, "a") as f:
+                f.write("\n")
+        started = time.process_time()
+        context.load()
+        total += time.process_time() - started
+    return total / runs
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_context(directory, count)
+        conversation = f"{directory}/conversations/bench_0.yml"
+        size = os.path.getsize(conversation) / 1e6
+        started = time.process_time()
+        context = Context(path)
+        first = time.process_time() - started
+        unchanged = time_load(context, 20)
+        saved = time_load(context, 3, save=True)
+        edited = time_load(context, 3, touch=conversation)
+    print(f"{count} messages, {size:.1f} MB conversation")
+    print(f"First load: {first * 1000:.1f} ms")
+    print(f"Unchanged:  {unchanged * 1000:.2f} ms per load")
+    print(f"Saved:      {saved * 1000:.2f} ms per load")
+    print(f"Edited:     {edited * 1000:.1f} ms per load")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""A local stand-in for the OpenRouter chat completions API.
+
+Usage: uv run python -m benchmarks.fake_openrouter [--port 8765] [options]
+
+Point the bot at it with OPENROUTER_API_URL=http://127.0.0.1:8765/
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+@dataclass
+class FakeOptions:
+    latency: float = 0.5  # Seconds before the first token
+    tokens_per_second: float = 50.0
+    completion_tokens: int = 100
+    cost_per_token: float = 1e-6
+    error_rate: float = 0.0  # Fraction of requests that fail
+    error_status: int = 503
+    retry_after: float = 0.0
+
+
+class FakeOpenRouter:
+    """Serves completions with configurable latency, token rate and errors."""
+
+    def __init__(
+        self, options: FakeOptions, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        self.options = options
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self  # type: ignore[attr-defined]
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}/"
+
+    def start(self) -> str:
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def usage(self, body: bytes) -> dict[str, Any]:
+        prompt_tokens = len(body) // 4
+        completion_tokens = self.options.completion_tokens
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cost": (prompt_tokens + completion_tokens) * self.options.cost_per_token,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: ThreadingHTTPServer
+
+    def do_POST(self) -> None:
+        fake: FakeOpenRouter = self.server.fake  # type: ignore[attr-defined]
+        options = fake.options
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        request = json.loads(body)
+        if random.random() < options.error_rate:
+            self._send_error(options)
+        elif request.get("stream"):
+            self._send_stream(request, fake.usage(body), options)
+        else:
+            self._send_completion(request, fake.usage(body), options)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_error(self, options: FakeOptions) -> None:
+        error = {"error": {"message": "Injected error", "code": options.error_status}}
+        self.send_response(options.error_status)
+        self.send_header("Retry-After", str(options.retry_after))
+        self._send_json(error)
+
+    def _send_completion(
+        self, request: dict[str, Any], usage: dict[str, Any], options: FakeOptions
+    ) -> None:
+        time.sleep(
+            options.latency + options.completion_tokens / options.tokens_per_second
+        )
+        self.send_response(200)
+        self._send_json(
+            {
+                **_metadata(request),
+                "choices": [
+                    {
+                        "message": {"role": "assistant", "content": _text(options)},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    def _send_stream(
+        self, request: dict[str, Any], usage: dict[str, Any], options: FakeOptions
+    ) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._write_chunk(b": OPENROUTER PROCESSING\n\n")
+        time.sleep(options.latency)
+        for i in range(options.completion_tokens):
+            delta = {"content": f"word{i} "}
+            self._write_event({**_metadata(request), "choices": [{"delta": delta}]})
+            time.sleep(1 / options.tokens_per_second)
+        finish = {"delta": {}, "finish_reason": "stop"}
+        self._write_event({**_metadata(request), "choices": [finish]})
+        self._write_event({**_metadata(request), "choices": [], "usage": usage})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _send_json(self, data: dict[str, Any]) -> None:
+        content = json.dumps(data).encode()
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _write_event(self, data: dict[str, Any]) -> None:
+        self._write_chunk(f"data: {json.dumps(data)}\n\n".encode())
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def _metadata(request: dict[str, Any]) -> dict[str, Any]:
+    return {"id": "gen-fake", "model": request.get("model"), "provider": "Fake"}
+
+
+def _text(options: FakeOptions) -> str:
+    return "".join(f"word{i} " for i in range(options.completion_tokens)).strip()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = FakeOptions()
+    parser.add_argument("--latency", type=float, default=defaults.latency)
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=defaults.tokens_per_second
+    )
+    parser.add_argument(
+        "--completion-tokens", type=int, default=defaults.completion_tokens
+    )
+    parser.add_argument("--cost-per-token", type=float, default=defaults.cost_per_token)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+
+
+def options_from_args(args: argparse.Namespace) -> FakeOptions:
+    return FakeOptions(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        cost_per_token=args.cost_per_token,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = FakeOpenRouter(options_from_args(args), port=args.port)
+    print(f"Serving fake OpenRouter at {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
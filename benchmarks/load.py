@@ -0,0 +1,150 @@
+"""Run simulated bots through scripted conversations against the fake server.
+
+Usage: uv run python -m benchmarks.load [--bots 10] [--turns 5] [--stream]
+
+The fake OpenRouter server runs in a separate process, so CPU time is the
+client's alone. Pass --url to use a server that is already running.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import tempfile
+import time
+
+from src import api_client
+from src.simulacrum import Simulacrum
+from src.yaml_config import yaml
+
+from .fake_openrouter import (
+    FakeOpenRouter,
+    FakeOptions,
+    add_arguments,
+    options_from_args,
+)
+
+SCRIPT = [
+    "Hello there, how are you today?",
+    "Tell me something about where you grew up.",
+    "What did you do after that?",
+    "That sounds difficult. How did it change you?",
+    "What are you looking forward to?",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bots", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--url", help="Use an already running server")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        server, url = _start_server(options_from_args(args))
+    try:
+        asyncio.run(_run(args, url))
+    finally:
+        if server:
+            server.terminate()
+
+
+async def _run(args: argparse.Namespace, url: str) -> None:
+    api_client.API_URL = url
+    latencies: list[float] = []
+    errors: list[Exception] = []
+    with tempfile.TemporaryDirectory() as directory:
+        sims = [Simulacrum(_write_context(directory, i)) for i in range(args.bots)]
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        await asyncio.gather(
+            *(
+                _converse(sim, args.turns, args.stream, latencies, errors)
+                for sim in sims
+            )
+        )
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        await api_client.close_client()
+
+    turns = len(latencies)
+    mode = "streamed" if args.stream else "whole"
+    print(f"{args.bots} bots x {args.turns} turns, {mode}")
+    print(f"Turns:        {turns} ok, {len(errors)} failed in {wall:.2f}s")
+    print(f"Throughput:   {turns / wall:.1f} turns/s")
+    if turns:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        print(f"Latency p50:  {cuts[49] * 1000:.0f} ms")
+        print(f"Latency p95:  {cuts[94] * 1000:.0f} ms")
+        print(f"Latency p99:  {cuts[98] * 1000:.0f} ms")
+        print(f"CPU per turn: {cpu / turns * 1000:.1f} ms")
+    for error in errors[:5]:
+        print(f"Error: {error!r}")
+
+
+async def _converse(
+    sim: Simulacrum,
+    turns: int,
+    stream: bool,
+    latencies: list[float],
+    errors: list[Exception],
+) -> None:
+    for turn in range(turns):
+        text = SCRIPT[turn % len(SCRIPT)]
+        started = time.perf_counter()
+        try:
+            if stream:
+                async for _ in sim.chat_stream(text, None, None):
+                    pass
+            else:
+                await sim.chat(text, None, None)
+        except Exception as e:
+            errors.append(e)
+        else:
+            latencies.append(time.perf_counter() - started)
+
+
+def _write_context(directory: str, index: int) -> str:
+    bot_dir = os.path.join(directory, f"bot{index}")
+    os.makedirs(bot_dir)
+    path = os.path.join(bot_dir, f"bot{index}.yml")
+    context = {
+        "character_name": f"Bot {index}",
+        "api_params": {"model": "fake/model", "max_tokens": 1000},
+        "system_prompt": "You are {{ character_name }}, a load test character.",
+    }
+    with open(path, "w") as file:
+        yaml.dump(context, file)
+    return path
+
+
+def _start_server(options: FakeOptions) -> tuple[multiprocessing.Process, str]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = multiprocessing.Process(target=_serve, args=(options, port), daemon=True)
+    server.start()
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}/"
+
+
+def _serve(options: FakeOptions, port: int) -> None:
+    FakeOpenRouter(options, port=port).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compare building a long conversation through the YAML template, natively,
+and natively with messages from the previous turn reused.
+
+Usage: uv run python -m benchmarks.message_builder [messages]
+"""
+
+import sys
+import time
+from unittest.mock import MagicMock
+
+from src.lm_executors import chat_executor
+from src.lm_executors.chat_executor import ChatExecutor
+from src.message import Message
+
+PARAGRAPH = "She paused at the window, considering the rain. " * 8
+
+
+def make_executor(count: int, template: str | None) -> ChatExecutor:
+    roles = ["user", "assistant"]
+    messages = [
+        Message(
+            roles[i % 2],
+            f"{PARAGRAPH}\n\nTurn {i}.",
+            image=f"{i}.jpg" if i % 20 == 0 else None,
+        )
+        for i in range(count)
+    ]
+    context = MagicMock()
+    context.resolved_data = {
+        "system_prompt": "You are a test.\n" * 50,
+        "api_params": {"model": "anthropic/claude"},
+    }
+    context.api_params = context.resolved_data["api_params"]
+    context.conversation_messages = messages
+    context.message_template = template
+    return ChatExecutor(context)
+
+
+def time_build(executor: ChatExecutor, runs: int, cached: bool = False) -> float:
+    """Average CPU time to build, adding a message to the history each turn."""
+
+    def load_base64(path: str) -> str:
+        return f"@attachment:{path}@"
+
+    messages = executor.context.conversation_messages
+    executor._build_messages(load_base64)  # type: ignore[arg-type]
+    total = 0.0
+    for i in range(runs):
+        messages.append(Message("user", f"{PARAGRAPH}\n\nNew turn {i}."))
+        if not cached:
+            chat_executor._message_caches.clear()
+        started = time.process_time()
+        executor._build_messages(load_base64)  # type: ignore[arg-type]
+        total += time.process_time() - started
+    return total / runs
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    template = time_build(make_executor(count, ChatExecutor.TEMPLATE_PATH), 3)
+    native = time_build(make_executor(count, None), 20)
+    cached = time_build(make_executor(count, None), 20, cached=True)
+    print(f"{count} messages")
+    print(f"Template:    {template * 1000:.1f} ms per build")
+    print(f"Native:      {native * 1000:.2f} ms per build ({template / native:.0f}x)")
+    print(f"Incremental: {cached * 1000:.2f} ms per build ({template / cached:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Measure building and encoding a chat request with several images.
+
+Usage: uv run python -m benchmarks.request_body [images] [image_kb]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import MagicMock
+
+from src.lm_executors.chat_executor import ChatExecutor
+from src.message import Message
+
+
+def make_context(images_dir: str, images: int) -> MagicMock:
+    messages = []
+    for i in range(images):
+        messages += [
+            Message("user", f"Look at this {i}", image=f"{i}.jpg"),
+            Message("assistant", f"Nice picture {i}"),
+        ]
+    context = MagicMock()
+    context.images_dir = images_dir
+    context.conversation_messages = messages
+    context.resolved_data = {
+        "system_prompt": "You are a test.",
+        "api_params": {"model": "anthropic/claude"},
+    }
+    context.api_params = {"model": "anthropic/claude"}
+    context.message_template = None
+    return context
+
+
+def encode(executor: ChatExecutor) -> bytes:
+    """Build the body and encode it the way it is sent."""
+    return executor._build_body(None).encode()
+
+
+def main() -> None:
+    images = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    image_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    with tempfile.TemporaryDirectory() as images_dir:
+        for i in range(images):
+            with open(os.path.join(images_dir, f"{i}.jpg"), "wb") as file:
+                file.write(os.urandom(image_kb * 1024))
+        executor = ChatExecutor(make_context(images_dir, images))
+
+        encode(executor)  # Warm up
+        runs = 10
+        cpu = time.process_time()
+        for _ in range(runs):
+            size = len(encode(executor))
+        cpu = (time.process_time() - cpu) / runs
+
+        tracemalloc.start()
+        encode(executor)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(f"{images} images x {image_kb} KB, body {size / 1e6:.1f} MB")
+    print(f"CPU per turn:  {cpu * 1000:.1f} ms")
+    print(f"Peak memory:   {peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
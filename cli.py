@@ -4,6 +4,7 @@ import sys
 
 import dotenv
 
+from src import api_client
 from src.context import Context
 from src.simulacrum import Simulacrum
 from src.utilities import parse_value
@@ -25,6 +26,13 @@ def _parse_overrides(items: list[str]) -> dict:
     return overrides
 
 
+async def _chat(sim: Simulacrum, prompt: str) -> str:
+    try:
+        return await sim.chat(prompt, None, None)
+    finally:
+        await api_client.close_client()
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Get a single response from a character"
@@ -63,7 +71,7 @@ def main() -> None:
     if not prompt:
         parser.error("No prompt provided")
     sim = Simulacrum(args.context_file, ephemeral=True, overrides=overrides)
-    response = asyncio.run(sim.chat(prompt, None, None))
+    response = asyncio.run(_chat(sim, prompt))
     if args.keep_tags:
         response = sim.context.conversation_messages[-1].content or ""
     print(response)
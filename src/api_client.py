@@ -1,27 +1,453 @@
+import asyncio
+import codecs
+import hashlib
+import json
 import os
+import time
+import weakref
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager, nullcontext
+from dataclasses import dataclass
 from typing import Any
 
-import backoff
 import httpx
 
-API_URL = "https://openrouter.ai/api/v1/chat/completions"
+from .rate_limiter import RateLimiter
+from .request_body import RequestBody
+from .request_hedging import HedgePolicy, LatencyTracker
+from .request_timings import RequestTimings
+from .response_cache import ResponseCache
+from .retry_policy import APIError, RetryPolicy
+from .single_flight import SingleFlight
+from .utilities import PROJECT_ROOT
+
+API_URL = os.environ.get(
+    "OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions"
+)
 DEFAULT_TIMEOUT = httpx.Timeout(10, read=60)
+DEFAULT_LIMITS = httpx.Limits(
+    max_connections=20, max_keepalive_connections=10, keepalive_expiry=120
+)
+
+# One client per event loop, since httpx connection pools are bound to the loop
+_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = (
+    weakref.WeakKeyDictionary()
+)
+_limits = DEFAULT_LIMITS
+_rate_limiter: RateLimiter | None = None
+# Losing hedges being read for their cost, held so they are not collected
+_billing: set[asyncio.Task] = set()
+
+first_byte_latency = LatencyTracker()
+completion_flights = SingleFlight()
+retry_policy = RetryPolicy()
+response_cache = ResponseCache(os.path.join(PROJECT_ROOT, ".cache", "responses"))
+
+
+def configure_pool(limits: httpx.Limits) -> None:
+    """Set the connection pool limits used by clients created from now on."""
+    global _limits
+    _limits = limits
+
+
+def configure_rate_limits(limiter: RateLimiter | None) -> None:
+    """Limit upstream requests per model and per API key, or stop limiting."""
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client for the running event loop, creating it if needed."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(http2=True, limits=_limits, timeout=DEFAULT_TIMEOUT)
+        _clients[loop] = client
+    return client
+
+
+async def close_client() -> None:
+    """Close the shared client for the running event loop, if one was opened."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
 
 
-@backoff.on_exception(backoff.expo, httpx.HTTPError, max_tries=5)
 async def fetch_completion(
-    body: dict[str, Any],
+    body: dict[str, Any] | RequestBody,
     request_timeout: float | httpx.Timeout = DEFAULT_TIMEOUT,
+    hedge: HedgePolicy | None = None,
+    on_hedge_cost: Callable[[float], None] | None = None,
+    deterministic: bool = False,
+    timings: RequestTimings | None = None,
+    on_cost: Callable[[float], None] | None = None,
 ) -> dict[str, Any]:
-    api_key = os.environ.get("OPENROUTER_API_KEY")
-    async with httpx.AsyncClient(timeout=request_timeout) as client:
-        response = await client.post(
-            API_URL,
-            headers={"Authorization": f"Bearer {api_key}"},
-            json=body,
+    """Request a completion, sharing the result of an identical in-flight request.
+
+    Every caller gets the response as it was billed. If on_cost is given, the
+    cost is reported to it once per request sent, however many callers passing
+    the same on_cost shared it. Complete responses to deterministic requests,
+    whose output depends only on the body, are also cached on disk and reused.
+    If timings is given, it is filled in with the request's phases unless the
+    response came from another request or cache.
+    """
+    request = body if isinstance(body, RequestBody) else RequestBody(body)
+    key = request.digest()
+    if deterministic and (cached := response_cache.get(key)):
+        return cached
+    requested = time.monotonic()
+    data, charged = await completion_flights.run(
+        key,
+        lambda: retry_policy.call(
+            request.get("model", ""),
+            lambda: _fetch(
+                request, request_timeout, hedge, on_hedge_cost, timings, requested
+            ),
+        ),
+    )
+    _charge(charged, on_cost, data.get("usage"))
+    if deterministic and _is_complete(data):
+        response_cache.put(key, data)
+    return data
+
+
+def _is_complete(data: dict[str, Any]) -> bool:
+    """Whether every choice finished naturally with content, so it can be reused."""
+    choices = data.get("choices") or []
+    return bool(choices) and all(
+        choice.get("finish_reason") == "stop"
+        and (choice.get("message") or {}).get("content")
+        for choice in choices
+    )
+
+
+async def _fetch(
+    body: RequestBody,
+    request_timeout: float | httpx.Timeout,
+    hedge: HedgePolicy | None,
+    on_hedge_cost: Callable[[float], None] | None,
+    timings: RequestTimings | None,
+    requested: float,
+) -> tuple[dict[str, Any], set[Callable[[float], None]]]:
+    """Fetch a response, with an empty set of what its cost was reported to."""
+    async with _open_limited(body, request_timeout, hedge, on_hedge_cost) as opened:
+        content = b"".join([chunk async for chunk in opened.chunks])
+    data = json.loads(content)
+    _raise_for_error(opened.response, data)
+    if timings:
+        _record_timings(timings, requested, opened, data.get("usage"))
+    return data, set()
+
+
+async def stream_completion(
+    body: dict[str, Any] | RequestBody,
+    request_timeout: float | httpx.Timeout = DEFAULT_TIMEOUT,
+    hedge: HedgePolicy | None = None,
+    on_hedge_cost: Callable[[float], None] | None = None,
+    timings: RequestTimings | None = None,
+    on_cost: Callable[[float], None] | None = None,
+) -> AsyncIterator[dict[str, Any]]:
+    """Request a completion as server-sent events, yielding each parsed chunk.
+
+    An identical stream in flight is shared from its first chunk, and its cost
+    is reported to on_cost in the same way as by fetch_completion. Opening the
+    stream is retried, but once chunks are yielded it is not. If timings is
+    given, it is filled in when the stream ends, unless it came from another
+    request.
+    """
+    request = body if isinstance(body, RequestBody) else RequestBody(body)
+    stream_body = request.replace(
+        {**request.data, "stream": True, "stream_options": {"include_usage": True}}
+    )
+    chunks = completion_flights.stream(
+        stream_body.digest(),
+        lambda: _stream(stream_body, request_timeout, hedge, on_hedge_cost, timings),
+    )
+    async with aclosing(chunks):
+        async for chunk, charged in chunks:
+            if chunk.get("usage"):
+                _charge(charged, on_cost, chunk["usage"])
+            yield chunk
+
+
+async def _stream(
+    body: RequestBody,
+    request_timeout: float | httpx.Timeout,
+    hedge: HedgePolicy | None,
+    on_hedge_cost: Callable[[float], None] | None,
+    timings: RequestTimings | None,
+) -> AsyncGenerator[tuple[dict[str, Any], set[Callable[[float], None]]]]:
+    """Yield each chunk, with the set of what the stream's cost was reported to."""
+    requested = time.monotonic()
+    usage = None
+    charged: set[Callable[[float], None]] = set()
+    async with AsyncExitStack() as stack:
+        opened = await retry_policy.call(
+            body.get("model", ""),
+            lambda: stack.enter_async_context(
+                _open_limited(body, request_timeout, hedge, on_hedge_cost)
+            ),
+        )
+        async for chunk in _iter_events(opened.chunks):
+            _raise_for_error(opened.response, chunk)
+            usage = chunk.get("usage") or usage
+            yield chunk, charged
+        if timings:
+            _record_timings(timings, requested, opened, usage)
+
+
+def _charge(
+    charged: set[Callable[[float], None]],
+    on_cost: Callable[[float], None] | None,
+    usage: dict[str, Any] | None,
+) -> None:
+    """Report a response's cost to on_cost, unless it already was."""
+    if not on_cost or on_cost in charged:
+        return
+    charged.add(on_cost)
+    if cost := _usage_cost(usage):
+        on_cost(cost)
+
+
+@dataclass
+class _OpenedResponse:
+    response: httpx.Response
+    chunks: AsyncIterator[bytes]
+    is_stream: bool
+    # Monotonic times the attempt started, connected, secured TLS and got a byte
+    marks: tuple[float, float, float, float]
+
+
+@asynccontextmanager
+async def _open_limited(
+    body: RequestBody,
+    request_timeout: float | httpx.Timeout,
+    hedge: HedgePolicy | None,
+    on_hedge_cost: Callable[[float], None] | None,
+) -> AsyncIterator[_OpenedResponse]:
+    """Open a hedged request once the rate limiter allows it, until it is closed."""
+    limit = _rate_limiter.slot(_limit_keys(body)) if _rate_limiter else nullcontext()
+    async with (
+        limit,
+        _open_hedged(body, request_timeout, hedge, on_hedge_cost) as opened,
+    ):
+        yield opened
+
+
+def _limit_keys(body: RequestBody) -> list[str]:
+    api_key = os.environ.get("OPENROUTER_API_KEY") or ""
+    key_hash = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return [f"model:{body.get('model', '')}", f"key:{key_hash}"]
+
+
+@asynccontextmanager
+async def _open_hedged(
+    body: RequestBody,
+    request_timeout: float | httpx.Timeout,
+    hedge: HedgePolicy | None,
+    on_hedge_cost: Callable[[float], None] | None,
+) -> AsyncIterator[_OpenedResponse]:
+    """Open a request, racing a duplicate against it if its first byte is slow.
+
+    The losing request is cancelled if it has not responded yet. If it has, it is
+    read to the end in the background, so that whatever it was billed is reported
+    to on_hedge_cost without delaying the reply.
+    """
+    attempts = [asyncio.create_task(_open(body, request_timeout))]
+    delay = (
+        hedge.delay(first_byte_latency, body.get("model", ""), bool(body.get("stream")))
+        if hedge
+        else None
+    )
+    done, _ = await asyncio.wait(attempts, timeout=delay)
+    if not done and hedge:
+        hedge_body = body.replace(hedge.hedge_body(body.data))
+        attempts.append(asyncio.create_task(_open(hedge_body, request_timeout)))
+    try:
+        winner = await _first_success(attempts)
+    except BaseException:
+        await _discard(attempts)
+        raise
+    for loser in attempts:
+        if loser is winner:
+            continue
+        loser.cancel()
+        if loser.done() and not loser.cancelled() and loser.exception() is None:
+            _bill_in_background(loser.result(), on_hedge_cost)
+    opened = winner.result()
+    try:
+        yield opened
+    finally:
+        await opened.response.aclose()
+
+
+def _bill_in_background(
+    opened: _OpenedResponse, on_cost: Callable[[float], None] | None
+) -> None:
+    """Read a response that lost a race to the end, reporting what it cost."""
+    task = asyncio.create_task(_read_cost(opened))
+    _billing.add(task)
+
+    def report(task: asyncio.Task[float | None]) -> None:
+        _billing.discard(task)
+        if task.cancelled() or task.exception():
+            return
+        if on_cost and (cost := task.result()):
+            on_cost(cost)
+
+    task.add_done_callback(report)
+
+
+async def _first_success(
+    attempts: list[asyncio.Task[_OpenedResponse]],
+) -> asyncio.Task[_OpenedResponse]:
+    """Wait for the first attempt to succeed, raising the primary error if none do."""
+    pending = set(attempts)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for attempt in attempts:
+            if attempt in done and attempt.exception() is None:
+                return attempt
+    error = attempts[0].exception()
+    assert error is not None
+    raise error
+
+
+async def _discard(attempts: list[asyncio.Task[_OpenedResponse]]) -> None:
+    for attempt in attempts:
+        attempt.cancel()
+    await asyncio.gather(*attempts, return_exceptions=True)
+    for attempt in attempts:
+        if not attempt.cancelled() and attempt.exception() is None:
+            await attempt.result().response.aclose()
+
+
+async def _open(
+    body: RequestBody, request_timeout: float | httpx.Timeout
+) -> _OpenedResponse:
+    """Send a request, returning once the first meaningful byte has arrived."""
+    client = get_client()
+    completed: dict[str, float] = {}
+
+    async def trace(event: str, _info: dict[str, Any]) -> None:
+        # Events are named like "connection.connect_tcp.complete"
+        if event.endswith(".complete"):
+            completed[event.split(".")[-2]] = time.monotonic()
+
+    request = client.build_request(
+        "POST",
+        API_URL,
+        headers={**_headers(), "Content-Type": "application/json"},
+        content=body.encode(),
+        timeout=request_timeout,
+        extensions={"trace": trace},
+    )
+    started = time.monotonic()
+    response = await client.send(request, stream=True)
+    try:
+        if response.is_error:
+            await response.aread()
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+            _raise_for_error(response, data)
+        chunks = response.aiter_bytes()
+        head = b""
+        async for chunk in chunks:
+            head += chunk
+            if _has_content(head):
+                break
+        first_byte = time.monotonic()
+        first_byte_latency.record(
+            body.get("model", ""), first_byte - started, bool(body.get("stream"))
         )
-        data = response.json()
-        if "error" in data:
-            raise RuntimeError(data["error"])
-        response.raise_for_status()
-        return data
+    except BaseException:
+        await response.aclose()
+        raise
+    connected = completed.get("connect_tcp", started)
+    secured = completed.get("start_tls", connected)
+    return _OpenedResponse(
+        response,
+        _prepend(head, chunks),
+        bool(body.get("stream")),
+        (started, connected, secured, first_byte),
+    )
+
+
+def _record_timings(
+    timings: RequestTimings,
+    requested: float,
+    opened: _OpenedResponse,
+    usage: dict[str, Any] | None,
+) -> None:
+    timings.record(
+        requested,
+        *opened.marks,
+        time.monotonic(),
+        (usage or {}).get("completion_tokens") or 0,
+    )
+
+
+def _has_content(head: bytes) -> bool:
+    """Whether anything besides whitespace and SSE keep-alive comments arrived."""
+    return any(line.strip() and not line.startswith(b":") for line in head.splitlines())
+
+
+async def _prepend(head: bytes, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    if head:
+        yield head
+    async for chunk in chunks:
+        yield chunk
+
+
+async def _iter_events(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict[str, Any]]:
+    """Parse server-sent event data lines, stopping at the [DONE] marker."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            # Lines starting with ":" are keep-alive comments
+            if not line.startswith("data:"):
+                continue
+            payload = line.removeprefix("data:").strip()
+            if payload == "[DONE]":
+                return
+            yield json.loads(payload)
+
+
+async def _read_cost(opened: _OpenedResponse) -> float | None:
+    """Read a response to the end, returning the cost it reports."""
+    try:
+        usage: dict[str, Any] = {}
+        if opened.is_stream:
+            async for chunk in _iter_events(opened.chunks):
+                usage = chunk.get("usage") or usage
+        else:
+            content = b"".join([chunk async for chunk in opened.chunks])
+            usage = json.loads(content).get("usage") or {}
+    finally:
+        await opened.response.aclose()
+    return _usage_cost(usage)
+
+
+def _usage_cost(usage: dict[str, Any] | None) -> float | None:
+    if not usage:
+        return None
+    cost = usage.get("cost") or (usage.get("cost_details") or {}).get(
+        "upstream_inference_cost"
+    )
+    return float(cost) if cost else None
+
+
+def _headers() -> dict[str, str]:
+    api_key = os.environ.get("OPENROUTER_API_KEY")
+    return {"Authorization": f"Bearer {api_key}"}
+
+
+def _raise_for_error(response: httpx.Response, data: dict[str, Any]) -> None:
+    if "error" in data:
+        raise APIError(data["error"], response)
+    response.raise_for_status()
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from .lm_executors.chat_executor import ChatExecutor
+from .prompt_cache import breakpoint_limit
+
+if TYPE_CHECKING:
+    from .chat_completion import ChatCompletion
+    from .simulacrum import Simulacrum
+
+logger = logging.getLogger(__name__)
+
+# Matches the ttl on the cache breakpoints the message builder sets
+CACHE_TTL = 3600
+
+DAY = 86400
+
+
+@dataclass
+class WarmingPolicy:
+    """When to prime a context's prompt cache, and how much to spend doing it."""
+
+    enabled: bool = True
+    max_daily_cost: float = 0.50
+    refresh_before: float = 300  # Seconds before the cache expires to refresh it
+    active_for: float = 3 * 3600  # Keep refreshing for this long after a turn
+    check_interval: float = 60
+
+    @staticmethod
+    def from_dict(data: dict[str, Any] | None) -> "WarmingPolicy | None":
+        return None if data is None else WarmingPolicy(**data)
+
+
+class CacheWarmer:
+    """Primes the prompt cache between turns, so the next turn reads it.
+
+    The cache is written at startup, after the context's data changes, and
+    shortly before it expires while the conversation is active. Checks are
+    skipped while a turn is in progress.
+    """
+
+    def __init__(
+        self, sim: "Simulacrum", clock: Callable[[], float] = time.time
+    ) -> None:
+        self._sim = sim
+        self._clock = clock
+        self._task: asyncio.Task | None = None
+        self._signature: str | None = None
+        self._seen_completion: ChatCompletion | None = None
+        self._last_turn: float | None = None
+        self._last_write = 0.0
+        self._last_cost = 0.0
+        self._spent: deque[tuple[float, float]] = deque()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def check(self) -> str | None:
+        """Warm the cache if it is due, returning why, or None if it was not."""
+        context = self._sim.context
+        if context.busy:
+            return None
+        context.load()
+        policy = context.cache_warming
+        if not policy or not policy.enabled or not breakpoint_limit(context.model):
+            return None
+
+        now = self._clock()
+        signature = _signature(
+            context.resolved_data.get("system_prompt"), context.model
+        )
+        if self._sim.last_completion is not self._seen_completion:
+            # A turn since the last check wrote the cache itself
+            self._seen_completion = self._sim.last_completion
+            self._signature = signature
+            self._last_turn = self._last_write = now
+            return None
+
+        reason = self._reason(policy, signature, now)
+        if not reason or self._over_budget(policy, now):
+            return None
+        cost = await ChatExecutor(context, skip_injected_prompt=True).warm_cache()
+        context.queue_cost(cost)
+        self._spent.append((now, cost))
+        self._signature = signature
+        self._last_write = now
+        self._last_cost = cost
+        return reason
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except Exception:
+                # A failed warm-up only costs the next turn a cache miss
+                logger.exception("Cache warm-up failed")
+            policy = self._sim.context.cache_warming
+            await asyncio.sleep(policy.check_interval if policy else 60)
+
+    def _reason(self, policy: WarmingPolicy, signature: str, now: float) -> str | None:
+        if self._signature is None:
+            return "startup"
+        if signature != self._signature:
+            return "context changed"
+        active = (
+            self._last_turn is not None and now - self._last_turn < policy.active_for
+        )
+        if active and now - self._last_write >= CACHE_TTL - policy.refresh_before:
+            return "expiring"
+        return None
+
+    def _over_budget(self, policy: WarmingPolicy, now: float) -> bool:
+        """Whether one more warm-up, costing what the last one did, exceeds the cap."""
+        while self._spent and self._spent[0][0] <= now - DAY:
+            self._spent.popleft()
+        spent = sum(cost for _, cost in self._spent)
+        return spent + self._last_cost > policy.max_daily_cost
+
+
+def _signature(system_prompt: str | None, model: str) -> str:
+    """Identify what the cached prefix depends on, besides the history."""
+    return hashlib.sha256(f"{model}\0{system_prompt or ''}".encode()).hexdigest()
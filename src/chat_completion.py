@@ -1,9 +1,21 @@
-from typing import Any
+from typing import TYPE_CHECKING, Any
+
+from .request_timings import RequestTimings
+
+if TYPE_CHECKING:
+    from .context_window import WindowFit
 
 
 class ChatCompletion:
-    def __init__(self, response: dict[str, Any]) -> None:
+    def __init__(
+        self,
+        response: dict[str, Any],
+        timings: RequestTimings | None = None,
+        window: "WindowFit | None" = None,
+    ) -> None:
         self.response = response
+        self.timings = timings
+        self.window = window
         self._validate()
 
     @property
@@ -20,7 +32,9 @@ class ChatCompletion:
 
     @property
     def cached_tokens(self) -> int:
-        return self._usage["prompt_tokens_details"]["cached_tokens"]
+        # Not every provider reports cache usage
+        details = self._usage.get("prompt_tokens_details") or {}
+        return details.get("cached_tokens") or 0
 
     @property
     def cost(self) -> float:
@@ -56,3 +70,41 @@ class ChatCompletion:
     @property
     def _error_message(self) -> str:
         return self.response.get("error", {}).get("message", "")
+
+
+class CompletionStream:
+    """Accumulates streamed chunks into a response shaped like a non-streamed one."""
+
+    def __init__(self) -> None:
+        self.content = ""
+        self._finish_reason: str | None = None
+        self._usage: dict[str, Any] = {}
+        self._metadata: dict[str, Any] = {}
+
+    def add_chunk(self, chunk: dict[str, Any]) -> str:
+        """Apply a chunk, returning the text it added."""
+        for key in ("id", "model", "provider"):
+            if key in chunk:
+                self._metadata[key] = chunk[key]
+        if chunk.get("usage"):
+            self._usage = chunk["usage"]
+        delta_text = ""
+        for choice in chunk.get("choices", []):
+            delta_text += (choice.get("delta") or {}).get("content") or ""
+            if choice.get("finish_reason"):
+                self._finish_reason = choice["finish_reason"]
+        self.content += delta_text
+        return delta_text
+
+    @property
+    def response(self) -> dict[str, Any]:
+        return {
+            **self._metadata,
+            "choices": [
+                {
+                    "message": {"role": "assistant", "content": self.content},
+                    "finish_reason": self._finish_reason,
+                }
+            ],
+            "usage": self._usage,
+        }
@@ -0,0 +1,35 @@
+from dataclasses import dataclass
+from typing import Any
+
+from .conversation import MessageList
+from .summarizer import SUMMARY_PROMPT
+
+
+@dataclass
+class CompactionPolicy:
+    """When to fold older turns into memories, and how many to keep verbatim."""
+
+    max_tokens: int
+    keep_last: int = 10  # Messages left in the conversation
+    prompt: str = SUMMARY_PROMPT
+    model: str | None = None
+
+    def compactable(self, messages: MessageList) -> int:
+        """Number of leading messages to compact, or 0 below the threshold."""
+        if messages.tokens <= self.max_tokens:
+            return 0
+        return max(0, len(messages) - self.keep_last)
+
+    @staticmethod
+    def from_dict(data: dict[str, Any] | None) -> "CompactionPolicy | None":
+        return None if data is None else CompactionPolicy(**data)
+
+
+@dataclass
+class Compaction:
+    """A summary of the conversation's first messages, waiting to replace them."""
+
+    count: int
+    digest: str
+    summary: str
+    cost: float
@@ -1,17 +1,23 @@
 import copy
 import os
-from collections.abc import Callable, Iterator
+from collections.abc import Callable, Iterator, Mapping
 from contextlib import contextmanager
+from types import MappingProxyType
 from typing import Any
 
-from .conversation import Conversation
+from .cache_warmer import WarmingPolicy
+from .compaction import Compaction, CompactionPolicy
+from .context_window import ContextWindow
+from .conversation import Conversation, MessageList
 from .conversation_files import ConversationFiles
 from .instruction_preset import InstructionPreset
-from .message import Message
+from .message import digest_messages
+from .request_hedging import HedgePolicy
 from .response_transform import Pattern
 from .template_resolver import TemplateResolver
-from .utilities import merge_dicts
-from .yaml_config import yaml
+from .token_counter import count_tokens
+from .utilities import merge_dicts, overlay_mapping
+from .yaml_config import yaml, yaml_files
 
 
 class Session:
@@ -33,7 +39,14 @@ class Context:
         self._filepath = path
         self._overrides = overrides or {}
         self._session_version = 0
+        self._open_sessions = 0
+        self._pending_compaction: Compaction | None = None
+        self._pending_cost = 0.0
+        # Variations pass the costs they queue on to the context they came from
+        self._billed = self
         self._is_ephemeral = ephemeral
+        self._modified = True
+        self._resolver: TemplateResolver | None = None
         if ephemeral:
             self._conversation = Conversation.empty()
         self.load()
@@ -42,19 +55,27 @@ class Context:
     def session(self) -> Iterator[Session]:
         self._session_version += 1
         version = self._session_version
+        self._open_sessions += 1
         self.load()
+        self._modified = True
         try:
             yield Session(lambda: self._session_version != version)
         finally:
+            self._open_sessions -= 1
             if self._session_version == version:
                 self.save()
             else:
                 self.load()
 
     def load(self) -> None:
-        with open(self._filepath) as file:
-            self._raw_data = yaml.load(file)
-        self._data = copy.deepcopy(self._raw_data)
+        """Bring the context up to date with its files.
+
+        Only files that changed since they were last read are parsed again.
+        Templates are resolved again only if their inputs changed, and the
+        conversation is kept unless its file changed or a session may have
+        modified it.
+        """
+        self._data = copy.deepcopy(yaml_files.load(self._filepath))
         self._apply_extends()
         if self._overrides:
             self._data = merge_dicts(self._data, self._overrides)
@@ -62,13 +83,19 @@ class Context:
         if not self._is_ephemeral:
             self._load_conversation()
         self._resolve_templates()
+        self._modified = bool(self._open_sessions)
 
     def save(self) -> None:
+        self._apply_compaction()
+        if self._pending_cost:
+            self.increment_cost(self._pending_cost)
+            self._pending_cost = 0.0
         if self._is_ephemeral:
             return
         with open(self._state_filepath, "w") as f:
             yaml.dump(dict(self._state_data), f)
         self._conversation.save()
+        self._modified = bool(self._open_sessions)
 
     def add_message(
         self,
@@ -78,9 +105,11 @@ class Context:
         metadata: dict[str, Any] | None = None,
     ) -> None:
         self._conversation.add_message(role, message, image, metadata)
+        self._modified = True
 
     def reset_conversation(self) -> None:
         self._conversation.reset()
+        self._modified = True
 
     def new_conversation(self, name: str | None = None) -> None:
         mgr = self._conversation_files
@@ -88,13 +117,33 @@ class Context:
         self._set_conversation_file(filename)
 
     def compact_conversation(self) -> tuple[int, int]:
-        old_size = sum(len(m.content or "") for m in self._conversation.messages)
+        """Start over with the conversation as a memory, returning token counts."""
+        old_tokens = self.conversation_tokens
         memory = self._conversation.format_as_memory(self.character_name)
         memories = [*self._conversation.memories, memory]
         current_name = self.conversation_name
         self.new_conversation(current_name)
         self._conversation.memories = memories
-        return old_size, len(memory)
+        return old_tokens, count_tokens(memory)
+
+    def queue_compaction(self, compaction: Compaction) -> None:
+        """Swap a summary in for the messages it covers with the next save.
+
+        If no session is open it is saved now; otherwise it lands in the same
+        write as the session's own changes, so neither overwrites the other.
+        """
+        self._pending_compaction = compaction
+        self._save_if_idle()
+
+    def queue_cost(self, cost: float) -> None:
+        """Charge a cost in the same way.
+
+        It is kept even if the session it was incurred in is superseded, and so
+        reloads rather than saving its own changes.
+        """
+        billed = self._billed
+        billed._pending_cost += cost
+        billed._save_if_idle()
 
     def switch_conversation(self, identifier: str) -> tuple[int, str | None]:
         conv = self._conversation_files.find(identifier)
@@ -111,23 +160,43 @@ class Context:
         current = float(self._state_data.get("total_cost", 0))
         self._state_data["total_cost"] = current + cost
         self._conversation.increment_cost(cost)
+        self._modified = True
 
     def set_conversation_var(self, key: str, value: Any) -> None:
         self._conversation.set_var(key, value)
+        self._modified = True
 
     def apply_preset_overrides(self, key: str) -> None:
         presets = self.instruction_presets
         if key in presets:
             overrides = presets[key].overrides
             if overrides:
-                self._data = merge_dicts(self._data, overrides)
+                self._data = overlay_mapping(self._data, overrides)
+
+    def with_overrides(self, overrides: dict[str, Any]) -> "Context":
+        """A variation of this context sharing its conversation, state and data.
+
+        Only the overridden paths are copied, and costs go to this context.
+        """
+        variation = copy.copy(self)
+        variation._data = overlay_mapping(self._data, overrides)
+        return variation
 
     # Public properties
 
     @property
-    def conversation_messages(self) -> list[Message]:
+    def conversation_messages(self) -> MessageList:
         return self._conversation.messages
 
+    @property
+    def busy(self) -> bool:
+        """Whether a session is open, with changes that a reload would discard."""
+        return self._open_sessions > 0
+
+    @property
+    def conversation_tokens(self) -> int:
+        return self._conversation.messages.tokens
+
     @property
     def conversation_cost(self) -> float:
         return self._conversation.cost
@@ -185,6 +254,13 @@ class Context:
             return os.path.join(self.dir, path)
         return None
 
+    @property
+    def message_template(self) -> str | None:
+        path = self._data.get("message_template")
+        if path:
+            return os.path.join(self.dir, path)
+        return None
+
     @property
     def book_postscript(self) -> str | None:
         return self._data.get("book_postscript")
@@ -240,18 +316,34 @@ class Context:
             if msg.metadata and "triggered_preset" in msg.metadata
         ]
 
+    @property
+    def hedge_policy(self) -> HedgePolicy | None:
+        return HedgePolicy.from_dict(self._data.get("hedging"))
+
+    @property
+    def compaction_policy(self) -> CompactionPolicy | None:
+        return CompactionPolicy.from_dict(self._data.get("auto_compact"))
+
+    @property
+    def cache_warming(self) -> WarmingPolicy | None:
+        return WarmingPolicy.from_dict(self._data.get("cache_warming"))
+
+    @property
+    def context_window(self) -> ContextWindow | None:
+        return ContextWindow.from_dict(self._data.get("context_window"))
+
     @property
     def api_params(self) -> dict[str, Any]:
         return self._data.get("api_params", {})
 
     @property
-    def resolved_data(self) -> dict[str, Any]:
-        return self._data
+    def resolved_data(self) -> Mapping[str, Any]:
+        """A read-only view, shared rather than copied by executors."""
+        return MappingProxyType(self._data)
 
     def _load_state(self) -> dict[str, Any]:
         if os.path.exists(self._state_filepath):
-            with open(self._state_filepath) as f:
-                return yaml.load(f) or {}
+            return dict(yaml_files.load(self._state_filepath) or {})
         return {}
 
     def _load_conversation(self) -> None:
@@ -260,6 +352,9 @@ class Context:
             mgr = self._conversation_files
             self._set_conversation_path(mgr.generate_filename(mgr.next_id()))
         full_path = os.path.join(self.dir, self._conversation_relpath)
+        current = getattr(self, "_conversation", None)
+        if current and not self._modified and current.is_current(full_path):
+            return
         self._conversation = Conversation(full_path)
 
     def _set_conversation_path(self, filename: str) -> None:
@@ -269,28 +364,51 @@ class Context:
         self._set_conversation_path(filename)
         self._load_conversation()
 
+    def _save_if_idle(self) -> None:
+        if not self._open_sessions:
+            self.load()
+            self.save()
+
+    def _apply_compaction(self) -> None:
+        compaction, self._pending_compaction = self._pending_compaction, None
+        if not compaction:
+            return
+        self.increment_cost(compaction.cost)
+        messages = self._conversation.messages
+        # Skipped if the summarized messages were edited or removed meanwhile
+        if digest_messages(messages[: compaction.count]) != compaction.digest:
+            return
+        del messages[: compaction.count]
+        self._conversation.memories = [
+            *self._conversation.memories,
+            compaction.summary,
+        ]
+
     def _apply_extends(self) -> None:
         self._extend_dirs: list[str] = []
         self._data = self._extend_data(self._data, self.dir)
 
     def _extend_data(self, data: dict[str, Any], base_dir: str) -> dict[str, Any]:
-        extends = data.pop("extends", None)
+        extends = data.get("extends")
         if not extends:
             return data
+        data = {k: v for k, v in data.items() if k != "extends"}
         path = os.path.join(base_dir, extends)
         self._extend_dirs.append(os.path.dirname(path))
-        with open(path) as f:
-            base_data = self._extend_data(yaml.load(f), os.path.dirname(path))
+        base_data = self._extend_data(yaml_files.load(path), os.path.dirname(path))
         return merge_dicts(base_data, data)
 
     def _resolve_templates(self) -> None:
-        resolver = TemplateResolver(self.dir, self._search_dirs)
         extra_vars = {
             **self._state_data,
             "memories": self.conversation_memories,
             "vars": self.conversation_vars,
         }
-        self._data = resolver.resolve(self._data, extra_vars)
+        # Kept between loads, so it renders again only what changed
+        search_dirs = self._search_dirs
+        if not self._resolver or self._resolver.search_dirs != search_dirs:
+            self._resolver = TemplateResolver(self.dir, search_dirs)
+        self._data = self._resolver.resolve(self._data, extra_vars)
 
     # Private properties
 
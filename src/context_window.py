@@ -0,0 +1,133 @@
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from .message import Message, digest_messages
+from .summarizer import SUMMARY_PROMPT, summarize
+from .token_counter import count_message
+
+STRATEGIES = ("sliding", "first_last", "summarize")
+
+
+@dataclass
+class WindowState:
+    """Where the window was last cut and what the dropped messages summarize to."""
+
+    cut: int = 0
+    digest: str = ""
+    summary: str | None = None
+    summary_end: int = 0
+    summary_digest: str = ""
+
+
+@dataclass
+class WindowFit:
+    messages: list[Message]
+    dropped: list[Message] = field(default_factory=list)
+    dropped_tokens: int = 0
+    summarized: bool = False
+
+
+@dataclass
+class ContextWindow:
+    """A token budget for the history sent with each request, and how to meet it."""
+
+    max_tokens: int
+    strategy: str = "sliding"
+    keep_first: int = 2  # Messages kept from the start, except when sliding
+    keep_last: int = 4  # Messages always kept from the end
+    target: float = 0.75  # Trim to this fraction of the budget, so cuts are rare
+    summary_prompt: str = SUMMARY_PROMPT
+    summary_model: str | None = None
+
+    def __post_init__(self) -> None:
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"Unknown context window strategy: {self.strategy}")
+
+    def fit(self, messages: list[Message], state: WindowState) -> WindowFit:
+        """Drop messages after the head until the rest fit the budget.
+
+        A previous cut is kept while it still fits, so the messages sent stay a
+        stable prefix that the provider's prompt cache can reuse.
+        """
+        head = self._head(messages)
+        tokens = [count_message(m) for m in messages]
+        kept = sum(tokens)
+        cut = head
+        if kept > self.max_tokens:
+            last = max(head, len(messages) - self.keep_last)
+            if head <= state.cut <= last and state.digest == digest_messages(
+                messages[: state.cut]
+            ):
+                cut = state.cut
+            kept -= sum(tokens[head:cut])
+            if kept > self.max_tokens:
+                while cut < last and kept > self.max_tokens * self.target:
+                    kept -= tokens[cut]
+                    cut += 1
+        state.cut, state.digest = cut, digest_messages(messages[:cut])
+        return WindowFit(
+            messages[:head] + messages[cut:],
+            messages[head:cut],
+            sum(tokens[head:cut]),
+        )
+
+    async def apply(
+        self,
+        messages: list[Message],
+        state: WindowState,
+        model: str,
+        on_cost: Callable[[float], None],
+    ) -> WindowFit:
+        """Fit the messages, replacing what was dropped by a summary if configured."""
+        fit = self.fit(messages, state)
+        if self.strategy != "summarize" or not fit.dropped:
+            return fit
+        head = self._head(messages)
+        summary = await self._summary(messages, head, state, model, on_cost)
+        fit.messages.insert(
+            head, Message("system", f"<summary>\n{summary}\n</summary>")
+        )
+        fit.summarized = True
+        return fit
+
+    async def _summary(
+        self,
+        messages: list[Message],
+        head: int,
+        state: WindowState,
+        model: str,
+        on_cost: Callable[[float], None],
+    ) -> str:
+        """Summarize the dropped messages, extending the last summary if it applies."""
+        cut = state.cut
+        previous = None
+        start = head
+        if (
+            state.summary
+            and head <= state.summary_end <= cut
+            and state.summary_digest
+            == digest_messages(messages[head : state.summary_end])
+        ):
+            if state.summary_end == cut:
+                return state.summary
+            previous, start = state.summary, state.summary_end
+        completion = await summarize(
+            messages[start:cut],
+            self.summary_prompt,
+            self.summary_model or model,
+            previous,
+        )
+        on_cost(completion.cost)
+        summary = completion.content
+        state.summary = summary
+        state.summary_end = cut
+        state.summary_digest = digest_messages(messages[head:cut])
+        return summary
+
+    def _head(self, messages: list[Message]) -> int:
+        return 0 if self.strategy == "sliding" else min(self.keep_first, len(messages))
+
+    @staticmethod
+    def from_dict(data: dict[str, Any] | None) -> "ContextWindow | None":
+        return None if data is None else ContextWindow(**data)
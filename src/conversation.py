@@ -1,9 +1,84 @@
+import copy
+import io
+import os
+from collections.abc import Iterable
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, SupportsIndex
 
+from .file_cache import content_digest
 from .message import Message
-from .yaml_config import yaml
+from .token_counter import count_message, get_counter
+from .yaml_config import yaml, yaml_files
+
+
+class MessageList(list[Message]):
+    """Messages with a running total of their tokens.
+
+    The total is counted on first use and then kept up to date as messages are
+    added and removed, so it is O(1) to read. Messages are not edited in place
+    while in the list.
+    """
+
+    def __init__(self, messages: Iterable[Message] = ()) -> None:
+        super().__init__(messages)
+        # The counter's name and the total it counted
+        self._total: tuple[str, int] | None = None
+
+    @property
+    def tokens(self) -> int:
+        name = get_counter().name
+        if self._total is None or self._total[0] != name:
+            self._total = (name, sum(count_message(m) for m in self))
+        return self._total[1]
+
+    def append(self, message: Message) -> None:
+        super().append(message)
+        self._adjust([message], 1)
+
+    def extend(self, messages: Iterable[Message]) -> None:
+        added = list(messages)
+        super().extend(added)
+        self._adjust(added, 1)
+
+    def insert(self, index: SupportsIndex, message: Message) -> None:
+        super().insert(index, message)
+        self._adjust([message], 1)
+
+    def pop(self, index: SupportsIndex = -1) -> Message:
+        message = super().pop(index)
+        self._adjust([message], -1)
+        return message
+
+    def remove(self, message: Message) -> None:
+        super().remove(message)
+        self._adjust([message], -1)
+
+    def clear(self) -> None:
+        super().clear()
+        self._total = None
+
+    def __delitem__(self, index: SupportsIndex | slice) -> None:
+        removed = self[index] if isinstance(index, slice) else [self[index]]
+        super().__delitem__(index)
+        self._adjust(removed, -1)
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        super().__setitem__(index, value)
+        self._total = None
+
+    def __iadd__(self, messages: Iterable[Message]) -> "MessageList":  # type: ignore[override, misc]
+        self.extend(messages)
+        return self
+
+    def _adjust(self, messages: list[Message], sign: int) -> None:
+        if self._total is None:
+            return
+        name, total = self._total
+        if name != get_counter().name:
+            self._total = None
+            return
+        self._total = (name, total + sign * sum(count_message(m) for m in messages))
 
 
 class Conversation:
@@ -12,20 +87,30 @@ class Conversation:
         self.load()
 
     def load(self) -> None:
-        if self._filepath.exists():
-            with open(self._filepath) as file:
-                data = yaml.load(file)
+        # Taken first, so a write during the load shows as a change afterwards
+        self.version = yaml_files.version(str(self._filepath))
+        if self.version is not None:
+            data = yaml_files.load(str(self._filepath))
             self.created_at = data.get("created_at")
             self.cost = data.get("cost", 0.0)
-            self.vars = data.get("vars", {})
-            self.memories = data.get("memories", [])
-            self.messages = [Message.from_dict(msg) for msg in data.get("messages", [])]
+            self.vars = copy.deepcopy(data.get("vars", {}))
+            self.memories = list(data.get("memories", []))
+            self.messages = MessageList(
+                Message.from_dict(msg) for msg in data.get("messages", [])
+            )
         else:
             self.reset()
 
+    def is_current(self, filepath: str) -> bool:
+        """Whether this is the file's conversation as last loaded or saved."""
+        return self._filepath == Path(filepath) and self.version == yaml_files.version(
+            filepath
+        )
+
     @classmethod
     def empty(cls) -> "Conversation":
         conv = cls.__new__(cls)
+        conv.version = None
         conv.reset()
         return conv
 
@@ -37,15 +122,22 @@ class Conversation:
             **({"memories": self.memories} if self.memories else {}),
             "messages": [msg.to_dict() for msg in self.messages],
         }
-        with open(self._filepath, "w") as file:
-            yaml.dump(data_to_save, file)
+        # Written aside and renamed, so a reader never sees a partial file
+        buffer = io.StringIO()
+        yaml.dump(data_to_save, buffer)
+        text = buffer.getvalue()
+        temp_path = self._filepath.with_name(f"{self._filepath.name}.tmp")
+        with open(temp_path, "w") as file:
+            file.write(text)
+        os.replace(temp_path, self._filepath)
+        self.version = content_digest(text)
 
     def reset(self) -> None:
         self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M")
         self.cost = 0.0
         self.vars = {}
         self.memories = []
-        self.messages = []
+        self.messages = MessageList()
 
     def set_var(self, key: str, value: Any) -> None:
         self.vars[key] = value
@@ -20,7 +20,7 @@ async def clean_document(text: str, prompt: str | None) -> str:
         ],
     }
     try:
-        data = await fetch_completion(body, request_timeout=60)
+        data = await fetch_completion(body, request_timeout=60, deterministic=True)
     except (httpx.HTTPError, RuntimeError) as e:
         msg = str(e) or type(e).__name__
         raise ValueError(f"Document cleanup: {msg}") from e
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+# Files modified this recently may change again without their mtime moving, on
+# filesystems with coarse timestamps, so they are compared by content
+RACY_WINDOW = 2.0
+
+_UNPARSED = object()
+
+
+@dataclass
+class _Entry:
+    stat: tuple[int, int, int]
+    digest: str
+    racy: bool
+    data: Any = _UNPARSED
+
+
+class FileCache:
+    """Parsed files, reused until the file changes on disk.
+
+    A file is unchanged while its mtime, size and inode are, so most checks are
+    a single stat. Otherwise it is read and hashed, and parsed only if its
+    content differs. Parsed data is shared, so callers copy what they modify.
+    """
+
+    def __init__(self, parse: Callable[[str], Any], max_entries: int = 16) -> None:
+        self._parse = parse
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def load(self, path: str) -> Any:
+        entry = self._unchanged(path)
+        if not entry or entry.data is _UNPARSED:
+            entry, text = self._read(path)
+            if entry.data is _UNPARSED:
+                entry.data = self._parse(text)
+        return entry.data
+
+    def version(self, path: str) -> str | None:
+        """A digest of the file's content, or None if it does not exist."""
+        try:
+            entry = self._unchanged(path) or self._read(path)[0]
+        except FileNotFoundError:
+            self._entries.pop(path, None)
+            return None
+        return entry.digest
+
+    def _unchanged(self, path: str) -> _Entry | None:
+        entry = self._entries.get(path)
+        if entry and not entry.racy and entry.stat == _stat_key(os.stat(path)):
+            self._entries.move_to_end(path)
+            return entry
+        return None
+
+    def _read(self, path: str) -> tuple[_Entry, str]:
+        st = os.stat(path)
+        with open(path) as f:
+            text = f.read()
+        digest = content_digest(text)
+        racy = time.time() - st.st_mtime < RACY_WINDOW
+        entry = self._entries.get(path)
+        if entry and entry.digest == digest:
+            entry.stat, entry.racy = _stat_key(st), racy
+        else:
+            entry = _Entry(_stat_key(st), digest, racy)
+        self._entries[path] = entry
+        self._entries.move_to_end(path)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        return entry, text
+
+
+def content_digest(text: str) -> str:
+    """The version FileCache reports for a file with this content."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _stat_key(st: os.stat_result) -> tuple[int, int, int]:
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
@@ -1,16 +1,47 @@
-import copy
 import os
+import weakref
+from collections.abc import Callable
 from typing import Any
 
 import httpx
 import jinja2
 import yaml
 
-from ..api_client import fetch_completion
-from ..chat_completion import ChatCompletion
+from ..api_client import fetch_completion, stream_completion
+from ..chat_completion import ChatCompletion, CompletionStream
+from ..context_window import WindowFit, WindowState
 from ..message import Message
+from ..prompt_cache import CachePlanner
+from ..request_body import AttachmentLoader, RequestBody
 from ..request_recorder import RequestRecorder
-from ..utilities import PROJECT_ROOT, make_base64_loader
+from ..request_timings import RequestTimings
+from ..template_cache import BytecodeCache
+from ..utilities import PROJECT_ROOT
+from .message_builder import MessageCache, build_messages
+
+# Templates are loaded by absolute path, compiled once and recompiled on change
+_template_env = jinja2.Environment(
+    trim_blocks=True,
+    lstrip_blocks=True,
+    loader=jinja2.FileSystemLoader("/"),
+    auto_reload=True,
+    bytecode_cache=BytecodeCache("chat"),
+)
+
+# Built messages are reused across the turns of each context
+_message_caches: weakref.WeakKeyDictionary[Any, MessageCache] = (
+    weakref.WeakKeyDictionary()
+)
+
+# Cache breakpoints are planned from each context's previous requests
+_cache_planners: weakref.WeakKeyDictionary[Any, CachePlanner] = (
+    weakref.WeakKeyDictionary()
+)
+
+# Where each context's window was last cut, so the cut only moves when it must
+_window_states: weakref.WeakKeyDictionary[Any, WindowState] = (
+    weakref.WeakKeyDictionary()
+)
 
 
 class ChatExecutor:
@@ -28,40 +59,134 @@ class ChatExecutor:
         self._skip_injected_prompt = skip_injected_prompt
         self._request_key = request_key
 
-    async def execute(self, params: dict[str, Any] | None = None) -> ChatCompletion:
-        merged_params = {**self.context.api_params}
-        if params:
-            merged_params.update(params)
-
-        messages = self._build_messages()
-        body = {"messages": messages, **merged_params}
+    async def execute(
+        self,
+        params: dict[str, Any] | None = None,
+        on_partial: Callable[[str], None] | None = None,
+    ) -> ChatCompletion:
+        """Request a completion, streaming the content so far to on_partial if set."""
+        window = await self._fit_window()
+        body = self._build_body(params, window.messages)
+        timings = RequestTimings()
         try:
-            data = await fetch_completion(body)
+            if on_partial:
+                data = await self._stream(body, on_partial, timings)
+            else:
+                data = await fetch_completion(
+                    body,
+                    hedge=self.context.hedge_policy,
+                    on_hedge_cost=self.context.queue_cost,
+                    timings=timings,
+                    on_cost=self.context.queue_cost,
+                )
         except httpx.ReadTimeout as err:
             raise RuntimeError("Request timed out") from err
 
-        RequestRecorder(self.LAST_REQUEST_PATH).record(body, data, self._request_key)
-        completion = ChatCompletion(data)
-        self.context.increment_cost(completion.cost)
-        return completion
+        RequestRecorder(self.LAST_REQUEST_PATH).record(
+            body.data, data, self._request_key
+        )
+        return ChatCompletion(data, timings, window)
+
+    async def warm_cache(self) -> float:
+        """Send the prompt for one token to write it to the cache. Returns the cost."""
+        costs: list[float] = []
+        window = await self._fit_window(costs.append)
+        body = self._build_body({"max_tokens": 1}, window.messages)
+        data = await fetch_completion(body)
+        # A one token reply is cut short, so it is not read as a completion
+        return sum(costs) + ((data.get("usage") or {}).get("cost") or 0.0)
+
+    async def _stream(
+        self,
+        body: RequestBody,
+        on_partial: Callable[[str], None],
+        timings: RequestTimings,
+    ) -> dict[str, Any]:
+        stream = CompletionStream()
+        async for chunk in stream_completion(
+            body,
+            hedge=self.context.hedge_policy,
+            on_hedge_cost=self.context.queue_cost,
+            timings=timings,
+            on_cost=self.context.queue_cost,
+        ):
+            if stream.add_chunk(chunk):
+                on_partial(stream.content)
+        return stream.response
 
-    def _build_messages(self) -> list[dict[str, Any]]:
-        template_vars = {**copy.deepcopy(self.context.resolved_data)}
+    async def _fit_window(
+        self, on_cost: Callable[[float], None] | None = None
+    ) -> WindowFit:
+        """Fit the history to the context window, leaving the stored history intact."""
         messages = self.context.conversation_messages
-        template_vars["messages"] = self._inject_inline_instructions(messages)
-        template_vars["injected_prompt"] = (
+        window = self.context.context_window
+        if not window:
+            return WindowFit(messages)
+        return await window.apply(
+            messages,
+            _window_states.setdefault(self.context, WindowState()),
+            self.context.api_params.get("model", ""),
+            on_cost or self.context.queue_cost,
+        )
+
+    def _build_body(
+        self, params: dict[str, Any] | None, messages: list[Message] | None = None
+    ) -> RequestBody:
+        merged_params = {**self.context.api_params}
+        if params:
+            merged_params.update(params)
+        load_base64 = AttachmentLoader(self.context.images_dir)
+        built = self._build_messages(load_base64, messages)
+        return RequestBody(
+            {"messages": built, **merged_params}, load_base64.attachments
+        )
+
+    def _build_messages(
+        self, load_base64: AttachmentLoader, messages: list[Message] | None = None
+    ) -> list[dict[str, Any]]:
+        data = self.context.resolved_data
+        if messages is None:
+            messages = self.context.conversation_messages
+        injected_prompt = (
             None
             if self._skip_injected_prompt
             else self._build_injected_prompt(
                 messages,
-                template_vars.get("reinforcement_prompt"),
-                template_vars.get("continue_prompt"),
+                data.get("reinforcement_prompt"),
+                data.get("continue_prompt"),
+            )
+        )
+        messages = self._inject_inline_instructions(messages)
+        if template_path := self.context.message_template:
+            return self._render_messages(
+                template_path, messages, injected_prompt, load_base64
             )
+        return build_messages(
+            data.get("system_prompt") or "",
+            messages,
+            injected_prompt,
+            self.context.api_params.get("model", ""),
+            load_base64,
+            _message_caches.setdefault(self.context, MessageCache()),
+            _cache_planners.setdefault(self.context, CachePlanner()),
         )
-        env = jinja2.Environment(trim_blocks=True, lstrip_blocks=True)
-        env.globals["load_base64"] = make_base64_loader(self.context.images_dir)
-        with open(self.TEMPLATE_PATH) as file:
-            template = env.from_string(file.read())
+
+    def _render_messages(
+        self,
+        template_path: str,
+        messages: list[Message],
+        injected_prompt: str | None,
+        load_base64: AttachmentLoader,
+    ) -> list[dict[str, Any]]:
+        """Render messages from a YAML-producing Jinja template instead."""
+        template_vars = {
+            **self.context.resolved_data,
+            "messages": messages,
+            "injected_prompt": injected_prompt,
+            # Images render as placeholders, spliced in when the body is encoded
+            "load_base64": load_base64,
+        }
+        template = _template_env.get_template(os.path.abspath(template_path))
         rendered_str = template.render(template_vars)
         return yaml.safe_load(rendered_str)
 
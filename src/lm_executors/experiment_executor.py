@@ -1,14 +1,14 @@
 import asyncio
-import copy
 import os
 import random
+from collections.abc import Callable
 from typing import Any
 
 import aiofiles
 
 from ..chat_completion import ChatCompletion
 from ..response_transform import strip_tags, transform_response
-from ..utilities import PROJECT_ROOT, merge_dicts
+from ..utilities import PROJECT_ROOT
 from .chat_executor import ChatExecutor
 
 
@@ -18,15 +18,17 @@ class ExperimentExecutor(ChatExecutor):
 
     LOG_PATH = os.path.join(PROJECT_ROOT, "experiment_log.txt")
 
-    async def execute(self, params: dict[str, Any] | None = None) -> ChatCompletion:
+    async def execute(
+        self,
+        params: dict[str, Any] | None = None,
+        on_partial: Callable[[str], None] | None = None,  # noqa: ARG002
+    ) -> ChatCompletion:
+        # Variations are compared once complete, so nothing is streamed
         async def execute_variation(variation_data):
-            variation_context = copy.deepcopy(self.context)
-            variation_context._data = merge_dicts(
-                variation_context.resolved_data, variation_data
-            )
-
+            # Variations share the real context's conversation, so bill it directly
             executor = ChatExecutor(
-                variation_context, skip_injected_prompt=self._skip_injected_prompt
+                self.context.with_overrides(variation_data),
+                skip_injected_prompt=self._skip_injected_prompt,
             )
             return await executor.execute(params)
 
@@ -41,10 +43,6 @@ class ExperimentExecutor(ChatExecutor):
         print("Generating variations...")
         results = await asyncio.gather(*tasks)
 
-        # Variations bill their copied context, so charge every one to the real one
-        for result in results:
-            self.context.increment_cost(result.cost)
-
         for i, result in enumerate(results):
             content = transform_response(
                 result.content,
@@ -0,0 +1,98 @@
+from collections.abc import Callable
+from typing import Any
+
+from ..message import Message
+from ..prompt_cache import CachePlanner, breakpoint_limit
+
+
+class MessageCache:
+    """Messages built for the previous request, reused while the history matches.
+
+    Only messages after the first one that differs are rebuilt, so appending,
+    popping or editing the tail costs the size of the change.
+    """
+
+    def __init__(self) -> None:
+        self._keys: list[tuple[str, str | None, str | None]] = []
+        self._built: list[dict[str, Any]] = []
+
+    def build(
+        self, messages: list[Message], load_base64: Callable[[str], str]
+    ) -> list[dict[str, Any]]:
+        # Images are keyed by placeholder, which changes if the file does
+        keys = [
+            (m.role, m.content, load_base64(m.image) if m.image else None)
+            for m in messages
+        ]
+        common = 0
+        for old, new in zip(self._keys, keys, strict=False):
+            if old != new:
+                break
+            common += 1
+        built = self._built[:common] + [_message(*key) for key in keys[common:]]
+        self._keys, self._built = keys, built
+        return built
+
+
+def build_messages(
+    system_prompt: str,
+    messages: list[Message],
+    injected_prompt: str | None,
+    model: str,
+    load_base64: Callable[[str], str],
+    cache: MessageCache | None = None,
+    planner: CachePlanner | None = None,
+) -> list[dict[str, Any]]:
+    """Build the API message list that chat_executor_template.j2 describes."""
+    if cache:
+        built = cache.build(messages, load_base64)
+    else:
+        built = [
+            _message(m.role, m.content, load_base64(m.image) if m.image else None)
+            for m in messages
+        ]
+    if limit := breakpoint_limit(model):
+        # The system prompt takes one breakpoint
+        marked = (planner or CachePlanner()).plan(built, limit - 1)
+        built = [
+            _with_cache_control(m) if i in marked else m for i, m in enumerate(built)
+        ]
+    result = [_system_message(system_prompt, cached=True), *built]
+    if injected_prompt:
+        result.append(_system_message(injected_prompt, cached=False))
+    return result
+
+
+def _message(role: str, text: str | None, image: str | None) -> dict[str, Any]:
+    content: list[dict[str, Any]] = []
+    if image:
+        url = f"data:image/jpeg;base64,{image}"
+        content.append(
+            {"type": "image_url", "image_url": {"url": url, "detail": "low"}}
+        )
+    if text:
+        content.append(_text(text, cached=False))
+    return {"role": role, "content": content}
+
+
+def _with_cache_control(message: dict[str, Any]) -> dict[str, Any]:
+    """Copy a message with a cache breakpoint on its last part, leaving it shareable."""
+    *parts, last = message["content"]
+    last = {**last, "cache_control": _cache_control()}
+    return {**message, "content": [*parts, last]}
+
+
+def _system_message(text: str, cached: bool) -> dict[str, Any]:
+    return {"role": "system", "content": [_text(text, cached)]}
+
+
+def _text(text: str, cached: bool) -> dict[str, Any]:
+    # The template's YAML block scalars drop trailing newlines
+    part: dict[str, Any] = {"type": "text", "text": text.rstrip("\n")}
+    if cached:
+        part["cache_control"] = _cache_control()
+    return part
+
+
+def _cache_control() -> dict[str, Any]:
+    return {"type": "ephemeral", "ttl": "1h"}
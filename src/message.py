@@ -1,3 +1,4 @@
+import hashlib
 from typing import Any
 
 from .response_transform import strip_tags
@@ -34,5 +35,14 @@ class Message:
             role=str(data["role"]),
             content=str(data["content"]) if data.get("content") else None,
             image=str(data["image"]) if data.get("image") else None,
-            metadata=data.get("metadata"),
+            # Copied, as the parsed file it came from may be shared
+            metadata=dict(data["metadata"]) if data.get("metadata") else None,
         )
+
+
+def digest_messages(messages: list[Message]) -> str:
+    """Hash what identifies a run of messages, to tell if it has changed."""
+    hasher = hashlib.sha256()
+    for m in messages:
+        hasher.update(f"{m.role}\0{m.content or ''}\0{m.image or ''}\0".encode())
+    return hasher.hexdigest()
@@ -0,0 +1,81 @@
+from collections import deque
+from typing import Any
+
+# Explicit cache breakpoints allowed per request, by model name fragment. Other
+# providers cache automatically and ignore cache_control.
+BREAKPOINT_LIMITS = {"claude": 4}
+
+# Previous requests whose prefixes new breakpoints try to line up with
+RECENT_REQUESTS = 3
+
+
+def breakpoint_limit(model: str) -> int:
+    return next((n for name, n in BREAKPOINT_LIMITS.items() if name in model), 0)
+
+
+class CachePlanner:
+    """Chooses which messages get cache breakpoints, from the requests before.
+
+    The last message is always marked, so the next turn, a retry or a
+    post-processing pass can extend its prefix. Then, if a recent request
+    shares a prefix with this one, the end of that prefix is marked so the
+    cache it wrote is read even beyond the provider's lookback. Any slots left
+    go to the messages before the last, in case it is undone or edited.
+    """
+
+    def __init__(self) -> None:
+        self._recent: deque[list[dict[str, Any]]] = deque(maxlen=RECENT_REQUESTS)
+
+    def plan(self, messages: list[dict[str, Any]], slots: int) -> set[int]:
+        candidates = [len(messages) - 1]
+        for previous in reversed(self._recent):
+            candidates.append(_common_prefix(previous, messages) - 1)
+        candidates += range(len(messages) - 2, -1, -1)
+        self._recent.append(messages)
+
+        marked: set[int] = set()
+        for index in candidates:
+            if len(marked) == slots:
+                break
+            if index >= 0:
+                marked.add(index)
+        return marked
+
+
+class CacheHitRate:
+    """Prompt tokens read from the provider's cache, over recent turns."""
+
+    def __init__(self, max_turns: int = 50) -> None:
+        self._turns: deque[tuple[int, int]] = deque(maxlen=max_turns)
+
+    def record(self, cached_tokens: int, prompt_tokens: int) -> None:
+        if prompt_tokens:
+            self._turns.append((cached_tokens, prompt_tokens))
+
+    @property
+    def turns(self) -> int:
+        return len(self._turns)
+
+    @property
+    def last(self) -> float | None:
+        if not self._turns:
+            return None
+        cached, prompt = self._turns[-1]
+        return cached / prompt
+
+    @property
+    def overall(self) -> float | None:
+        """Hit rate across recent turns, weighted by their prompt size."""
+        if not self._turns:
+            return None
+        return sum(c for c, _ in self._turns) / sum(p for _, p in self._turns)
+
+
+def _common_prefix(a: list[dict[str, Any]], b: list[dict[str, Any]]) -> int:
+    length = 0
+    for x, y in zip(a, b, strict=False):
+        # Reused messages are the same object, so most compare by identity
+        if x is not y and x != y:
+            break
+        length += 1
+    return length
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+from collections.abc import AsyncIterator, MutableMapping, Sequence
+from contextlib import AbstractContextManager, asynccontextmanager
+from typing import Any
+
+# Poll interval while waiting on a full in-flight limit, which has no known end
+IN_FLIGHT_POLL = 0.05
+
+
+class RateLimiter:
+    """Token bucket and in-flight limits per key, optionally shared across processes.
+
+    Pass a dict and lock from a multiprocessing.Manager to coordinate bot
+    processes. Each key holds (tokens, updated_at, in_flight).
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 1.0,
+        burst: int = 5,
+        max_in_flight: int = 4,
+        state: MutableMapping[str, tuple[float, float, int]] | None = None,
+        lock: AbstractContextManager[Any] | None = None,
+    ) -> None:
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self._state = {} if state is None else state
+        self._lock = threading.Lock() if lock is None else lock
+
+    @asynccontextmanager
+    async def slot(self, keys: Sequence[str]) -> AsyncIterator[None]:
+        """Wait until every key has a token and a free slot, holding them until exit."""
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, keys)
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(self._release, keys)
+
+    def _try_acquire(self, keys: Sequence[str]) -> float:
+        """Take a token and slot for every key, or none, returning seconds to wait."""
+        now = time.time()
+        with self._lock:
+            buckets = {key: self._refill(key, now) for key in keys}
+            wait = 0.0
+            for tokens, _, in_flight in buckets.values():
+                if in_flight >= self.max_in_flight:
+                    wait = max(wait, IN_FLIGHT_POLL)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / self.requests_per_second)
+            if wait:
+                return wait
+            for key, (tokens, _, in_flight) in buckets.items():
+                self._state[key] = (tokens - 1, now, in_flight + 1)
+            return 0.0
+
+    def _release(self, keys: Sequence[str]) -> None:
+        with self._lock:
+            for key in keys:
+                tokens, updated_at, in_flight = self._state[key]
+                self._state[key] = (tokens, updated_at, max(0, in_flight - 1))
+
+    def _refill(self, key: str, now: float) -> tuple[float, float, int]:
+        tokens, updated_at, in_flight = self._state.get(key, (self.burst, now, 0))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.requests_per_second)
+        return tokens, now, in_flight
@@ -0,0 +1,116 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import secrets
+from collections import OrderedDict
+from typing import Any
+
+from .utilities import body_hash
+
+# Placeholders are plain ASCII, so they survive JSON encoding unchanged. The
+# nonce keeps message text from matching one by chance or on purpose.
+PLACEHOLDER_NONCE = secrets.token_hex(8)
+PLACEHOLDER_PATTERN = re.compile(
+    rb"@attachment:" + PLACEHOLDER_NONCE.encode() + rb":[0-9a-f]{32}@"
+)
+
+
+class RequestBody:
+    """A JSON request body whose attachments are spliced in only when encoded.
+
+    The data holds short placeholders in place of base64 file contents, so it
+    stays cheap to build, hash and copy. The encoded bytes are built once.
+    """
+
+    def __init__(
+        self, data: dict[str, Any], attachments: dict[bytes, bytes] | None = None
+    ) -> None:
+        self.data = data
+        self.attachments = attachments or {}
+        self._encoded: bytes | None = None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def replace(self, data: dict[str, Any]) -> "RequestBody":
+        """Return a body with different data and the same attachments."""
+        return RequestBody(data, self.attachments)
+
+    def digest(self) -> str:
+        # Placeholders are derived from each file's identity, so they stand in for it
+        return body_hash(self.data)
+
+    def encode(self) -> bytes:
+        if self._encoded is None:
+            encoded = json.dumps(self.data, separators=(",", ":")).encode()
+            if self.attachments:
+                # Only placeholders for this body's files are replaced
+                encoded = PLACEHOLDER_PATTERN.sub(
+                    lambda match: self.attachments.get(match.group(), match.group()),
+                    encoded,
+                )
+            self._encoded = encoded
+        return self._encoded
+
+
+class AttachmentLoader:
+    """Template function returning a placeholder for a file's base64 contents."""
+
+    def __init__(self, base_dir: str) -> None:
+        self.base_dir = base_dir
+        self.attachments: dict[bytes, bytes] = {}
+
+    def __call__(self, local_path: str) -> str:
+        path = os.path.abspath(os.path.join(self.base_dir, local_path))
+        stat = os.stat(path)
+        identity = f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+        digest = hashlib.sha256(identity.encode()).hexdigest()[:32]
+        placeholder = f"@attachment:{PLACEHOLDER_NONCE}:{digest}@"
+        self.attachments[placeholder.encode()] = base64_cache.get(
+            path, stat.st_mtime_ns, stat.st_size
+        )
+        return placeholder
+
+
+class Base64Cache:
+    """Base64-encoded files, evicting the least recently used over max_bytes."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries: OrderedDict[tuple[str, int, int], bytes] = OrderedDict()
+
+    def get(self, path: str, mtime_ns: int, size: int) -> bytes:
+        key = (path, mtime_ns, size)
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self.misses += 1
+        with open(path, "rb") as file:
+            encoded = base64.b64encode(file.read())
+        self._discard_path(path)
+        self._entries[key] = encoded
+        self.size += len(encoded)
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+        return encoded
+
+    @property
+    def hit_rate(self) -> float | None:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+    def _discard_path(self, path: str) -> None:
+        """Drop encodings of earlier versions of a file."""
+        for key in [key for key in self._entries if key[0] == path]:
+            self.size -= len(self._entries.pop(key))
+
+
+# Shared by every executor, so post-processing and variations reuse encodings
+base64_cache = Base64Cache()
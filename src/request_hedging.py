@@ -0,0 +1,59 @@
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any
+
+
+class LatencyTracker:
+    """Recent time-to-first-byte samples, kept per model.
+
+    Streamed and whole responses are kept apart, as the first byte of a whole
+    response only arrives once it has been generated.
+    """
+
+    def __init__(self, max_samples: int = 100) -> None:
+        self._samples: defaultdict[tuple[str, bool], deque[float]] = defaultdict(
+            lambda: deque(maxlen=max_samples)
+        )
+
+    def record(self, model: str, seconds: float, stream: bool = False) -> None:
+        self._samples[model, stream].append(seconds)
+
+    def percentile(
+        self, model: str, fraction: float, min_samples: int, stream: bool = False
+    ) -> float | None:
+        """Return the latency at the given fraction, or None without enough samples."""
+        samples = sorted(self._samples.get((model, stream), ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+@dataclass
+class HedgePolicy:
+    """When to race a slow request against a duplicate, and where to send it."""
+
+    percentile: float = 0.9
+    min_samples: int = 20
+    min_delay: float = 1.0
+    provider: str | None = None
+
+    def delay(
+        self, tracker: LatencyTracker, model: str, stream: bool = False
+    ) -> float | None:
+        """Seconds to wait for a first byte before hedging, or None to never hedge."""
+        latency = tracker.percentile(model, self.percentile, self.min_samples, stream)
+        return None if latency is None else max(latency, self.min_delay)
+
+    def hedge_body(self, body: dict[str, Any]) -> dict[str, Any]:
+        if not self.provider:
+            return body
+        provider = {
+            **body.get("provider", {}),
+            "order": [self.provider],
+            "allow_fallbacks": False,
+        }
+        return {**body, "provider": provider}
+
+    @staticmethod
+    def from_dict(data: dict[str, Any] | None) -> "HedgePolicy | None":
+        return None if data is None else HedgePolicy(**data)
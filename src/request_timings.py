@@ -0,0 +1,41 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class RequestTimings:
+    """Seconds spent in each phase of a completion request."""
+
+    wait: float = 0.0  # Rate limiting, retries and hedging before the winning attempt
+    connect: float = 0.0  # Opening a connection, zero when a pooled one was reused
+    tls: float = 0.0
+    first_byte: float = 0.0  # Queueing and prompt processing upstream
+    generation: float = 0.0  # Receiving the rest of the response
+    completion_tokens: int = 0
+
+    @property
+    def total(self) -> float:
+        return self.wait + self.connect + self.tls + self.first_byte + self.generation
+
+    @property
+    def tokens_per_second(self) -> float | None:
+        if not self.completion_tokens or self.generation <= 0:
+            return None
+        return self.completion_tokens / self.generation
+
+    def record(
+        self,
+        requested: float,
+        started: float,
+        connected: float,
+        secured: float,
+        first_byte: float,
+        finished: float,
+        completion_tokens: int,
+    ) -> None:
+        """Set the phases from monotonic timestamps marking their boundaries."""
+        self.wait = started - requested
+        self.connect = connected - started
+        self.tls = secured - connected
+        self.first_byte = first_byte - secured
+        self.generation = finished - first_byte
+        self.completion_tokens = completion_tokens
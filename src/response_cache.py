@@ -0,0 +1,80 @@
+import contextlib
+import json
+import os
+import time
+from typing import Any
+
+
+class ResponseCache:
+    """On-disk LRU cache of completion responses, bounded by total size and age."""
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 50 * 1024 * 1024,
+        ttl: float = 30 * 24 * 60 * 60,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            expired = time.time() - entry["created_at"] > self.ttl
+            response = entry["response"]
+        except (OSError, ValueError, KeyError, TypeError):
+            # Unreadable or malformed entries are misses, replaced by the next put
+            self.misses += 1
+            return None
+        if expired:
+            self._remove(path)
+            self.misses += 1
+            return None
+        # Recency is tracked by modification time for eviction
+        os.utime(path)
+        self.hits += 1
+        return response
+
+    def put(self, key: str, response: dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"created_at": time.time(), "response": response}, f)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def purge(self) -> int:
+        """Remove every entry, returning how many were removed."""
+        entries = self._entries()
+        for entry in entries:
+            self._remove(entry.path)
+        return len(entries)
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            self._remove(entry.path)
+
+    def _entries(self) -> list[os.DirEntry]:
+        if not os.path.isdir(self.directory):
+            return []
+        with os.scandir(self.directory) as it:
+            return [entry for entry in it if entry.name.endswith(".json")]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
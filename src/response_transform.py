@@ -24,10 +24,29 @@ def transform_response(
     return re.sub(r"\n{3,}", "\n\n", content).strip()
 
 
+def transform_partial(content: str, patterns: list[Pattern] | None = None) -> str:
+    """Transform a response still being generated into the text to display.
+
+    Patterns are applied as to the final response, so the text does not change
+    once it is complete, but they do not notify until then.
+    """
+    content = content.strip()
+    if patterns:
+        content = _apply_patterns(content, patterns, notify=False)
+    return strip_partial_tags(re.sub(r"\n{3,}", "\n\n", content).strip())
+
+
 def strip_tags(content: str) -> str:
     return re.sub(r"<[^>]+>.*?</[^>]+>", "", content, flags=re.DOTALL).strip()
 
 
+def strip_partial_tags(content: str) -> str:
+    """Strip tags from a response still being generated, hiding unclosed blocks."""
+    content = strip_tags(content)
+    match = re.search(r"<[^>]*", content)
+    return content[: match.start()].strip() if match else content
+
+
 def extract_tag(content: str, tag: str) -> tuple[str | None, str]:
     """Remove the first <tag> block and any orphan tags"""
     match = re.search(rf"<{tag}>\s*(.*?)\s*</{tag}>", content, flags=re.DOTALL)
@@ -38,10 +57,10 @@ def extract_tag(content: str, tag: str) -> tuple[str | None, str]:
     return match.group(1), remainder
 
 
-def _apply_patterns(content: str, patterns: list[Pattern]) -> str:
+def _apply_patterns(content: str, patterns: list[Pattern], notify: bool = True) -> str:
     for p in patterns:
         if re.search(p.pattern, content, flags=re.DOTALL):
-            if p.notify:
+            if p.notify and notify:
                 notifications.send(p.notify)
             if p.replacement is not None:
                 content = re.sub(p.pattern, p.replacement, content, flags=re.DOTALL)
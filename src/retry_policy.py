@@ -0,0 +1,171 @@
+import asyncio
+import random
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import httpx
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class APIError(RuntimeError):
+    """An error reported in the body of an API response."""
+
+    def __init__(self, error: Any, response: httpx.Response | None = None) -> None:
+        super().__init__(error)
+        self.response = response
+        code = error.get("code") if isinstance(error, dict) else None
+        self.status_code = code if isinstance(code, int) else None
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures, letting a trial through later."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def check(self, model: str) -> None:
+        if self.state == "open":
+            assert self._opened_at is not None
+            wait = self.reset_timeout - (time.monotonic() - self._opened_at)
+            raise CircuitOpenError(
+                f"{model} is failing repeatedly, try again in {wait:.0f}s"
+            )
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """Retries transient upstream failures, with a circuit breaker per model.
+
+    Rate limits and overloads are retried after any Retry-After the server asks
+    for. Client errors, such as invalid requests and content refusals, are not.
+    A call that fails after its retries counts once towards opening the circuit,
+    unless it was rate limited, as that says nothing about the model's health.
+    """
+
+    def __init__(
+        self,
+        max_tries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_retry_after: float = 60.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60.0,
+    ) -> None:
+        self.max_tries = max_tries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._retries: Counter[str] = Counter()
+
+    async def call(self, model: str, request: Callable[[], Awaitable[Any]]) -> Any:
+        breaker = self._breaker(model)
+        for attempt in range(1, self.max_tries + 1):
+            breaker.check(model)
+            try:
+                result = await request()
+            except Exception as e:
+                delay = self.retry_delay(e, attempt)
+                if delay is None or attempt == self.max_tries:
+                    # Counted once per call, as its retries share one cause
+                    if self._is_failure(e):
+                        breaker.record_failure()
+                    raise
+                self._retries[model] += 1
+                await asyncio.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+        raise AssertionError("unreachable")
+
+    def retry_delay(self, error: Exception, attempt: int) -> float | None:
+        """Seconds to wait before retrying after an error, or None not to retry."""
+        if not self._is_transient(error):
+            return None
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, delay)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Retry counts and breaker state per model, for monitoring."""
+        return {
+            model: {
+                "retries": self._retries[model],
+                "failures": breaker.failures,
+                "circuit": breaker.state,
+            }
+            for model, breaker in self._breakers.items()
+        }
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(
+                self._failure_threshold, self._reset_timeout
+            )
+        return self._breakers[model]
+
+    @classmethod
+    def _is_transient(cls, error: Exception) -> bool:
+        if isinstance(error, httpx.HTTPStatusError | APIError):
+            return cls._status_code(error) in RETRYABLE_STATUSES
+        return isinstance(error, httpx.TransportError)
+
+    @classmethod
+    def _is_failure(cls, error: Exception) -> bool:
+        """Whether an error counts towards opening the model's circuit."""
+        return cls._is_transient(error) and cls._status_code(error) != 429
+
+    @staticmethod
+    def _status_code(error: Exception) -> int | None:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code
+        if isinstance(error, APIError):
+            return error.status_code
+        return None
+
+    @staticmethod
+    def _retry_after(error: Exception) -> float | None:
+        response = getattr(error, "response", None)
+        value = response.headers.get("Retry-After") if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, retry_at - time.time())
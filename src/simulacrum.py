@@ -1,24 +1,37 @@
 import asyncio
 import re
 import textwrap
-from collections.abc import Coroutine, Iterator
+from collections.abc import AsyncIterator, Callable, Coroutine, Iterator
 from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any
 
+import httpx
+
 from . import notifications
 from .book_reader import BookReader
+from .compaction import Compaction, CompactionPolicy
 from .context import Context
 from .document_cleaner import clean_document
 from .instruction_preset import InstructionPreset
 from .lm_executors import ChatExecutor, ExperimentExecutor
-from .message import Message
-from .response_transform import extract_tag, strip_tags, transform_response
+from .message import Message, digest_messages
+from .prompt_cache import CacheHitRate
+from .response_transform import (
+    extract_tag,
+    strip_tags,
+    transform_partial,
+    transform_response,
+)
+from .summarizer import summarize
+from .token_counter import count_tokens
 from .utilities import parse_value
 
 if TYPE_CHECKING:
     from .chat_completion import ChatCompletion
 
+PartialCallback = Callable[[str], None]
+
 
 @dataclass
 class PendingInstruction:
@@ -48,12 +61,15 @@ class Simulacrum:
         self._pending_instruction: PendingInstruction | None = None
         self.retry_stack: list[list[Message]] = []
         self._current_task: asyncio.Task | None = None
+        self._compaction_task: asyncio.Task | None = None
+        self.cache_hit_rate = CacheHitRate()
 
     async def chat(
         self,
         user_input: str | None,
         image: str | None,
         documents: list[str] | None,
+        on_partial: PartialCallback | None = None,
     ) -> str:
         with self.context.session() as session:
             user_input, metadata = self._parse_user_input(user_input)
@@ -63,15 +79,35 @@ class Simulacrum:
                 self.retry_stack.clear()
                 self.context.add_message("user", user_input, image, metadata)
             self.context.save()
-            generation = await self._generate()
+            generation = await self._generate(on_partial=on_partial)
             gen_metadata = {"draft": generation.draft} if generation.draft else None
             if gen_metadata and generation.editor_notes:
                 gen_metadata["editor_notes"] = generation.editor_notes
             self.context.add_message(
                 "assistant", generation.content, metadata=gen_metadata
             )
+        self._schedule_compaction()
         return generation.display if not session.superseded else ""
 
+    async def chat_stream(
+        self,
+        user_input: str | None,
+        image: str | None,
+        documents: list[str] | None,
+    ) -> AsyncIterator[str]:
+        """Chat, yielding the display text as it streams in and then the final reply."""
+        partials: asyncio.Queue[str | None] = asyncio.Queue()
+        task = asyncio.create_task(
+            self.chat(user_input, image, documents, on_partial=partials.put_nowait)
+        )
+        task.add_done_callback(lambda _: partials.put_nowait(None))
+        try:
+            while (partial := await partials.get()) is not None:
+                yield partial
+            yield await task
+        finally:
+            task.cancel()
+
     async def new_conversation(self) -> None:
         self.retry_stack.clear()
         with self.context.session():
@@ -210,15 +246,49 @@ class Simulacrum:
         with self.context.session():
             return self.context.name_conversation(name)
 
+    def _schedule_compaction(self) -> None:
+        """Summarize older turns in the background once over the threshold."""
+        policy = self.context.compaction_policy
+        if not policy or (self._compaction_task and not self._compaction_task.done()):
+            return
+        messages = self.context.conversation_messages
+        if count := policy.compactable(messages):
+            self._compaction_task = asyncio.create_task(
+                self._compact(policy, messages[:count])
+            )
+
+    async def _compact(self, policy: CompactionPolicy, messages: list[Message]) -> None:
+        model = policy.model or self.context.model
+        try:
+            completion = await summarize(messages, policy.prompt, model)
+        except (httpx.HTTPError, RuntimeError) as e:
+            notifications.send(f"Compaction failed: {str(e) or type(e).__name__}")
+            return
+        self.context.queue_compaction(
+            Compaction(
+                len(messages),
+                digest_messages(messages),
+                completion.content,
+                completion.cost,
+            )
+        )
+        notifications.send(f"Compacted {len(messages)} messages into memories")
+
     async def _generate(
         self,
         skip_required_tags: bool = False,
         skip_injected_prompt: bool = False,
         skip_post_process: bool = False,
+        on_partial: PartialCallback | None = None,
     ) -> Generation:
+        post_process = not skip_post_process and bool(self.context.post_process_prompt)
         executor_cls = ExperimentExecutor if self.experiment_mode else ChatExecutor
         executor = executor_cls(self.context, skip_injected_prompt=skip_injected_prompt)
-        completion = await self._execute_with_cancellation(executor.execute())
+        # Only the pass whose output is displayed is streamed
+        primary_partial = None if post_process else self._display_partial(on_partial)
+        completion = await self._execute_with_cancellation(
+            executor.execute(on_partial=primary_partial)
+        )
         self.last_completion = completion
         self.last_post_process_completion = None
         required_tags = (
@@ -229,15 +299,27 @@ class Simulacrum:
         )
         draft = None
         editor_notes = None
-        if not skip_post_process and self.context.post_process_prompt:
+        if post_process:
             draft = content
-            content, editor_notes = await self._post_process(draft)
+            content, editor_notes = await self._post_process(
+                draft, self._display_partial(on_partial)
+            )
+        self._record_cache_hits()
         display = strip_tags(content)
         if not display:
             raise ValueError("No displayable content")
         return Generation(content, display, draft, editor_notes)
 
-    async def _post_process(self, draft: str) -> tuple[str, str | None]:
+    def _record_cache_hits(self) -> None:
+        completions = [self.last_completion, self.last_post_process_completion]
+        turn = [c for c in completions if c]
+        self.cache_hit_rate.record(
+            sum(c.cached_tokens for c in turn), sum(c.prompt_tokens for c in turn)
+        )
+
+    async def _post_process(
+        self, draft: str, on_partial: PartialCallback | None = None
+    ) -> tuple[str, str | None]:
         """Re-generate the draft under the post-processing prompt."""
         instruction = f"<instruct>\n{self.context.post_process_prompt}\n</instruct>"
         with (
@@ -250,7 +332,7 @@ class Simulacrum:
                 request_key="post_process",
             )
             completion = await self._execute_with_cancellation(
-                executor.execute(self.context.post_process_params)
+                executor.execute(self.context.post_process_params, on_partial)
             )
         self.last_post_process_completion = completion
         editor_notes, content = extract_tag(completion.content, "assessment")
@@ -269,6 +351,24 @@ class Simulacrum:
                 skip_post_process=True,
             )
 
+    def _display_partial(
+        self, on_partial: PartialCallback | None
+    ) -> PartialCallback | None:
+        """Wrap a partial callback to receive only new, displayable text."""
+        if not on_partial:
+            return None
+        patterns = self.context.response_patterns
+        shown = ""
+
+        def callback(content: str) -> None:
+            nonlocal shown
+            display = transform_partial(content, patterns)
+            if display and display != shown:
+                shown = display
+                on_partial(display)
+
+        return callback
+
     @contextmanager
     def _temporary_message(self, role: str, content: str) -> Iterator[None]:
         """Add a message for the duration of a request without persisting it."""
@@ -370,7 +470,7 @@ class Simulacrum:
         prompt = self.context.document_cleanup_prompt
         for document in documents:
             document = await clean_document(document, prompt)
-            tokens = len(document) // 4
+            tokens = count_tokens(document)
             notifications.send(f"Document added: {tokens:,} tokens")
             text = self._append_document(text, document)
         return text
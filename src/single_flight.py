@@ -0,0 +1,117 @@
+import asyncio
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+@dataclass
+class _StreamFlight:
+    # Items so far, replayed to callers that join late
+    items: list[Any] = field(default_factory=list)
+    # Resolved when the next item arrives
+    arrived: asyncio.Future = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+    task: asyncio.Task | None = None
+    waiters: int = 0
+
+
+class SingleFlight:
+    """Lets concurrent calls with the same key share one in-flight result."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self._flights: dict[str, _Flight] = {}
+        self._streams: dict[str, _StreamFlight] = {}
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight:
+            self.hits += 1
+        else:
+            self.misses += 1
+            flight = _Flight(asyncio.ensure_future(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+        flight.waiters += 1
+        try:
+            # Shielded so one caller giving up does not cancel it for the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+    def stream(
+        self, key: str, call: Callable[[], AsyncGenerator[Any]]
+    ) -> AsyncGenerator[Any]:
+        """Iterate the call's items, sharing them with identical calls in flight.
+
+        Callers that join late get the items so far first. The call is closed
+        once every caller has stopped iterating.
+        """
+        flight = self._streams.get(key)
+        if flight:
+            self.hits += 1
+        else:
+            self.misses += 1
+            flight = _StreamFlight()
+            flight.task = asyncio.create_task(self._pump(flight, call))
+            self._streams[key] = flight
+            flight.task.add_done_callback(lambda _: self._land_stream(key, flight))
+        flight.waiters += 1
+        return self._follow(flight)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights) + len(self._streams)
+
+    def _land(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _land_stream(self, key: str, flight: _StreamFlight) -> None:
+        if self._streams.get(key) is flight:
+            del self._streams[key]
+
+    @staticmethod
+    async def _pump(
+        flight: _StreamFlight, call: Callable[[], AsyncGenerator[Any]]
+    ) -> None:
+        async with aclosing(call()) as items:
+            async for item in items:
+                flight.items.append(item)
+                flight.arrived.set_result(None)
+                flight.arrived = asyncio.get_running_loop().create_future()
+
+    @staticmethod
+    async def _follow(flight: _StreamFlight) -> AsyncGenerator[Any]:
+        assert flight.task is not None
+        try:
+            index = 0
+            while True:
+                if index < len(flight.items):
+                    yield flight.items[index]
+                    index += 1
+                elif flight.task.done():
+                    # Raises the call's error, after the items before it
+                    flight.task.result()
+                    return
+                else:
+                    # Waiting this way does not cancel either for other callers
+                    await asyncio.wait(
+                        [flight.arrived, flight.task],
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
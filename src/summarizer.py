@@ -0,0 +1,31 @@
+from .api_client import fetch_completion
+from .chat_completion import ChatCompletion
+from .message import Message
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below for the assistant who will continue it. "
+    "Keep names, facts, decisions, unresolved threads and the emotional tone. "
+    "If a previous summary is given, fold it in. Reply with the summary only."
+)
+
+
+async def summarize(
+    messages: list[Message],
+    prompt: str,
+    model: str,
+    previous: str | None = None,
+) -> ChatCompletion:
+    """Summarize messages with an LLM, extending a previous summary if given."""
+    transcript = "\n\n".join(
+        f"{m.role.upper()}:\n{m.display_text}" for m in messages if m.display_text
+    )
+    if previous:
+        transcript = f"<summary>\n{previous}\n</summary>\n\n{transcript}"
+    body = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": transcript},
+        ],
+    }
+    return ChatCompletion(await fetch_completion(body, request_timeout=120))
@@ -9,7 +9,10 @@ import aiofiles
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
 from telegram.request import HTTPXRequest
 
+from .. import api_client
+from ..cache_warmer import CacheWarmer
 from ..cost_tracker import CostTracker
+from ..request_body import base64_cache
 from ..simulacrum import Simulacrum
 from ..utilities import PROJECT_ROOT, extract_url_content
 from .filters import StaleMessageFilter
@@ -40,11 +43,14 @@ class TelegramBot:
             .token(telegram_token)
             .request(request)
             .concurrent_updates(True)
+            .post_init(self._start_cache_warmer)
+            .post_shutdown(self._close_api_client)
         )
         if bot_api:
             builder = builder.base_url(f"{bot_api}/bot").local_mode(True)
         self.app = builder.build()
         self.sim = Simulacrum(context_filepath)
+        self.cache_warmer = CacheWarmer(self.sim)
         self.cost_tracker = CostTracker()
 
         self._register_handlers(authorized_user)
@@ -133,10 +139,10 @@ class TelegramBot:
     @message_handler
     async def _compact_conversation(self, ctx: TelegramContext) -> None:
         if self.sim.has_messages():
-            old_size, new_size = self.sim.compact_conversation()
+            old_tokens, new_tokens = self.sim.compact_conversation()
             self.cost_tracker.reset()
             await ctx.send_message(
-                f"`✅ Compacted: {old_size // 4:,} → {new_size // 4:,} tokens`"
+                f"`✅ Compacted: {old_tokens:,} → {new_tokens:,} tokens`"
             )
         else:
             await ctx.send_message("`❌ No messages in conversation`")
@@ -194,7 +200,8 @@ class TelegramBot:
     @message_handler
     async def _stats(self, ctx: TelegramContext) -> None:
         conversation_cost = (
-            f"*Conversation*\n`Cost: ${self.sim.get_conversation_cost():.2f}`"
+            f"*Conversation*\n`Cost: ${self.sim.get_conversation_cost():.2f}`\n"
+            f"`Size: {self.sim.context.conversation_tokens:,} tokens`"
         )
 
         last_message_stats = "*Last Message*\n"
@@ -206,13 +213,45 @@ class TelegramBot:
                 f"`Cached tokens: {lc.cached_tokens}`",
                 f"`Completion tokens: {lc.completion_tokens}`",
             ]
+            if (w := lc.window) and w.dropped:
+                summarized = " · summarized" if w.summarized else ""
+                lines.append(
+                    f"`Trimmed: {len(w.dropped)} messages "
+                    f"(~{w.dropped_tokens:,} tokens){summarized}`"
+                )
             if pp := self.sim.last_post_process_completion:
                 lines.append(f"`Post-processing: ${pp.cost:.4f}`")
+            if (t := lc.timings) and t.total:
+                lines += [
+                    f"`Time: {t.total:.2f}s`",
+                    f"`Wait: {t.wait:.2f}s · Connect: {t.connect:.2f}s · "
+                    f"TLS: {t.tls:.2f}s`",
+                    f"`First byte: {t.first_byte:.2f}s · "
+                    f"Generation: {t.generation:.2f}s`",
+                ]
+                if t.tokens_per_second:
+                    lines.append(f"`Speed: {t.tokens_per_second:.0f} tokens/s`")
             last_message_stats += "\n".join(lines)
         else:
             last_message_stats += "`Not available`"
 
-        await ctx.send_message(f"{conversation_cost}\n\n{last_message_stats}")
+        message = f"{conversation_cost}\n\n{last_message_stats}"
+        if api := api_client.retry_policy.stats().get(self.sim.context.model):
+            message += (
+                f"\n\n*API*\n`Retries: {api['retries']}`\n`Circuit: {api['circuit']}`"
+            )
+        hit_rates = self.sim.cache_hit_rate
+        if hit_rates.last is not None and hit_rates.overall is not None:
+            message += (
+                f"\n\n*Prompt Cache*\n`Last turn: {hit_rates.last:.0%}`\n"
+                f"`Last {hit_rates.turns} turns: {hit_rates.overall:.0%}`"
+            )
+        if (hit_rate := base64_cache.hit_rate) is not None:
+            message += (
+                f"\n\n*Image Cache*\n`Hit rate: {hit_rate:.0%}`\n"
+                f"`Size: {base64_cache.size / 1e6:.1f} MB`"
+            )
+        await ctx.send_message(message)
 
     @message_handler
     async def _clear(self, ctx: TelegramContext) -> None:
@@ -356,6 +395,13 @@ class TelegramBot:
     async def _do_nothing(self, *_) -> None:
         pass
 
+    async def _start_cache_warmer(self, _app) -> None:
+        self.cache_warmer.start()
+
+    async def _close_api_client(self, _app) -> None:
+        await self.cache_warmer.stop()
+        await api_client.close_client()
+
     async def _chat(
         self,
         ctx: TelegramContext,
@@ -363,11 +409,9 @@ class TelegramBot:
         image: str | None = None,
         documents: list[str] | None = None,
     ) -> None:
-        response = await self.sim.chat(user_message, image, documents)
-        if not response:
-            return
-        await ctx.send_response(response)
-        await self._warn_cost(ctx)
+        stream = self.sim.chat_stream(user_message, image, documents)
+        if await ctx.stream_response(stream):
+            await self._warn_cost(ctx)
 
     async def _warn_cost(self, ctx: TelegramContext) -> None:
         warnings = self.cost_tracker.get_cost_warnings(
@@ -1,6 +1,8 @@
 import os
 import re
+import time
 import uuid
+from collections.abc import AsyncIterator
 
 import aiofiles
 import backoff
@@ -11,6 +13,8 @@ from ..utilities import parse_pdf
 
 
 class TelegramContext:
+    STREAM_EDIT_INTERVAL = 1.0
+
     def __init__(self, app, update, context) -> None:
         self.app = app
         self.update = update
@@ -46,13 +50,37 @@ class TelegramContext:
         return self._message.text or self._message.caption
 
     async def send_response(self, text: str) -> None:
-        # Italicize parenthetical asides
-        text = text.replace("(", "_(").replace(")", ")_")
+        await self.send_message(self._format_response(text))
 
-        # Attempt to fix broken markdown
-        if text.count("_") % 2 != 0 and text.endswith("_"):
-            text = text[:-1]
-        await self.send_message(text)
+    async def stream_response(self, texts: AsyncIterator[str]) -> bool:
+        """Show a streamed response as it grows, the last text being the final one.
+
+        Returns whether a final response was delivered.
+        """
+        sent: list[tuple[int, str]] = []
+        previous: str | None = None
+        last_update = 0.0
+        try:
+            async for text in texts:
+                due = time.monotonic() - last_update >= self.STREAM_EDIT_INTERVAL
+                # Lag one behind so the final text is only rendered formatted
+                if previous and (not sent or due):
+                    await self._update_messages(sent, previous)
+                    last_update = time.monotonic()
+                previous = text
+        except BaseException:
+            # A reply that failed or was cancelled leaves no partial text behind
+            await self._update_messages(sent, "")
+            raise
+        if not previous:
+            await self._update_messages(sent, "")
+            return False
+        if not sent:
+            await self.send_response(previous)
+        else:
+            formatted = self._format_response(previous)
+            await self._update_messages(sent, formatted, parse_mode="Markdown")
+        return True
 
     @backoff.on_exception(backoff.expo, TimedOut, max_tries=5)
     async def send_message(self, text: str) -> None:
@@ -75,6 +103,16 @@ class TelegramContext:
     def _message(self):
         return self.update.message
 
+    @staticmethod
+    def _format_response(text: str) -> str:
+        # Italicize parenthetical asides
+        text = text.replace("(", "_(").replace(")", ")_")
+
+        # Attempt to fix broken markdown
+        if text.count("_") % 2 != 0 and text.endswith("_"):
+            text = text[:-1]
+        return text
+
     @staticmethod
     def _split_message(text: str, max_length: int = 4096) -> list[str]:
         if len(text) <= max_length:
@@ -91,6 +129,51 @@ class TelegramContext:
         tail = text[idx:].lstrip()
         return [head, *TelegramContext._split_message(tail, max_length)]
 
+    async def _update_messages(
+        self,
+        sent: list[tuple[int, str]],
+        text: str,
+        parse_mode: str | None = None,
+    ) -> None:
+        """Edit, send or delete messages in place so that they show the text."""
+        chunks = self._split_message(text) if text else []
+        for i, chunk in enumerate(chunks):
+            if i >= len(sent):
+                message = await self._send_chunk(chunk, parse_mode)
+                sent.append((message.message_id, chunk))
+            elif sent[i][1] != chunk or parse_mode:
+                await self._edit_chunk(sent[i][0], chunk, parse_mode)
+                sent[i] = (sent[i][0], chunk)
+        while len(sent) > len(chunks):
+            message_id, _ = sent.pop()
+            await self.app.bot.delete_message(self._chat_id, message_id)
+
+    @backoff.on_exception(backoff.expo, TimedOut, max_tries=5)
+    async def _send_chunk(self, chunk: str, parse_mode: str | None):
+        try:
+            return await self.app.bot.send_message(
+                self._chat_id, chunk, parse_mode=parse_mode
+            )
+        except BadRequest:
+            if not parse_mode:
+                raise
+            return await self.app.bot.send_message(self._chat_id, chunk)
+
+    @backoff.on_exception(backoff.expo, TimedOut, max_tries=5)
+    async def _edit_chunk(
+        self, message_id: int, chunk: str, parse_mode: str | None
+    ) -> None:
+        try:
+            await self.app.bot.edit_message_text(
+                chunk, self._chat_id, message_id, parse_mode=parse_mode
+            )
+        except BadRequest as e:
+            if "not modified" in str(e):
+                return
+            if not parse_mode:
+                raise
+            await self.app.bot.edit_message_text(chunk, self._chat_id, message_id)
+
     async def _transcribe_voice(self) -> str:
         file_id = self._message.voice.file_id
         voice_file = await self.context.bot.get_file(file_id)
@@ -0,0 +1,24 @@
+import os
+
+from jinja2 import FileSystemBytecodeCache
+from jinja2.bccache import Bucket
+
+from .utilities import PROJECT_ROOT
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    """Compiled file templates on disk, reused across restarts until they change.
+
+    The directory is created on first write, and a failed write only costs a
+    recompile after the next restart.
+    """
+
+    def __init__(self, name: str) -> None:
+        super().__init__(os.path.join(PROJECT_ROOT, ".cache", "templates", name))
+
+    def dump_bytecode(self, bucket: Bucket) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
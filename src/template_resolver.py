@@ -1,72 +1,256 @@
 import copy
+import functools
 import os
 import re
+from collections.abc import Iterator, Mapping, Sequence
 from typing import Any
 
-from jinja2 import TemplateSyntaxError
+from jinja2 import FileSystemLoader, Template, TemplateSyntaxError, meta, nodes
 from jinja2.nativetypes import NativeEnvironment
 
+from .file_cache import FileCache
+from .template_cache import BytecodeCache
+
+# Shared by all resolvers, so files loaded by absolute path compile once and are
+# recompiled only when their mtime changes, or after a restart only if changed
+_env = NativeEnvironment(
+    trim_blocks=True,
+    lstrip_blocks=True,
+    autoescape=False,
+    loader=FileSystemLoader("/"),
+    auto_reload=True,
+    bytecode_cache=BytecodeCache("resolver"),
+)
+
+
+def _variables_read(ast: nodes.Template) -> frozenset[str]:
+    """Names a template reads from its context, in any branch."""
+    return frozenset(meta.find_undeclared_variables(ast))
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(source: str) -> tuple[Template, frozenset[str]]:
+    """Compile an inline template once per process, while it is in use."""
+    ast = _env.parse(source)
+    # Read first, as compiling may optimize the tree in place
+    variables = _variables_read(ast)
+    return _env.from_string(ast), variables
+
+
+# The variables each template file reads, and its version
+_template_files = FileCache(
+    lambda source: _variables_read(_env.parse(source)), max_entries=256
+)
+
 
 class TemplateResolver:
     def __init__(self, base_dir: str, search_dirs: list[str] | None = None) -> None:
         self._base_dir = base_dir
         self._search_dirs = search_dirs or []
-        self._dir_stack = [base_dir]
-        self._env = NativeEnvironment(
-            trim_blocks=True, lstrip_blocks=True, autoescape=False
-        )
-        self._env.globals["load_string"] = self._load_string
-        self._env.globals["load_section"] = self._load_section
-        self._variables: dict[str, Any] = {}
+        self._last: ResolvedData | None = None
+
+    @property
+    def search_dirs(self) -> list[str]:
+        return self._search_dirs
 
     def resolve(
         self, data: dict[str, Any], extra_vars: dict[str, Any]
-    ) -> dict[str, Any]:
-        """Resolve all Jinja templates in data using iterative passes."""
-        self._variables = {**copy.deepcopy(data), **extra_vars}
+    ) -> "ResolvedData":
+        """Resolve the Jinja templates in data, each key when first read.
+
+        Keys the last resolve rendered keep their values, unless their input
+        changed or they read a changed key or template file.
+        """
+        inputs = copy.deepcopy({**data, **extra_vars})
+        last = self._last
+        stale = last.stale_keys(inputs) if last else set(inputs)
+        if last and not stale:
+            return last
+        self._last = ResolvedData(
+            self._base_dir, self._search_dirs, inputs, last, stale
+        )
+        return self._last
+
+
+class ResolvedData(Mapping[str, Any]):
+    """Data from one resolve, each key rendered on first access after those it
+    reads, and kept for the rest of the resolve.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        search_dirs: list[str],
+        inputs: dict[str, Any],
+        last: "ResolvedData | None" = None,
+        stale: set[str] | None = None,
+    ) -> None:
+        self._base_dir = base_dir
+        self._search_dirs = search_dirs
+        self._dir_stack = [base_dir]
+        self._functions = {
+            "load_string": self._load_string,
+            "load_section": self._load_section,
+        }
+        self._inputs = inputs
+        self._variables = dict(inputs)
+        self._pending = set(inputs)
+        self._resolving: list[str] = []
+        # Paths of the values being rendered, such as ("char", "intro"), and of
+        # those rendered
+        self._rendering: list[tuple[Any, ...]] = []
+        self._rendered: set[tuple[Any, ...]] = set()
+        # Keys holding dicts or lists that templates read before they were fully
+        # rendered, whose values render as they are read
+        self._open: set[str] = set()
+        # What each rendered key read, to tell when it must render again
+        self._reads: dict[str, set[str]] = {}
+        self._files: dict[str, dict[str, str | None]] = {}
+        if last:
+            done = last._reads.keys() - last._pending
+            for key in done & inputs.keys() - (stale or set()):
+                self._variables[key] = last._variables[key]
+                self._reads[key] = last._reads[key]
+                self._files[key] = last._files[key]
+                self._pending.discard(key)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._variables:
+            raise KeyError(key)
+        self._resolve_key(key)
+        return self._variables[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._variables
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._variables)
+
+    def __len__(self) -> int:
+        return len(self._variables)
+
+    def stale_keys(self, inputs: dict[str, Any]) -> set[str]:
+        """Keys whose values from this resolve cannot be kept with new inputs."""
+        stale = {
+            k
+            for k in inputs.keys() | self._inputs.keys()
+            if k not in inputs or k not in self._inputs or inputs[k] != self._inputs[k]
+        }
+        for key, files in self._files.items():
+            if any(_template_files.version(p) != v for p, v in files.items()):
+                stale.add(key)
+        while dependents := {
+            k for k, reads in self._reads.items() if k not in stale and reads & stale
+        }:
+            stale |= dependents
+        return stale
+
+    def _resolve_key(self, key: str) -> None:
+        if key not in self._pending:
+            return
+        if key not in self._reads:
+            # Rendered in place, on a copy of the input
+            self._variables[key] = copy.deepcopy(self._inputs[key])
+            self._reads[key] = set()
+            self._files[key] = {}
+        elif not isinstance(self._variables[key], dict | list):
+            raise self._cycle((key,))
+        if self._rendering and _has_templates(self._variables[key]):
+            # Read by a template, so only the values it reads render for now
+            self._open.add(key)
+            return
+        self._resolving.append(key)
+        # Files a key loads are relative to the base, even if another file
+        # being rendered needed the key first
+        self._dir_stack.append(self._base_dir)
+        try:
+            self._resolve_item(self._variables, key, (key,))
+        except BaseException:
+            # Not kept by the next resolve, as it was not fully read
+            self._variables[key] = self._inputs[key]
+            self._rendered = {p for p in self._rendered if p[0] != key}
+            self._open.discard(key)
+            del self._reads[key], self._files[key]
+            raise
+        finally:
+            self._dir_stack.pop()
+            self._resolving.pop()
+        self._open.discard(key)
+        self._pending.discard(key)
+
+    def _resolve_item(self, container: Any, index: Any, path: tuple[Any, ...]) -> None:
+        """Render the value at container[index] in place, and any values in it."""
+        value = container[index]
+        if isinstance(value, dict):
+            for k in list(value):
+                self._resolve_item(value, k, (*path, k))
+        elif isinstance(value, list):
+            for i in range(len(value)):
+                self._resolve_item(value, i, (*path, i))
+        elif path in self._rendering:
+            raise self._cycle(path)
+        elif _is_template(value) and path not in self._rendered:
+            self._rendering.append(path)
+            try:
+                container[index] = self._render(value)
+            finally:
+                self._rendering.pop()
+            self._rendered.add(path)
+
+    def _resolve_partial(
+        self, container: Any, index: Any, path: tuple[Any, ...]
+    ) -> Any:
+        """Read a value in an open key, rendering it first."""
+        value = container[index]
+        if isinstance(value, dict | list):
+            return _partial(self, path, value)
+        self._resolving.append(path[0])
+        self._dir_stack.append(self._base_dir)
+        try:
+            self._resolve_item(container, index, path)
+        finally:
+            self._dir_stack.pop()
+            self._resolving.pop()
+        return container[index]
+
+    def _cycle(self, path: tuple[Any, ...]) -> ValueError:
+        chain = [*self._rendering[self._rendering.index(path) :], path]
+        names = [".".join(str(part) for part in p) for p in chain]
+        return ValueError(f"Template cycle: {' -> '.join(names)}")
 
+    def _render(self, source: str) -> Any:
+        # A template may render to another template, which is rendered in turn
         for _ in range(10):
-            self._variables, changed = self._resolve_value(self._variables)
-            if not changed:
-                return self._variables
-
-        raise RuntimeError("Template resolution did not converge")
-
-    def _resolve_value(self, obj: Any) -> tuple[Any, bool]:
-        if isinstance(obj, dict):
-            changed = False
-            result: dict[str, Any] = {}
-            for k, v in obj.items():
-                new_v, v_changed = self._resolve_value(v)
-                result[k] = new_v
-                changed = changed or v_changed
-            return result, changed
-        if isinstance(obj, list):
-            changed = False
-            items: list[Any] = []
-            for item in obj:
-                new_item, item_changed = self._resolve_value(item)
-                items.append(new_item)
-                changed = changed or item_changed
-            return items, changed
-        if isinstance(obj, str) and "{{" in obj and "}}" in obj:
-            rendered = self._env.from_string(obj).render(**self._variables)
-            return rendered, rendered != obj
-        return obj, False
+            template, variables = _compile(source)
+            self._read(variables)
+            rendered = _plain(template.render(**self._render_vars))
+            if not _is_template(rendered) or rendered == source:
+                return rendered
+            source = rendered
+        raise RuntimeError(f"Template for {self._resolving[-1]} did not converge")
+
+    def _read(self, variables: frozenset[str]) -> None:
+        """Record what the current key reads, resolving those keys first."""
+        self._reads[self._resolving[-1]] |= variables
+        for name in variables:
+            self._resolve_key(name)
 
     def _load_string(self, filepath: str) -> str:
         full_path = self._full_path(filepath)
-        with open(full_path) as f:
-            content = f.read()
-        self._dir_stack.append(os.path.dirname(full_path))
+        version = _template_files.version(full_path)
+        self._files[self._resolving[-1]][full_path] = version
         try:
-            rendered = self._env.from_string(content).render(**self._variables)
+            template = _env.get_template(full_path)
+            self._read(_template_files.load(full_path))
+            self._dir_stack.append(os.path.dirname(full_path))
+            try:
+                rendered = template.render(**self._render_vars)
+            finally:
+                self._dir_stack.pop()
         except TemplateSyntaxError as e:
             raise TemplateSyntaxError(
                 f"{e.message}\n({full_path}, line {e.lineno})", e.lineno
             ) from e
-        finally:
-            self._dir_stack.pop()
         # NativeEnvironment renders templates with no output as None
         return re.sub(r"\n{3,}", "\n\n", rendered or "")
 
@@ -85,6 +269,84 @@ class TemplateResolver:
                     return os.path.abspath(candidate)
         return os.path.abspath(path)
 
+    @property
+    def _render_vars(self) -> dict[str, Any]:
+        partial = {
+            key: _partial(self, (key,), self._variables[key]) for key in self._open
+        }
+        return {**self._variables, **partial, **self._functions}
+
     @property
     def _current_dir(self) -> str:
         return self._dir_stack[-1]
+
+
+class _PartialDict(Mapping[Any, Any]):
+    """A dict in a key being rendered, whose values render as they are read."""
+
+    def __init__(self, data: ResolvedData, path: tuple[Any, ...], value: dict) -> None:
+        self._data = data
+        self._path = path
+        self._value = value
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._data._resolve_partial(self._value, key, (*self._path, key))
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._value)
+
+    def __len__(self) -> int:
+        return len(self._value)
+
+    def __str__(self) -> str:
+        return str(_plain(self))
+
+
+class _PartialList(Sequence[Any]):
+    """A list in a key being rendered, whose items render as they are read."""
+
+    def __init__(self, data: ResolvedData, path: tuple[Any, ...], value: list) -> None:
+        self._data = data
+        self._path = path
+        self._value = value
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self._value))[index]]
+        if index < 0:
+            index += len(self._value)
+        return self._data._resolve_partial(self._value, index, (*self._path, index))
+
+    def __len__(self) -> int:
+        return len(self._value)
+
+    def __str__(self) -> str:
+        return str(_plain(self))
+
+
+def _partial(data: ResolvedData, path: tuple[Any, ...], value: Any) -> Any:
+    if isinstance(value, dict):
+        return _PartialDict(data, path, value)
+    return _PartialList(data, path, value)
+
+
+def _plain(value: Any) -> Any:
+    """Render what a template output from a key being rendered, as plain data."""
+    if isinstance(value, _PartialDict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, _PartialList):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _has_templates(value: Any) -> bool:
+    """Whether a dict or list holds templates, at any depth."""
+    if isinstance(value, dict):
+        return any(_has_templates(v) or _is_template(v) for v in value.values())
+    if isinstance(value, list):
+        return any(_has_templates(v) or _is_template(v) for v in value)
+    return False
+
+
+def _is_template(value: Any) -> bool:
+    return isinstance(value, str) and "{{" in value and "}}" in value
@@ -0,0 +1,74 @@
+import zlib
+
+import tiktoken
+
+from .message import Message
+
+# Low detail images cost a flat number of tokens
+IMAGE_TOKENS = 85
+
+
+class TokenCounter:
+    """Estimates tokens as four characters each. Subclasses use a tokenizer."""
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        return len(text) // 4
+
+
+class TiktokenCounter(TokenCounter):
+    """Counts with a BPE encoding, close to most providers' tokenizers.
+
+    tiktoken downloads the encoding once into TIKTOKEN_CACHE_DIR, which the
+    Docker image fills in when it is built.
+    """
+
+    name = "cl100k_base"
+
+    def __init__(self) -> None:
+        self._encoding = tiktoken.get_encoding(self.name)
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode_ordinary(text))
+
+
+_counter: TokenCounter | None = None
+
+
+def get_counter() -> TokenCounter:
+    """Return the configured counter, choosing the best available on first use."""
+    global _counter
+    if _counter is None:
+        _counter = _default_counter()
+    return _counter
+
+
+def set_counter(counter: TokenCounter | None) -> None:
+    """Plug in a counter, or None to choose the best available again."""
+    global _counter
+    _counter = counter
+
+
+def count_tokens(text: str) -> int:
+    return get_counter().count(text)
+
+
+def count_message(message: Message) -> int:
+    """Count a message's tokens, cached in its metadata until its content changes."""
+    counter = get_counter()
+    text = message.content or ""
+    check = f"{counter.name}:{zlib.crc32(text.encode()):08x}"
+    cached = message.metadata.get("tokens")
+    if isinstance(cached, dict) and cached.get("check") == check:
+        return cached["count"]
+    count = counter.count(text) + (IMAGE_TOKENS if message.image else 0)
+    message.metadata["tokens"] = {"count": count, "check": check}
+    return count
+
+
+def _default_counter() -> TokenCounter:
+    try:
+        return TiktokenCounter()
+    except (OSError, ValueError):  # The encoding could not be fetched or is corrupt
+        return TokenCounter()
@@ -1,8 +1,11 @@
-import base64
 import copy
+import hashlib
+import json
 import os
 import re
 import unicodedata
+from collections import ChainMap
+from collections.abc import Mapping
 from io import BytesIO
 
 import backoff
@@ -43,13 +46,10 @@ def parse_pdf(content: bytes) -> str:
         return "".join(c for c in normalized if c.isprintable() or c in "\n\r\t ")
 
 
-def make_base64_loader(base_dir: str):
-    def load_base64(local_path: str) -> str:
-        full_path = os.path.abspath(os.path.join(base_dir, local_path))
-        with open(full_path, "rb") as file:
-            return base64.b64encode(file.read()).decode("utf-8")
-
-    return load_base64
+def body_hash(body: dict) -> str:
+    """Hash a request body independently of its key order."""
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
 
 
 def merge_dicts(dict1: dict, dict2: dict) -> dict:
@@ -62,6 +62,29 @@ def merge_dicts(dict1: dict, dict2: dict) -> dict:
     return result
 
 
+def overlay_dicts(base: Mapping, overrides: Mapping) -> dict:
+    """Merge like merge_dicts, sharing every value the overrides leave alone."""
+    result = dict(base)
+    for key, value in overrides.items():
+        if isinstance(result.get(key), Mapping) and isinstance(value, Mapping):
+            result[key] = overlay_dicts(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+def overlay_mapping(base: Mapping, overrides: Mapping) -> Mapping:
+    """Overlay like overlay_dicts, reading only the keys of base it overrides."""
+    overlaid = {
+        key: overlay_dicts(base[key], value)
+        if isinstance(value, Mapping) and isinstance(base.get(key), Mapping)
+        else value
+        for key, value in overrides.items()
+    }
+    # Only the first map is ever written to, so base can be read-only
+    return ChainMap(overlaid, base)  # type: ignore[arg-type]
+
+
 def parse_value(value: str) -> bool | int | float | str:
     if value.lower() == "true":
         return True
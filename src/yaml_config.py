@@ -3,6 +3,8 @@ from typing import Any
 from ruamel.yaml import YAML
 from ruamel.yaml.representer import RoundTripRepresenter
 
+from .file_cache import FileCache
+
 LITERAL_MIN_LENGTH = 80
 
 
@@ -24,3 +26,6 @@ yaml.Representer = NonAliasingRTRepresenter
 
 # Increase indentation for lists
 yaml.indent(mapping=2, sequence=4, offset=2)
+
+# Parsed context, state and conversation files, shared until they change
+yaml_files = FileCache(yaml.load)
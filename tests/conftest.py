@@ -0,0 +1,12 @@
+import pytest
+
+from src.token_counter import TokenCounter, set_counter
+
+
+@pytest.fixture(autouse=True)
+def token_counter():
+    # Token counts in tests are four characters each, not tiktoken's, which
+    # also could not load its encoding from a fake filesystem
+    set_counter(TokenCounter())
+    yield
+    set_counter(None)
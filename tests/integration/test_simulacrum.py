@@ -427,3 +427,19 @@ def test_reset_conversation(
         new_conversation_data = YAML(typ="safe").load(f)
         assert new_conversation_data["cost"] == 0.0
         assert len(new_conversation_data["messages"]) == 0
+
+
+@pytest.mark.asyncio
+async def test_image_is_sent_as_base64(
+    simulacrum: Simulacrum,
+    mock_openrouter,
+) -> None:
+    os.makedirs("images", exist_ok=True)
+    with open("images/photo.jpg", "wb") as f:
+        f.write(b"\xff\xd8\xff")
+
+    await simulacrum.chat("Look", "photo.jpg", None)
+
+    body = json.loads(mock_openrouter.get_request().content)
+    image = body["messages"][-1]["content"][0]
+    assert image["image_url"]["url"] == "data:image/jpeg;base64,/9j/"
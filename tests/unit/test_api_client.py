@@ -1,54 +1,485 @@
+import asyncio
+import json
+import weakref
 from unittest.mock import AsyncMock, patch
 
 import httpx
 import pytest
+import pytest_asyncio
 
-from src.api_client import fetch_completion
+from src import api_client
+from src.api_client import (
+    close_client,
+    fetch_completion,
+    get_client,
+    stream_completion,
+)
+from src.rate_limiter import RateLimiter
+from src.request_hedging import HedgePolicy, LatencyTracker
+from src.request_timings import RequestTimings
+from src.response_cache import ResponseCache
+from src.retry_policy import RetryPolicy
 
 
-def _mock_response(json_data, status_code=200):
-    return httpx.Response(
-        status_code,
-        json=json_data,
-        request=httpx.Request("POST", "http://test"),
-    )
+@pytest_asyncio.fixture(autouse=True)
+async def shared_client():
+    yield
+    await close_client()
 
 
-def _patch_httpx(response):
-    mock_client = AsyncMock()
-    mock_client.post.return_value = response
-    return patch(
-        "src.api_client.httpx.AsyncClient",
-        return_value=AsyncMock(
-            __aenter__=AsyncMock(return_value=mock_client),
-            __aexit__=AsyncMock(return_value=False),
-        ),
-    )
+@pytest.fixture(autouse=True)
+def retry_policy():
+    with patch.object(api_client, "retry_policy", RetryPolicy()) as policy:
+        yield policy
 
 
 @pytest.mark.asyncio
-async def test_returns_response_data():
+async def test_returns_response_data(httpx_mock):
     data = {"choices": [{"message": {"content": "hi"}}], "usage": {}}
-    with _patch_httpx(_mock_response(data)):
-        result = await fetch_completion({"messages": []})
+    httpx_mock.add_response(url=api_client.API_URL, json=data)
+    result = await fetch_completion({"messages": []})
     assert result == data
 
 
 @pytest.mark.asyncio
-async def test_raises_on_api_error():
+async def test_raises_on_api_error(httpx_mock):
     data = {"error": {"message": "invalid model", "code": 400}}
-    with (
-        _patch_httpx(_mock_response(data)),
-        pytest.raises(RuntimeError, match="invalid model"),
-    ):
+    httpx_mock.add_response(url=api_client.API_URL, json=data)
+    with pytest.raises(RuntimeError, match="invalid model"):
         await fetch_completion({"messages": []})
 
 
 @pytest.mark.asyncio
-async def test_raises_on_http_error():
+async def test_raises_on_http_error(httpx_mock):
+    httpx_mock.add_response(url=api_client.API_URL, status_code=500, is_reusable=True)
     with (
-        _patch_httpx(_mock_response({}, status_code=500)),
         patch("asyncio.sleep", new_callable=AsyncMock),
         pytest.raises(httpx.HTTPStatusError),
     ):
         await fetch_completion({"messages": []})
+
+
+@pytest.mark.asyncio
+async def test_does_not_retry_bad_request(httpx_mock):
+    httpx_mock.add_response(url=api_client.API_URL, status_code=400)
+    with pytest.raises(httpx.HTTPStatusError):
+        await fetch_completion({"messages": []})
+    assert len(httpx_mock.get_requests()) == 1
+
+
+@pytest.mark.asyncio
+async def test_retries_after_rate_limit(httpx_mock, retry_policy):
+    httpx_mock.add_response(status_code=429, headers={"Retry-After": "0"})
+    httpx_mock.add_response(json={"usage": {}})
+    result = await fetch_completion({"model": "m", "messages": []})
+    assert result == {"usage": {}}
+    assert retry_policy.stats()["m"]["retries"] == 1
+
+
+class TestClientPool:
+    @pytest.mark.asyncio
+    async def test_reuses_client_within_event_loop(self):
+        client = get_client()
+        try:
+            assert get_client() is client
+        finally:
+            await close_client()
+
+    @pytest.mark.asyncio
+    async def test_close_discards_client(self):
+        client = get_client()
+        await close_client()
+        assert client.is_closed
+        assert get_client() is not client
+        await close_client()
+
+    @pytest.mark.asyncio
+    async def test_applies_configured_limits(self):
+        with (
+            patch.object(api_client, "_limits", api_client.DEFAULT_LIMITS),
+            patch.object(api_client, "_clients", weakref.WeakKeyDictionary()),
+            patch("src.api_client.httpx.AsyncClient") as client_cls,
+        ):
+            api_client.configure_pool(httpx.Limits(max_connections=5))
+            get_client()
+        assert client_cls.call_args.kwargs["limits"].max_connections == 5
+        assert client_cls.call_args.kwargs["http2"] is True
+
+
+class TestStreamCompletion:
+    @pytest.mark.asyncio
+    async def test_yields_parsed_chunks(self, httpx_mock):
+        httpx_mock.add_response(
+            url=api_client.API_URL,
+            content=(
+                b": OPENROUTER PROCESSING\n\n"
+                b'data: {"choices": [{"delta": {"content": "Hi"}}]}\n\n'
+                b"data: [DONE]\n\n"
+            ),
+        )
+        chunks = [chunk async for chunk in stream_completion({"messages": []})]
+        assert chunks == [{"choices": [{"delta": {"content": "Hi"}}]}]
+        request = httpx_mock.get_request()
+        assert b'"stream":true' in request.content.replace(b" ", b"")
+
+    @pytest.mark.asyncio
+    async def test_retries_opening_stream(self, httpx_mock):
+        httpx_mock.add_response(status_code=503, headers={"Retry-After": "0"})
+        httpx_mock.add_response(content=b'data: {"choices": []}\n\ndata: [DONE]\n\n')
+        chunks = [chunk async for chunk in stream_completion({"messages": []})]
+        assert chunks == [{"choices": []}]
+
+    @pytest.mark.asyncio
+    async def test_raises_on_error_chunk(self, httpx_mock):
+        httpx_mock.add_response(
+            url=api_client.API_URL,
+            content=b'data: {"error": {"message": "overloaded"}}\n\n',
+        )
+        with pytest.raises(RuntimeError, match="overloaded"):
+            async for _ in stream_completion({"messages": []}):
+                pass
+
+
+class TestHedging:
+    @pytest.fixture
+    def tracker(self):
+        tracker = LatencyTracker()
+        for _ in range(5):
+            tracker.record("test/model", 0.01)
+        with patch.object(api_client, "first_byte_latency", tracker):
+            yield tracker
+
+    @pytest.fixture
+    def policy(self):
+        return HedgePolicy(min_samples=5, min_delay=0.01, provider="backup")
+
+    @staticmethod
+    def _respond_after(delays: dict[str | None, float]):
+        async def callback(request: httpx.Request) -> httpx.Response:
+            provider = json.loads(request.content).get("provider", {}).get("order")
+            name = provider[0] if provider else None
+            await asyncio.sleep(delays[name])
+            return httpx.Response(200, json={"served_by": name, "usage": {}})
+
+        return callback
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_is_raced_by_pinned_hedge(
+        self,
+        httpx_mock,
+        tracker,  # noqa: ARG002
+        policy,
+    ):
+        httpx_mock.add_callback(
+            self._respond_after({None: 1.0, "backup": 0}), is_reusable=True
+        )
+        body = {"model": "test/model", "messages": []}
+        result = await fetch_completion(body, hedge=policy)
+        assert result["served_by"] == "backup"
+        assert len(httpx_mock.get_requests()) == 2
+
+    @pytest.mark.asyncio
+    async def test_fast_primary_is_not_hedged(
+        self,
+        httpx_mock,
+        tracker,  # noqa: ARG002
+        policy,
+    ):
+        httpx_mock.add_callback(self._respond_after({None: 0}))
+        body = {"model": "test/model", "messages": []}
+        result = await fetch_completion(body, hedge=policy)
+        assert result["served_by"] is None
+        assert len(httpx_mock.get_requests()) == 1
+
+    @pytest.mark.asyncio
+    async def test_whole_responses_are_not_timed_against_streams(
+        self, httpx_mock, policy
+    ):
+        tracker = LatencyTracker()
+        for _ in range(5):
+            tracker.record("test/model", 0.01, stream=True)
+        httpx_mock.add_callback(self._respond_after({None: 0.05}))
+        body = {"model": "test/model", "messages": []}
+        with patch.object(api_client, "first_byte_latency", tracker):
+            result = await fetch_completion(body, hedge=policy)
+        assert result["served_by"] is None
+        assert len(httpx_mock.get_requests()) == 1
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_without_latency_history(self, httpx_mock, policy):
+        httpx_mock.add_callback(self._respond_after({None: 0.05}))
+        body = {"model": "unseen/model", "messages": []}
+        result = await fetch_completion(body, hedge=policy)
+        assert result["served_by"] is None
+        assert len(httpx_mock.get_requests()) == 1
+
+    @pytest.mark.asyncio
+    async def test_loser_that_responded_is_billed(
+        self,
+        httpx_mock,
+        tracker,  # noqa: ARG002
+        policy,
+    ):
+        async def respond(_request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"usage": {"cost": 0.02}})
+
+        httpx_mock.add_callback(respond, is_reusable=True)
+        costs = []
+        first_success = api_client._first_success
+
+        async def both_respond(attempts):
+            await asyncio.gather(*attempts)
+            return await first_success(attempts)
+
+        # Force a hedge and let both attempts respond before the race resolves
+        with (
+            patch.object(HedgePolicy, "delay", return_value=0),
+            patch.object(api_client, "_first_success", both_respond),
+        ):
+            body = {"model": "test/model", "messages": []}
+            await fetch_completion(body, hedge=policy, on_hedge_cost=costs.append)
+        await asyncio.gather(*api_client._billing)
+        assert costs == [0.02]
+
+    @pytest.mark.asyncio
+    async def test_reply_does_not_wait_for_the_loser(
+        self,
+        httpx_mock,
+        tracker,  # noqa: ARG002
+        policy,
+    ):
+        class SlowBody(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                yield b'{"usage": '
+                await asyncio.sleep(0.5)
+                yield b'{"cost": 0.02}}'
+
+        async def respond(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.01)
+            if b"backup" in request.content:
+                return httpx.Response(200, stream=SlowBody())
+            return httpx.Response(200, json={"usage": {"cost": 0.01}})
+
+        httpx_mock.add_callback(respond, is_reusable=True)
+        costs = []
+        first_success = api_client._first_success
+
+        async def both_respond(attempts):
+            await asyncio.gather(*attempts)
+            return await first_success(attempts)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with (
+            patch.object(HedgePolicy, "delay", return_value=0),
+            patch.object(api_client, "_first_success", both_respond),
+        ):
+            body = {"model": "test/model", "messages": []}
+            await fetch_completion(body, hedge=policy, on_hedge_cost=costs.append)
+        assert loop.time() - started < 0.4
+        assert costs == []
+        await asyncio.gather(*api_client._billing)
+        assert costs == [0.02]
+
+
+class TestLatencyTracker:
+    def test_percentile_requires_min_samples(self):
+        tracker = LatencyTracker()
+        tracker.record("m", 1.0)
+        assert tracker.percentile("m", 0.9, min_samples=2) is None
+
+    def test_percentile(self):
+        tracker = LatencyTracker()
+        for seconds in range(1, 11):
+            tracker.record("m", float(seconds))
+        assert tracker.percentile("m", 0.9, min_samples=10) == 10.0
+        assert tracker.percentile("m", 0.5, min_samples=10) == 6.0
+
+    def test_streams_are_kept_apart(self):
+        tracker = LatencyTracker()
+        tracker.record("m", 1.0, stream=True)
+        tracker.record("m", 5.0)
+        assert tracker.percentile("m", 0.9, min_samples=1, stream=True) == 1.0
+        assert tracker.percentile("m", 0.9, min_samples=1) == 5.0
+
+    def test_delay_is_at_least_min_delay(self):
+        tracker = LatencyTracker()
+        tracker.record("m", 0.1)
+        policy = HedgePolicy(min_samples=1, min_delay=2.0)
+        assert policy.delay(tracker, "m") == 2.0
+
+
+class TestCoalescing:
+    @pytest.mark.asyncio
+    async def test_identical_concurrent_requests_share_one_upstream_call(
+        self, httpx_mock
+    ):
+        async def respond(_request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"usage": {}})
+
+        httpx_mock.add_callback(respond)
+        body = {"model": "m", "messages": [{"role": "user", "content": "Hi"}]}
+        reordered = {"messages": body["messages"], "model": "m"}
+
+        first, second = await asyncio.gather(
+            fetch_completion(body), fetch_completion(reordered)
+        )
+
+        assert first == second
+        assert len(httpx_mock.get_requests()) == 1
+
+    @pytest.mark.asyncio
+    async def test_cost_is_reported_once_per_callback(self, httpx_mock):
+        async def respond(_request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"usage": {"cost": 0.5}})
+
+        httpx_mock.add_callback(respond)
+        body = {"model": "m", "messages": []}
+        costs: list[float] = []
+        other_costs: list[float] = []
+
+        first, second, third = await asyncio.gather(
+            fetch_completion(body, on_cost=costs.append),
+            fetch_completion(body, on_cost=costs.append),
+            fetch_completion(body, on_cost=other_costs.append),
+        )
+
+        assert first["usage"]["cost"] == second["usage"]["cost"] == 0.5
+        assert third["usage"]["cost"] == 0.5
+        assert costs == [0.5]
+        assert other_costs == [0.5]
+
+    @pytest.mark.asyncio
+    async def test_identical_streams_share_one_upstream_call(self, httpx_mock):
+        async def respond(_request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.01)
+            return httpx.Response(
+                200,
+                content=(
+                    b'data: {"choices": [{"delta": {"content": "Hi"}}]}\n\n'
+                    b'data: {"choices": [], "usage": {"cost": 0.5}}\n\n'
+                    b"data: [DONE]\n\n"
+                ),
+            )
+
+        httpx_mock.add_callback(respond)
+        body = {"model": "m", "messages": []}
+        costs: list[float] = []
+
+        async def read() -> list[dict]:
+            return [
+                chunk async for chunk in stream_completion(body, on_cost=costs.append)
+            ]
+
+        first, second = await asyncio.gather(read(), read())
+
+        assert len(httpx_mock.get_requests()) == 1
+        assert first == second
+        assert first[-1]["usage"]["cost"] == 0.5
+        assert costs == [0.5]
+
+
+COMPLETE = {
+    "choices": [{"finish_reason": "stop", "message": {"content": "Done"}}],
+    "usage": {},
+}
+
+
+class TestResponseCache:
+    @pytest.fixture(autouse=True)
+    def cache(self, tmp_path):
+        with patch.object(api_client, "response_cache", ResponseCache(str(tmp_path))):
+            yield
+
+    @pytest.mark.asyncio
+    async def test_deterministic_responses_are_reused(self, httpx_mock):
+        httpx_mock.add_response(json=COMPLETE)
+        body = {"model": "m", "temperature": 0, "messages": []}
+
+        first = await fetch_completion(body, deterministic=True)
+        second = await fetch_completion(body, deterministic=True)
+
+        assert first == second == COMPLETE
+        assert len(httpx_mock.get_requests()) == 1
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "choice",
+        [
+            {"finish_reason": "length", "message": {"content": "Cut sh"}},
+            {"finish_reason": "stop", "message": {"content": ""}},
+            {"finish_reason": "stop", "message": {"content": None}},
+        ],
+    )
+    async def test_incomplete_responses_are_not_cached(self, httpx_mock, choice):
+        httpx_mock.add_response(json={"choices": [choice]}, is_reusable=True)
+        body = {"model": "m", "temperature": 0, "messages": []}
+
+        await fetch_completion(body, deterministic=True)
+        await fetch_completion(body, deterministic=True)
+
+        assert len(httpx_mock.get_requests()) == 2
+
+    @pytest.mark.asyncio
+    async def test_other_requests_are_not_cached(self, httpx_mock):
+        httpx_mock.add_response(json={"usage": {}}, is_reusable=True)
+        body = {"model": "m", "messages": []}
+
+        await fetch_completion(body)
+        await fetch_completion(body)
+
+        assert len(httpx_mock.get_requests()) == 2
+
+
+class TestRateLimits:
+    @pytest.mark.asyncio
+    async def test_requests_hold_model_and_key_slots(self, httpx_mock):
+        limiter = RateLimiter(max_in_flight=1)
+        httpx_mock.add_response(json={"usage": {}})
+        with patch.object(api_client, "_rate_limiter", limiter):
+            await fetch_completion({"model": "m", "messages": []})
+        assert sorted(key.split(":")[0] for key in limiter._state) == ["key", "model"]
+        assert all(in_flight == 0 for _, _, in_flight in limiter._state.values())
+
+
+class TestTimings:
+    @pytest.mark.asyncio
+    async def test_fetch_records_phases(self, httpx_mock):
+        async def respond(_request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"usage": {"completion_tokens": 20}})
+
+        httpx_mock.add_callback(respond)
+        timings = RequestTimings()
+        await fetch_completion({"messages": []}, timings=timings)
+        assert timings.first_byte >= 0.01
+        assert timings.completion_tokens == 20
+        assert timings.total == pytest.approx(
+            timings.wait
+            + timings.connect
+            + timings.tls
+            + timings.first_byte
+            + timings.generation
+        )
+
+    @pytest.mark.asyncio
+    async def test_stream_records_tokens_when_finished(self, httpx_mock):
+        httpx_mock.add_response(
+            content=(
+                b'data: {"choices": [{"delta": {"content": "Hi"}}]}\n\n'
+                b'data: {"choices": [], "usage": {"completion_tokens": 3}}\n\n'
+                b"data: [DONE]\n\n"
+            )
+        )
+        timings = RequestTimings()
+        async for _ in stream_completion({"messages": []}, timings=timings):
+            pass
+        assert timings.completion_tokens == 3
+
+    def test_tokens_per_second(self):
+        timings = RequestTimings(generation=2.0, completion_tokens=50)
+        assert timings.tokens_per_second == 25.0
+        assert RequestTimings().tokens_per_second is None
@@ -0,0 +1,29 @@
+import asyncio
+from typing import Any
+from unittest.mock import patch
+
+import app
+from src.rate_limiter import RateLimiter
+
+
+def _use_limiter(
+    bot_config: dict[str, Any],
+    _pool_config: dict[str, Any],
+    limiter: RateLimiter | None,
+) -> None:
+    async def request() -> None:
+        assert limiter is not None
+        async with limiter.slot(["m"]):
+            pass
+
+    asyncio.run(request())
+    with open(bot_config["result"], "w") as f:
+        f.write("ok")
+
+
+def test_bots_use_shared_limiter_until_they_exit(tmp_path):
+    results = [tmp_path / "bot_0", tmp_path / "bot_1"]
+    rate_config = {"requests_per_second": 100, "burst": 1, "max_in_flight": 1}
+    with patch("app._run_bot", _use_limiter):
+        app._run_bots([{"result": str(result)} for result in results], {}, rate_config)
+    assert [result.read_text() for result in results] == ["ok", "ok"]
@@ -0,0 +1,127 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.cache_warmer import CACHE_TTL, CacheWarmer
+from src.lm_executors import chat_executor
+from src.yaml_config import yaml
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def update_context(**data) -> None:
+    with open("context.yml") as f:
+        context = yaml.load(f)
+    context.update(data)
+    with open("context.yml", "w") as f:
+        yaml.dump(context, f)
+
+
+@pytest.fixture
+def fetch():
+    response = {"choices": [{"message": {"content": "Hi"}}], "usage": {"cost": 0.01}}
+    with patch.object(
+        chat_executor, "fetch_completion", new_callable=AsyncMock
+    ) as fetch:
+        fetch.return_value = response
+        yield fetch
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def warmer(sim, clock):
+    update_context(
+        api_params={"model": "anthropic/claude-sonnet"},
+        cache_warming={"max_daily_cost": 0.045},
+    )
+    return CacheWarmer(sim, clock)
+
+
+@pytest.mark.asyncio
+async def test_warms_at_startup(warmer, fetch, sim):
+    assert await warmer.check() == "startup"
+    body = fetch.call_args.args[0].data
+    assert body["max_tokens"] == 1
+    assert [m["role"] for m in body["messages"]] == ["system", "user", "assistant"]
+    sim.context.load()
+    assert sim.context.conversation_cost == 0.01
+
+
+@pytest.mark.asyncio
+async def test_warms_once_until_something_changes(warmer, fetch, clock):
+    await warmer.check()
+    clock.now += 600
+    assert await warmer.check() is None
+    assert fetch.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_warms_after_context_changes(warmer, fetch):
+    await warmer.check()
+    update_context(system_prompt="Goodbye")
+    assert await warmer.check() == "context changed"
+    assert fetch.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_refreshes_before_expiry_while_active(warmer, fetch, sim, clock):
+    await warmer.check()
+    sim.last_completion = MagicMock()
+    assert await warmer.check() is None  # The turn wrote the cache
+    clock.now += CACHE_TTL - 600
+    assert await warmer.check() is None
+    clock.now += 400
+    assert await warmer.check() == "expiring"
+    assert fetch.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_stops_refreshing_when_inactive(warmer, fetch, sim, clock):
+    await warmer.check()
+    sim.last_completion = MagicMock()
+    await warmer.check()
+    clock.now += 4 * 3600
+    assert await warmer.check() is None
+    assert fetch.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_daily_cost_cap(warmer, fetch, clock):
+    for i in range(6):
+        update_context(system_prompt=f"Version {i}")
+        await warmer.check()
+    assert fetch.call_count == 4  # A fifth would exceed the cap
+    clock.now += 86400
+    update_context(system_prompt="Tomorrow")
+    assert await warmer.check() == "context changed"
+
+
+@pytest.mark.asyncio
+async def test_skipped_during_a_turn(warmer, fetch, sim):
+    with sim.context.session():
+        assert await warmer.check() is None
+    fetch.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_disabled(warmer, fetch):
+    update_context(cache_warming={"enabled": False})
+    assert await warmer.check() is None
+    fetch.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_only_for_models_with_cache_breakpoints(warmer, fetch):
+    update_context(api_params={"model": "openai/gpt-5"})
+    assert await warmer.check() is None
+    fetch.assert_not_called()
@@ -1,6 +1,6 @@
 import pytest
 
-from src.chat_completion import ChatCompletion
+from src.chat_completion import ChatCompletion, CompletionStream
 
 
 def _make_response(**overrides):
@@ -67,6 +67,11 @@ class TestCachedTokens:
         c = ChatCompletion(_make_response())
         assert c.cached_tokens == 0
 
+    def test_without_cache_details(self):
+        usage = {"prompt_tokens": 10, "completion_tokens": 5, "cost": 0.01}
+        c = ChatCompletion(_make_response(usage=usage))
+        assert c.cached_tokens == 0
+
     def test_with_cached_tokens(self):
         c = ChatCompletion(
             _make_response(
@@ -79,3 +84,33 @@ class TestCachedTokens:
             )
         )
         assert c.cached_tokens == 42
+
+
+class TestCompletionStream:
+    def test_accumulates_content_and_usage(self):
+        stream = CompletionStream()
+        stream.add_chunk({"id": "gen-1", "choices": [{"delta": {"content": "Hel"}}]})
+        stream.add_chunk({"choices": [{"delta": {"content": "lo"}}]})
+        stream.add_chunk(
+            {
+                "choices": [{"delta": {}, "finish_reason": "stop"}],
+                "usage": _make_response()["usage"],
+            }
+        )
+        c = ChatCompletion(stream.response)
+        assert c.content == "Hello"
+        assert c.cost == 0.01
+        assert stream.response["id"] == "gen-1"
+
+    def test_returns_added_text(self):
+        stream = CompletionStream()
+        assert stream.add_chunk({"choices": [{"delta": {"content": "Hi"}}]}) == "Hi"
+        assert stream.add_chunk({"choices": [{"delta": {"role": "assistant"}}]}) == ""
+
+    def test_length_finish_reason_still_validated(self):
+        stream = CompletionStream()
+        stream.add_chunk(
+            {"choices": [{"delta": {"content": "Hi"}, "finish_reason": "length"}]}
+        )
+        with pytest.raises(RuntimeError, match="exceeded maximum length"):
+            ChatCompletion(stream.response)
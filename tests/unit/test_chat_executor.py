@@ -1,5 +1,12 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.lm_executors import chat_executor
 from src.lm_executors.chat_executor import ChatExecutor
+from src.lm_executors.message_builder import MessageCache, build_messages
 from src.message import Message
+from src.yaml_config import yaml
 
 
 class TestInjectInlineInstructions:
@@ -75,3 +82,173 @@ class TestInjectInlineInstructions:
         result = ChatExecutor._inject_inline_instructions(messages)
         assert len(result) == 1
         assert result[0].content == "Response"
+
+
+MESSAGES = [
+    Message("user", "Hello: world # not a comment", image="photo.jpg"),
+    Message("assistant", "- a list?\n\n  indented\n\n{braces} & 'quotes' \"too\"\n"),
+    Message("user", None, image="second.jpg"),
+    Message("assistant", "Unicode — ✓ 日本語"),
+    Message("user", "Trailing newlines\n\n\n", metadata={"note": 1}),
+    Message("assistant", "Earlier reply"),
+    Message("user", "Latest", metadata={"inline_instruction": "be brief"}),
+]
+
+
+class TestNativeMessages:
+    """The native builder must match the reference template exactly."""
+
+    @staticmethod
+    def _build(model, messages, template=None, **data):
+        context = MagicMock()
+        context.resolved_data = {
+            "system_prompt": "You are a test.\n\nLine: two\n",
+            "api_params": {"model": model},
+            **data,
+        }
+        context.api_params = context.resolved_data["api_params"]
+        context.conversation_messages = messages
+        context.message_template = template
+        executor = ChatExecutor(context)
+        return executor._build_messages(lambda path: f"@attachment:{path}@")
+
+    @pytest.mark.parametrize("model", ["anthropic/claude-sonnet", "openai/gpt"])
+    @pytest.mark.parametrize("count", [0, 1, 2, 3, 7])
+    @pytest.mark.parametrize(
+        "data",
+        [{}, {"reinforcement_prompt": "Stay in character."}, {"continue_prompt": "Go"}],
+    )
+    def test_matches_template(self, model, count, data):
+        messages = MESSAGES[:count]
+        native = self._build(model, messages, **data)
+        rendered = self._build(model, messages, ChatExecutor.TEMPLATE_PATH, **data)
+        assert native == rendered
+
+    def test_caches_last_three_messages_for_claude(self):
+        result = self._build("anthropic/claude", MESSAGES)
+        cached = [
+            i
+            for i, message in enumerate(result)
+            if any("cache_control" in part for part in message["content"])
+        ]
+        assert cached == [0, 5, 6, 7]
+
+    def test_next_turn_marks_where_the_last_request_ended(self):
+        context = MagicMock()
+        context.resolved_data = {"api_params": {"model": "anthropic/claude"}}
+        context.api_params = context.resolved_data["api_params"]
+        context.message_template = None
+        context.conversation_messages = MESSAGES[:3]
+        executor = ChatExecutor(context)
+        executor._build_messages(lambda path: path)
+        context.conversation_messages = MESSAGES
+        result = executor._build_messages(lambda path: path)
+        cached = [
+            i
+            for i, m in enumerate(result)
+            if any("cache_control" in part for part in m["content"])
+        ]
+        assert cached == [0, 3, len(MESSAGES) - 1, len(MESSAGES)]
+
+    def test_custom_template_is_compiled_once(self):
+        env = chat_executor._template_env
+        with patch.object(env, "compile", wraps=env.compile) as compile:
+            for _ in range(3):
+                self._build("m", MESSAGES, ChatExecutor.TEMPLATE_PATH)
+        assert compile.call_count <= 1
+
+
+class TestMessageCache:
+    @staticmethod
+    def _build(messages, cache=None):
+        return build_messages(
+            "System", messages, None, "anthropic/claude", lambda p: f"@{p}@", cache
+        )
+
+    def test_matches_uncached_build_as_history_changes(self):
+        cache = MessageCache()
+        history = list(MESSAGES[:5])
+        edits = [
+            lambda h: h.append(Message("assistant", "New reply")),
+            lambda h: h.pop(),
+            lambda h: h.__setitem__(-1, Message("user", "Edited tail")),
+            lambda h: h.__setitem__(1, Message("assistant", "Edited middle")),
+            lambda h: h.extend(MESSAGES[5:]),
+            lambda h: h.clear(),
+        ]
+        for edit in edits:
+            edit(history)
+            assert self._build(history, cache) == self._build(history)
+
+    def test_reuses_unchanged_messages(self):
+        cache = MessageCache()
+        history = [Message("user", f"Message {i}") for i in range(10)]
+        first = self._build(history, cache)
+        second = self._build([*history, Message("assistant", "Reply")], cache)
+        assert all(a is b for a, b in zip(first[1:7], second[1:7], strict=True))
+
+    def test_cache_control_is_not_kept_on_reused_messages(self):
+        cache = MessageCache()
+        history = [Message("user", f"Message {i}") for i in range(4)]
+        self._build(history, cache)
+        result = self._build([*history, *history], cache)
+        assert "cache_control" not in result[4]["content"][0]
+
+
+class TestContextWindow:
+    @pytest.mark.asyncio
+    async def test_trims_request_but_not_history(self, sim):
+        with open("context.yml") as f:  # noqa: ASYNC230
+            data = yaml.load(f)
+        data["context_window"] = {"max_tokens": 1000}
+        with open("context.yml", "w") as f:  # noqa: ASYNC230
+            yaml.dump(data, f)
+        with sim.context.session():
+            for i in range(20):
+                sim.context.add_message("user", f"Message {i} " + "x" * 400)
+        response = {
+            "choices": [{"message": {"content": "Reply"}, "finish_reason": "stop"}],
+            "usage": {"cost": 0.01},
+        }
+        with (
+            patch.object(
+                chat_executor, "fetch_completion", new_callable=AsyncMock
+            ) as fetch,
+            patch.object(chat_executor, "RequestRecorder"),
+        ):
+            fetch.return_value = response
+            completion = await ChatExecutor(sim.context).execute()
+
+        window = completion.window
+        sent = fetch.call_args.args[0].data["messages"]
+        assert window.dropped_tokens > 0
+        assert len(sent) == 1 + 22 - len(window.dropped)
+        assert len(sim.context.conversation_messages) == 22
+
+
+class TestHedgeCost:
+    @pytest.mark.asyncio
+    async def test_cost_reported_after_the_session_is_saved(self, sim):
+        response = {
+            "choices": [{"message": {"content": "Reply"}, "finish_reason": "stop"}],
+            "usage": {"cost": 0.01},
+        }
+        with (
+            patch.object(
+                chat_executor, "fetch_completion", new_callable=AsyncMock
+            ) as fetch,
+            patch.object(chat_executor, "RequestRecorder"),
+        ):
+            fetch.return_value = response
+            with sim.context.session():
+                await ChatExecutor(sim.context).execute()
+
+        # The losing hedge is read for its cost after the reply
+        fetch.call_args.kwargs["on_hedge_cost"](0.02)
+        with sim.context.session():
+            pass
+
+        with open("context.state.yml") as f:  # noqa: ASYNC230
+            assert yaml.load(f)["total_cost"] == 0.02
+        with open("conversations/test_0.yml") as f:  # noqa: ASYNC230
+            assert yaml.load(f)["cost"] == 0.02
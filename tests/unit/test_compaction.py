@@ -0,0 +1,109 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src import simulacrum
+from src.chat_completion import ChatCompletion
+from src.compaction import Compaction, CompactionPolicy
+from src.conversation import MessageList
+from src.message import Message, digest_messages
+from src.simulacrum import Generation
+from src.yaml_config import yaml
+
+
+def history(count: int) -> MessageList:
+    # Each message is 100 tokens
+    return MessageList(Message("user", f"{i:03d}" + "x" * 397) for i in range(count))
+
+
+def compaction(messages: list[Message], summary: str = "Summary") -> Compaction:
+    return Compaction(len(messages), digest_messages(messages), summary, 0.01)
+
+
+def saved_conversation() -> dict:
+    with open("conversations/test_0.yml") as f:
+        return yaml.load(f)
+
+
+class TestCompactionPolicy:
+    def test_nothing_below_threshold(self):
+        assert CompactionPolicy(max_tokens=1000).compactable(history(10)) == 0
+
+    def test_keeps_last_messages(self):
+        policy = CompactionPolicy(max_tokens=1000, keep_last=4)
+        assert policy.compactable(history(11)) == 7
+
+
+class TestQueueCompaction:
+    def test_saves_immediately_without_session(self, sim):
+        sim.context.queue_compaction(compaction(sim.context.conversation_messages[:1]))
+        saved = saved_conversation()
+        assert saved["memories"] == ["Summary"]
+        assert [m["content"] for m in saved["messages"]] == ["Hello"]
+        assert saved["cost"] == 0.01
+
+    def test_lands_with_the_open_session(self, sim):
+        with sim.context.session():
+            sim.context.queue_compaction(
+                compaction(sim.context.conversation_messages[:1])
+            )
+            assert "memories" not in saved_conversation()
+            sim.context.add_message("user", "New")
+        saved = saved_conversation()
+        assert saved["memories"] == ["Summary"]
+        assert [m["content"] for m in saved["messages"]] == ["Hello", "New"]
+
+    def test_skipped_if_messages_changed(self, sim):
+        stale = compaction([Message("user", "Edited")])
+        sim.context.queue_compaction(stale)
+        saved = saved_conversation()
+        assert "memories" not in saved
+        assert len(saved["messages"]) == 2
+        assert saved["cost"] == 0.01
+
+
+class TestAutoCompaction:
+    @pytest.fixture
+    def compacting_sim(self, sim):
+        with open("context.yml") as f:
+            data = yaml.load(f)
+        data["auto_compact"] = {"max_tokens": 1, "keep_last": 2}
+        with open("context.yml", "w") as f:
+            yaml.dump(data, f)
+        return sim
+
+    @pytest.fixture
+    def summarize(self):
+        response = {
+            "choices": [{"message": {"content": "Summary"}, "finish_reason": "stop"}],
+            "usage": {"cost": 0.01},
+        }
+        with patch.object(simulacrum, "summarize", new_callable=AsyncMock) as mock:
+            mock.return_value = ChatCompletion(response)
+            yield mock
+
+    @pytest.mark.asyncio
+    async def test_compacts_older_turns_after_reply(self, compacting_sim, summarize):
+        sim = compacting_sim
+        with patch.object(sim, "_generate", new_callable=AsyncMock) as generate:
+            generate.return_value = Generation("Reply", "Reply")
+            await sim.chat("Next", None, None)
+        assert sim._compaction_task
+        await sim._compaction_task
+
+        messages = summarize.call_args.args[0]
+        assert [m.content for m in messages] == ["Hi", "Hello"]
+        sim.context.load()
+        assert sim.context.conversation_memories == ["Summary"]
+        assert [m.content for m in sim.context.conversation_messages] == [
+            "Next",
+            "Reply",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_disabled_without_policy(self, sim, summarize):
+        with patch.object(sim, "_generate", new_callable=AsyncMock) as generate:
+            generate.return_value = Generation("Reply", "Reply")
+            await sim.chat("Next", None, None)
+        assert sim._compaction_task is None
+        summarize.assert_not_called()
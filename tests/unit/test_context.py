@@ -1,6 +1,7 @@
 from textwrap import dedent
 
 import pytest
+from jinja2 import TemplateNotFound
 
 from src.context import Context
 from src.yaml_config import yaml
@@ -54,6 +55,60 @@ class TestSession:
             assert session.superseded
 
 
+class TestReload:
+    def write_conversation(self, name: str, *contents: str) -> None:
+        messages = [{"role": "user", "content": c} for c in contents]
+        with open(f"/test/conversations/{name}", "w") as f:
+            yaml.dump({"cost": 0.0, "messages": messages}, f)
+
+    def test_keeps_conversation_while_unchanged(self, context):
+        context.save()
+        messages = context.conversation_messages
+        context.load()
+        assert context.conversation_messages is messages
+
+    def test_reloads_conversation_edited_elsewhere(self, context):
+        context.save()
+        self.write_conversation("alice_1.yml", "Edited")
+        context.load()
+        assert [m.content for m in context.conversation_messages] == ["Edited"]
+
+    def test_reloads_when_state_switches_conversation(self, context):
+        context.save()
+        self.write_conversation("alice_7.yml", "Other")
+        with open("/test/alice.state.yml", "w") as f:
+            yaml.dump({"conversation_file": "file://./conversations/alice_7.yml"}, f)
+        context.load()
+        assert context.conversation_id == 7
+        assert [m.content for m in context.conversation_messages] == ["Other"]
+
+    def test_discards_unsaved_changes(self, context):
+        context.save()
+        context.add_message("user", "Unsaved")
+        context.load()
+        assert context.conversation_messages == []
+
+    def test_discards_superseded_session_changes(self, context):
+        with context.session():
+            context.add_message("user", "Superseded")
+            context._session_version += 1
+        assert context.conversation_messages == []
+
+    def test_resolves_again_only_when_a_template_changes(self, context_fs):
+        context_fs.create_file("/test/content/prompt.md", contents="First")
+        with open("/test/alice.yml", "a") as f:
+            f.write("other_prompt: \"{{ load_string('prompt.md') }}\"\n")
+        ctx = Context("/test/alice.yml")
+        data = ctx._data
+        ctx.load()
+        assert ctx._data is data
+
+        with open("/test/content/prompt.md", "w") as f:
+            f.write("Again")
+        ctx.load()
+        assert ctx._data["other_prompt"] == "Again"
+
+
 class TestConversationId:
     def test_extracts_id_from_path(self, context):
         context._state_data["conversation_file"] = "file://./conversations/alice_42.yml"
@@ -163,6 +218,33 @@ class TestCostTracking:
         assert context.conversation_cost == initial_conv_cost + 0.5
 
 
+class TestVariations:
+    def test_overrides_without_changing_original(self, context):
+        variation = context.with_overrides({"api_params": {"temperature": 0.5}})
+        assert variation.api_params == {"model": "test/model", "temperature": 0.5}
+        assert context.api_params == {"model": "test/model"}
+
+    def test_shares_unchanged_data(self, context):
+        variation = context.with_overrides({"character_name": "Bob"})
+        assert variation.api_params is context.api_params
+
+    def test_bills_the_original(self, context):
+        context.with_overrides({"character_name": "Bob"}).increment_cost(0.25)
+        assert context.conversation_cost == 0.25
+
+    def test_queued_costs_go_to_the_original(self, context):
+        with context.session():
+            context.with_overrides({"character_name": "Bob"}).queue_cost(0.25)
+        context.load()
+        assert context.conversation_cost == 0.25
+
+
+class TestResolvedData:
+    def test_is_read_only(self, context):
+        with pytest.raises(TypeError):
+            context.resolved_data["character_name"] = "Bob"  # type: ignore[index]
+
+
 class TestExtends:
     def test_inherits_base_values(self, fs):
         fs.create_dir("/test/conversations")
@@ -300,6 +382,20 @@ class TestTemplateResolution:
         ctx = Context("/test/alice.yml")
         assert ctx._data["system_prompt"] == "Model: test/model"
 
+    def test_resolves_keys_when_read(self, context_fs, base_context_data):  # noqa: ARG002
+        base_context_data["scene_prompt"] = "{{ load_string('missing.md') }}"
+        base_context_data["instruction_presets"] = {
+            "warm": {"content": "Be warm.", "overrides": {"api_params": {"seed": 1}}}
+        }
+        with open("/test/alice.yml", "w") as f:
+            yaml.dump(base_context_data, f)
+        ctx = Context("/test/alice.yml")
+        ctx.apply_preset_overrides("warm")
+        assert ctx.api_params == {"model": "test/model", "seed": 1}
+        assert ctx.character_name == "Alice"
+        with pytest.raises(TemplateNotFound):
+            _ = ctx.scene_prompt
+
 
 class TestModel:
     def test_extending_context_overrides_model(self, context_fs):  # noqa: ARG002
@@ -0,0 +1,123 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src import summarizer
+from src.context_window import ContextWindow, WindowState
+from src.message import Message
+
+
+def history(count: int) -> list[Message]:
+    # Each message is 100 tokens
+    roles = ["user", "assistant"]
+    return [Message(roles[i % 2], f"{i:03d}" + "x" * 397) for i in range(count)]
+
+
+def contents(messages: list[Message]) -> list[str]:
+    return [(m.content or "")[:3] for m in messages]
+
+
+def summary_response(text: str) -> dict:
+    return {
+        "choices": [{"message": {"content": text}, "finish_reason": "stop"}],
+        "usage": {"cost": 0.01},
+    }
+
+
+class TestFit:
+    def test_keeps_everything_within_budget(self):
+        messages = history(10)
+        fit = ContextWindow(max_tokens=1000).fit(messages, WindowState())
+        assert fit.messages == messages
+        assert not fit.dropped
+
+    def test_sliding_drops_oldest_down_to_target(self):
+        fit = ContextWindow(max_tokens=1000).fit(history(12), WindowState())
+        assert contents(fit.messages) == [f"{i:03d}" for i in range(5, 12)]
+        assert len(fit.dropped) == 5
+        assert fit.dropped_tokens == 500
+
+    def test_first_last_keeps_the_start(self):
+        window = ContextWindow(max_tokens=1000, strategy="first_last", keep_first=2)
+        fit = window.fit(history(12), WindowState())
+        assert contents(fit.messages) == ["000", "001"] + [
+            f"{i:03d}" for i in range(7, 12)
+        ]
+
+    def test_always_keeps_last_messages(self):
+        window = ContextWindow(max_tokens=100, keep_last=4)
+        fit = window.fit(history(12), WindowState())
+        assert len(fit.messages) == 4
+
+    def test_cut_is_kept_while_history_grows(self):
+        window = ContextWindow(max_tokens=1000)
+        state = WindowState()
+        cuts = [len(window.fit(history(n), state).dropped) for n in range(12, 18)]
+        # The cut only moves once the kept messages exceed the budget again
+        assert cuts == [5, 5, 5, 5, 9, 9]
+
+    def test_cut_resets_when_history_changes(self):
+        window = ContextWindow(max_tokens=1000)
+        state = WindowState()
+        window.fit(history(14), state)
+        other = [Message(m.role, f"new{m.content}") for m in history(12)]
+        fit = window.fit(other, state)
+        assert len(fit.dropped) == 5
+
+    def test_does_not_modify_history(self):
+        messages = history(12)
+        ContextWindow(max_tokens=1000).fit(messages, WindowState())
+        assert len(messages) == 12
+
+    def test_unknown_strategy(self):
+        with pytest.raises(ValueError, match="Unknown context window strategy"):
+            ContextWindow(max_tokens=1000, strategy="random")
+
+
+class TestSummarize:
+    @pytest.fixture
+    def fetch(self):
+        with patch.object(
+            summarizer, "fetch_completion", new_callable=AsyncMock
+        ) as fetch:
+            fetch.side_effect = lambda body, **_: summary_response(
+                f"summary {len(body['messages'][1]['content'])}"
+            )
+            yield fetch
+
+    @pytest.fixture
+    def window(self):
+        return ContextWindow(max_tokens=1000, strategy="summarize", keep_first=2)
+
+    @pytest.mark.asyncio
+    async def test_replaces_dropped_messages_with_summary(self, fetch, window):
+        costs: list[float] = []
+        fit = await window.apply(history(12), WindowState(), "model", costs.append)
+        assert contents(fit.messages)[:2] == ["000", "001"]
+        assert fit.messages[2].role == "system"
+        assert fit.messages[2].content.startswith("<summary>\nsummary")
+        assert fit.summarized
+        assert costs == [0.01]
+        assert fetch.call_args.args[0]["model"] == "model"
+
+    @pytest.mark.asyncio
+    async def test_summary_is_reused_while_cut_is_unchanged(self, fetch, window):
+        state = WindowState()
+        await window.apply(history(12), state, "model", lambda _: None)
+        await window.apply(history(13), state, "model", lambda _: None)
+        assert fetch.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_summary_is_extended_when_cut_moves(self, fetch, window):
+        state = WindowState()
+        await window.apply(history(12), state, "model", lambda _: None)
+        await window.apply(history(16), state, "model", lambda _: None)
+        transcript = fetch.call_args.args[0]["messages"][1]["content"]
+        assert transcript.startswith("<summary>\nsummary")
+        assert "002" not in transcript
+
+    @pytest.mark.asyncio
+    async def test_no_summary_within_budget(self, fetch, window):
+        fit = await window.apply(history(5), WindowState(), "model", lambda _: None)
+        assert len(fit.messages) == 5
+        fetch.assert_not_called()
@@ -1,6 +1,10 @@
+from unittest.mock import patch
+
 import pytest
 
-from src.conversation import Conversation
+from src.conversation import Conversation, MessageList
+from src.message import Message
+from src.token_counter import TokenCounter, count_message, set_counter
 
 
 @pytest.fixture()
@@ -80,3 +84,41 @@ class TestIncrementCost:
         conv.increment_cost(0.05)
         conv.increment_cost(0.10)
         assert conv.cost == pytest.approx(0.15)
+
+
+class WordCounter(TokenCounter):
+    name = "words"
+
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+
+class TestMessageList:
+    def test_tokens_follow_changes(self):
+        messages = MessageList([Message("user", "x" * 40)])
+        assert messages.tokens == 10
+        messages.append(Message("assistant", "x" * 20))
+        messages.insert(0, Message("user", "x" * 8))
+        assert messages.tokens == 17
+        messages.pop()
+        del messages[:1]
+        assert messages.tokens == 10
+        messages.extend([Message("user", "x" * 4)] * 2)
+        messages.remove(messages[-1])
+        assert messages.tokens == 11
+        assert messages.tokens == sum(count_message(m) for m in messages)
+
+    def test_tokens_are_not_recounted(self):
+        messages = MessageList([Message("user", "x" * 40)] * 3)
+        assert messages.tokens == 30
+        with patch("src.conversation.count_message") as count:
+            assert messages.tokens == 30
+        count.assert_not_called()
+
+    def test_recounted_with_another_counter(self):
+        messages = MessageList([Message("user", "one two three four")])
+        assert messages.tokens == 4
+        set_counter(WordCounter())
+        assert messages.tokens == 4
+        messages.append(Message("user", "five"))
+        assert messages.tokens == 5
@@ -0,0 +1,61 @@
+import pytest
+
+from src.file_cache import FileCache, content_digest
+
+
+@pytest.fixture
+def parsed():
+    return []
+
+
+@pytest.fixture
+def cache(fs, parsed):  # noqa: ARG001
+    def parse(text: str) -> str:
+        parsed.append(text)
+        return text.upper()
+
+    return FileCache(parse)
+
+
+def write(text: str) -> None:
+    with open("/data.txt", "w") as f:
+        f.write(text)
+
+
+def test_parses_once_while_unchanged(cache, parsed):
+    write("one")
+    assert cache.load("/data.txt") == "ONE"
+    assert cache.load("/data.txt") == "ONE"
+    assert parsed == ["one"]
+
+
+def test_reparses_after_a_change(cache, parsed):
+    write("one")
+    cache.load("/data.txt")
+    write("two")  # Same size, and likely the same mtime
+    assert cache.load("/data.txt") == "TWO"
+    assert parsed == ["one", "two"]
+
+
+def test_rewriting_the_same_content_keeps_the_parse(cache, parsed):
+    write("one")
+    cache.load("/data.txt")
+    write("one")
+    cache.load("/data.txt")
+    assert parsed == ["one"]
+
+
+def test_version(cache, parsed):
+    assert cache.version("/data.txt") is None
+    write("one")
+    assert cache.version("/data.txt") == content_digest("one")
+    assert parsed == []  # Checking a version does not parse
+
+
+def test_evicts_least_recently_used(fs, parsed):  # noqa: ARG001
+    cache = FileCache(lambda text: parsed.append(text), max_entries=2)
+    for name in ["a", "b", "c", "a"]:
+        with open(f"/{name}.txt", "w") as f:
+            f.write(name)
+        cache.load(f"/{name}.txt")
+    assert parsed == ["a", "b", "c", "a"]
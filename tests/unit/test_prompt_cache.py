@@ -0,0 +1,75 @@
+import pytest
+
+from src.prompt_cache import CacheHitRate, CachePlanner, breakpoint_limit
+
+
+def messages(*texts: str) -> list[dict]:
+    return [{"role": "user", "content": [{"type": "text", "text": t}]} for t in texts]
+
+
+class TestBreakpointLimit:
+    @pytest.mark.parametrize(
+        ("model", "limit"),
+        [("anthropic/claude-sonnet-4", 4), ("openai/gpt-5", 0), ("", 0)],
+    )
+    def test_by_model(self, model, limit):
+        assert breakpoint_limit(model) == limit
+
+
+class TestCachePlanner:
+    def test_first_request_marks_the_last_messages(self):
+        assert CachePlanner().plan(messages(*"abcde"), 3) == {2, 3, 4}
+
+    def test_marks_end_of_previous_request(self):
+        planner = CachePlanner()
+        planner.plan(messages(*"abcde"), 3)
+        # A long paste means the previous end is far from the new last message
+        assert planner.plan(messages(*"abcdefghij"), 3) == {4, 8, 9}
+
+    def test_post_process_shares_the_turn_prefix(self):
+        planner = CachePlanner()
+        planner.plan(messages(*"abcd"), 3)
+        assert 3 in planner.plan(messages(*"abcdXY"), 3)
+
+    def test_retry_after_post_process(self):
+        planner = CachePlanner()
+        planner.plan(messages(*"abcd"), 3)
+        planner.plan(messages(*"abcdXY"), 3)
+        assert planner.plan(messages(*"abcd"), 3) == {1, 2, 3}
+
+    def test_edited_history_falls_back_to_last_messages(self):
+        planner = CachePlanner()
+        planner.plan(messages(*"abcde"), 3)
+        assert planner.plan(messages(*"zbcdef"), 3) == {3, 4, 5}
+
+    @pytest.mark.parametrize("slots", [0, 1, 2])
+    def test_respects_slots(self, slots):
+        planner = CachePlanner()
+        planner.plan(messages(*"abc"), 3)
+        planner.plan(messages(*"abcdef"), 3)
+        assert len(planner.plan(messages(*"abcdefghi"), slots)) == slots
+
+    def test_fewer_messages_than_slots(self):
+        assert CachePlanner().plan(messages("a"), 3) == {0}
+        assert CachePlanner().plan([], 3) == set()
+
+
+class TestCacheHitRate:
+    def test_empty(self):
+        assert CacheHitRate().last is None
+        assert CacheHitRate().overall is None
+
+    def test_overall_is_weighted_by_prompt_size(self):
+        rates = CacheHitRate()
+        rates.record(0, 1000)
+        rates.record(900, 1000)
+        rates.record(0, 0)
+        assert rates.last == 0.9
+        assert rates.overall == 0.45
+        assert rates.turns == 2
+
+    def test_keeps_recent_turns(self):
+        rates = CacheHitRate(max_turns=2)
+        for cached in [0, 50, 100]:
+            rates.record(cached, 100)
+        assert rates.overall == 0.75
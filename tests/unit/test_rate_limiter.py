@@ -0,0 +1,61 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from src.rate_limiter import RateLimiter
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_burst_passes_without_waiting():
+    limiter = RateLimiter(requests_per_second=1, burst=3, max_in_flight=3)
+    with patch("asyncio.sleep") as sleep:
+        for _ in range(3):
+            async with limiter.slot(["m"]):
+                pass
+    sleep.assert_not_called()
+
+
+async def test_waits_for_tokens_after_burst():
+    limiter = RateLimiter(requests_per_second=100, burst=1)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    for _ in range(3):
+        async with limiter.slot(["m"]):
+            pass
+    assert loop.time() - started >= 0.015
+
+
+async def test_limits_requests_in_flight():
+    limiter = RateLimiter(requests_per_second=1000, burst=10, max_in_flight=2)
+    active = peak = 0
+
+    async def request() -> None:
+        nonlocal active, peak
+        async with limiter.slot(["m"]):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.gather(*(request() for _ in range(6)))
+    assert peak == 2
+
+
+async def test_acquires_all_keys_or_none():
+    limiter = RateLimiter(requests_per_second=1000, burst=10, max_in_flight=1)
+    async with limiter.slot(["key"]):
+        assert limiter._try_acquire(["model", "key"]) > 0
+    assert "model" not in limiter._state
+    async with limiter.slot(["model", "key"]):
+        assert limiter._state["model"][2] == limiter._state["key"][2] == 1
+    assert limiter._state["key"][2] == 0
+
+
+async def test_releases_slot_on_error():
+    limiter = RateLimiter(max_in_flight=1)
+    with pytest.raises(RuntimeError):
+        async with limiter.slot(["m"]):
+            raise RuntimeError
+    assert limiter._state["m"][2] == 0
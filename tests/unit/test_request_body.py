@@ -0,0 +1,99 @@
+import json
+
+from src.request_body import (
+    PLACEHOLDER_NONCE,
+    AttachmentLoader,
+    Base64Cache,
+    RequestBody,
+)
+
+
+class TestAttachmentLoader:
+    def test_returns_placeholder_for_base64_contents(self, fs):
+        fs.create_file("/data/image.png", contents=b"\x89PNG")
+        loader = AttachmentLoader("/data")
+        placeholder = loader("image.png")
+        assert loader.attachments == {placeholder.encode(): b"iVBORw=="}
+
+    def test_placeholder_changes_with_file(self, fs):
+        fs.create_file("/data/image.png", contents=b"\x89PNG")
+        loader = AttachmentLoader("/data")
+        before = loader("image.png")
+        assert loader("image.png") == before
+        fs.remove("/data/image.png")
+        fs.create_file("/data/image.png", contents=b"\x89PNG!")
+        assert loader("image.png") != before
+
+
+class TestRequestBody:
+    def test_encode_splices_attachments(self, fs):
+        fs.create_file("/data/image.png", contents=b"\x89PNG")
+        loader = AttachmentLoader("/data")
+        url = f"data:image/png;base64,{loader('image.png')}"
+        body = RequestBody({"messages": [{"url": url}]}, loader.attachments)
+
+        assert json.loads(body.encode()) == {
+            "messages": [{"url": "data:image/png;base64,iVBORw=="}]
+        }
+
+    def test_encode_leaves_other_placeholders_in_text(self, fs):
+        fs.create_file("/data/image.png", contents=b"\x89PNG")
+        loader = AttachmentLoader("/data")
+        url = f"data:image/png;base64,{loader('image.png')}"
+        texts = [
+            f"@attachment:{'0' * 32}@",
+            f"@attachment:{PLACEHOLDER_NONCE}:{'0' * 32}@",
+        ]
+        data = {"messages": [{"url": url}, *({"content": t} for t in texts)]}
+        body = RequestBody(data, loader.attachments)
+
+        messages = json.loads(body.encode())["messages"]
+        assert [m["content"] for m in messages[1:]] == texts
+
+    def test_encode_is_reused(self):
+        body = RequestBody({"model": "m"})
+        assert body.encode() is body.encode()
+
+    def test_replace_keeps_attachments(self):
+        body = RequestBody({"model": "m"}, {b"@attachment:x@": b"data"})
+        replaced = body.replace({"model": "n"})
+        assert replaced.get("model") == "n"
+        assert replaced.attachments is body.attachments
+
+    def test_digest_ignores_key_order(self):
+        first = RequestBody({"model": "m", "messages": []})
+        second = RequestBody({"messages": [], "model": "m"})
+        assert first.digest() == second.digest()
+
+
+class TestBase64Cache:
+    def test_reuses_encoding_until_file_changes(self, fs):
+        fs.create_file("/img.png", contents=b"\x89PNG")
+        cache = Base64Cache()
+        assert cache.get("/img.png", 1, 4) == b"iVBORw=="
+        fs.get_object("/img.png").set_contents(b"changed")
+        assert cache.get("/img.png", 1, 4) == b"iVBORw=="
+        assert cache.get("/img.png", 2, 7) == b"Y2hhbmdlZA=="
+        assert (cache.hits, cache.misses) == (1, 2)
+        assert cache.size == len(b"Y2hhbmdlZA==")
+
+    def test_evicts_least_recently_used_over_max_bytes(self, fs):
+        for name in "abc":
+            fs.create_file(f"/{name}", contents=b"123")  # Encodes to 4 bytes
+        cache = Base64Cache(max_bytes=8)
+        cache.get("/a", 0, 3)
+        cache.get("/b", 0, 3)
+        cache.get("/a", 0, 3)
+        cache.get("/c", 0, 3)
+
+        assert cache.size == 8
+        cache.get("/a", 0, 3)
+        assert cache.hits == 2
+        cache.get("/b", 0, 3)
+        assert cache.misses == 4
+
+    def test_hit_rate(self):
+        cache = Base64Cache()
+        assert cache.hit_rate is None
+        cache.hits, cache.misses = 3, 1
+        assert cache.hit_rate == 0.75
@@ -0,0 +1,66 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from src.response_cache import ResponseCache
+
+RESPONSE = {"choices": [{"message": {"content": "cleaned"}}]}
+
+
+@pytest.fixture
+def cache(fs):  # noqa: ARG001
+    return ResponseCache("/cache", max_bytes=1000, ttl=60)
+
+
+def test_returns_stored_response(cache):
+    cache.put("abc", RESPONSE)
+    assert cache.get("abc") == RESPONSE
+    assert cache.hits == 1
+
+
+def test_miss_for_unknown_key(cache):
+    assert cache.get("missing") is None
+    assert cache.misses == 1
+
+
+@pytest.mark.parametrize("entry", ['{"response": {}}', "[]", '{"created_at": "x"}'])
+def test_malformed_entries_are_misses(cache, entry):
+    os.makedirs("/cache")
+    with open("/cache/abc.json", "w") as f:
+        f.write(entry)
+    assert cache.get("abc") is None
+    assert cache.misses == 1
+
+
+def test_expired_entries_are_removed(cache):
+    with patch("src.response_cache.time.time", return_value=0):
+        cache.put("abc", RESPONSE)
+    with patch("src.response_cache.time.time", return_value=61):
+        assert cache.get("abc") is None
+    assert not os.path.exists("/cache/abc.json")
+
+
+def test_evicts_least_recently_used_beyond_size_limit(cache):
+    large = {"content": "x" * 400}
+    cache.put("old", large)
+    cache.put("used", large)
+    os.utime("/cache/old.json", (1, 1))
+    os.utime("/cache/used.json", (2, 2))
+    cache.get("used")  # Marks it as most recently used
+    cache.put("new", large)
+
+    assert cache.get("old") is None
+    assert cache.get("used") == large
+    assert cache.get("new") == large
+
+
+def test_purge_removes_everything(cache):
+    cache.put("a", RESPONSE)
+    cache.put("b", RESPONSE)
+    assert cache.purge() == 2
+    assert cache.get("a") is None
+
+
+def test_purge_without_directory(cache):
+    assert cache.purge() == 0
@@ -1,6 +1,14 @@
+from unittest.mock import patch
+
 import pytest
 
-from src.response_transform import Pattern, strip_tags, transform_response
+from src.response_transform import (
+    Pattern,
+    strip_partial_tags,
+    strip_tags,
+    transform_partial,
+    transform_response,
+)
 
 
 def test_raises_when_required_tag_missing():
@@ -33,3 +41,18 @@ def test_apply_patterns():
 
 def test_strip_tags_with_no_tags():
     assert strip_tags("plain text") == "plain text"
+
+
+def test_strip_partial_tags_hides_unclosed_block():
+    assert strip_partial_tags("Hi <thinking>still going") == "Hi"
+
+
+def test_strip_partial_tags_hides_incomplete_tag():
+    assert strip_partial_tags("<thinking>done</thinking>Hello <respo") == "Hello"
+
+
+def test_transform_partial_applies_patterns_without_notifying():
+    patterns = [Pattern("Alice", "Bob", notify="Matched")]
+    with patch("src.response_transform.notifications.send") as send:
+        assert transform_partial("Hi Alice <thinking>still", patterns) == "Hi Bob"
+    send.assert_not_called()
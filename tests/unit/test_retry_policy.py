@@ -0,0 +1,141 @@
+import time
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from src.retry_policy import APIError, CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+def status_error(status: int, headers: dict[str, str] | None = None) -> Exception:
+    request = httpx.Request("POST", "https://example.com")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+class Failing:
+    def __init__(self, *errors: Exception) -> None:
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture(autouse=True)
+def sleep():
+    with patch("asyncio.sleep", new_callable=AsyncMock) as sleep:
+        yield sleep
+
+
+class TestRetryDelay:
+    @pytest.mark.parametrize("status", [400, 401, 403, 404])
+    def test_client_errors_are_not_retried(self, status):
+        assert RetryPolicy().retry_delay(status_error(status), 1) is None
+
+    def test_content_errors_are_not_retried(self):
+        error = APIError({"message": "flagged", "code": 403})
+        assert RetryPolicy().retry_delay(error, 1) is None
+
+    def test_honours_retry_after_seconds(self):
+        error = status_error(429, {"Retry-After": "7"})
+        assert RetryPolicy().retry_delay(error, 1) == 7.0
+
+    def test_honours_retry_after_date(self):
+        error = status_error(503, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        assert RetryPolicy().retry_delay(error, 1) == 0.0
+
+    def test_gives_up_when_retry_after_is_too_long(self):
+        error = status_error(429, {"Retry-After": "3600"})
+        assert RetryPolicy(max_retry_after=60).retry_delay(error, 1) is None
+
+    def test_backs_off_exponentially_without_retry_after(self):
+        policy = RetryPolicy(base_delay=1, max_delay=30)
+        assert 0 <= policy.retry_delay(status_error(502), 3) <= 4
+        assert 0 <= policy.retry_delay(httpx.ConnectError("refused"), 10) <= 30
+
+
+class TestCall:
+    @pytest.mark.asyncio
+    async def test_retries_transient_errors(self, sleep):
+        request = Failing(status_error(429, {"Retry-After": "2"}))
+        policy = RetryPolicy()
+        assert await policy.call("m", request) == "ok"
+        assert request.calls == 2
+        sleep.assert_awaited_once_with(2.0)
+        assert policy.stats()["m"] == {"retries": 1, "failures": 0, "circuit": "closed"}
+
+    @pytest.mark.asyncio
+    async def test_does_not_retry_bad_requests(self):
+        request = Failing(status_error(400))
+        with pytest.raises(httpx.HTTPStatusError):
+            await RetryPolicy().call("m", request)
+        assert request.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_tries(self):
+        request = Failing(*[status_error(500)] * 5)
+        with pytest.raises(httpx.HTTPStatusError):
+            await RetryPolicy(max_tries=3, failure_threshold=10).call("m", request)
+        assert request.calls == 3
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast(self):
+        policy = RetryPolicy(max_tries=2, failure_threshold=2)
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await policy.call("m", Failing(*[status_error(503)] * 2))
+
+        request = Failing()
+        with pytest.raises(CircuitOpenError, match="m is failing"):
+            await policy.call("m", request)
+        assert request.calls == 0
+        assert policy.stats()["m"]["circuit"] == "open"
+
+    @pytest.mark.asyncio
+    async def test_counts_one_failure_per_call(self):
+        policy = RetryPolicy(max_tries=3, failure_threshold=2)
+        with pytest.raises(httpx.HTTPStatusError):
+            await policy.call("m", Failing(*[status_error(503)] * 3))
+        assert policy.stats()["m"]["failures"] == 1
+        assert policy.stats()["m"]["circuit"] == "closed"
+
+    @pytest.mark.asyncio
+    async def test_rate_limits_do_not_open_circuit(self):
+        policy = RetryPolicy(max_tries=2, failure_threshold=1)
+        with pytest.raises(httpx.HTTPStatusError):
+            await policy.call("m", Failing(*[status_error(429)] * 2))
+        assert policy.stats()["m"] == {"retries": 1, "failures": 0, "circuit": "closed"}
+
+    @pytest.mark.asyncio
+    async def test_circuit_is_per_model(self):
+        policy = RetryPolicy(max_tries=1, failure_threshold=1)
+        with pytest.raises(httpx.HTTPStatusError):
+            await policy.call("a", Failing(status_error(503)))
+        assert await policy.call("b", Failing()) == "ok"
+
+
+class TestCircuitBreaker:
+    def test_half_open_after_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        assert breaker.state == "half-open"
+        breaker.check("m")
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        breaker._opened_at = time.monotonic() - 61
+        breaker.failures = 3
+        assert breaker.state == "half-open"
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+    def test_success_closes(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+        breaker.record_failure()
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.failures == 0
@@ -1,8 +1,11 @@
+import asyncio
 import os
 from unittest.mock import AsyncMock, patch
 
+import httpx
 import pytest
 
+from src.lm_executors import chat_executor
 from src.message import Message
 from src.simulacrum import Generation, Simulacrum
 from src.yaml_config import yaml
@@ -261,6 +264,51 @@ class TestChat:
         assert "<document>\ndoc2\n</document>" in user_msg.content
 
 
+class TestDisplayPartial:
+    @pytest.fixture
+    def context_data(self, context_data):
+        context_data["transform_patterns"] = [
+            {"pattern": r"\*\*(.*?)\*\*", "replacement": r"\1"}
+        ]
+        return context_data
+
+    def test_response_patterns_are_applied(self, sim):
+        shown: list[str] = []
+        callback = sim._display_partial(shown.append)
+        assert callback
+        for content in ["Hi **there", "Hi **there**", "Hi **there** <thinking>"]:
+            callback(content)
+
+        assert shown == ["Hi **there", "Hi there"]
+
+
+class TestCost:
+    @pytest.mark.asyncio
+    async def test_double_retry_is_charged_once(self, sim, httpx_mock):
+        async def respond(_request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.01)
+            return httpx.Response(
+                200,
+                json={
+                    "choices": [
+                        {"message": {"content": "Again"}, "finish_reason": "stop"}
+                    ],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "cost": 1.0},
+                },
+            )
+
+        httpx_mock.add_callback(respond)
+
+        with patch.object(chat_executor, "RequestRecorder"):
+            await asyncio.gather(sim.retry(), sim.retry())
+
+        assert len(httpx_mock.get_requests()) == 1
+        with open("conversations/test_0.yml") as f:  # noqa: ASYNC230
+            assert yaml.load(f)["cost"] == 1.0
+        with open("context.state.yml") as f:  # noqa: ASYNC230
+            assert yaml.load(f)["total_cost"] == 1.0
+
+
 class TestSyncBook:
     def test_appends_book_content_with_bookmark(self, book_sim):
         chunk, progress = book_sim.sync_book("hero sets out")
@@ -0,0 +1,178 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from src.single_flight import SingleFlight
+
+pytestmark = pytest.mark.asyncio
+
+
+class Upstream:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await self.release.wait()
+        return f"result {self.calls}"
+
+
+async def test_concurrent_identical_calls_share_one_result():
+    flights = SingleFlight()
+    upstream = Upstream()
+    first = asyncio.create_task(flights.run("key", upstream))
+    second = asyncio.create_task(flights.run("key", upstream))
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    assert await asyncio.gather(first, second) == ["result 1", "result 1"]
+    assert upstream.calls == 1
+    assert (flights.hits, flights.misses) == (1, 1)
+
+
+async def test_different_keys_are_not_shared():
+    flights = SingleFlight()
+    upstream = Upstream()
+    upstream.release.set()
+
+    await asyncio.gather(flights.run("a", upstream), flights.run("b", upstream))
+
+    assert upstream.calls == 2
+    assert flights.misses == 2
+
+
+async def test_completed_calls_are_not_reused():
+    flights = SingleFlight()
+    upstream = Upstream()
+    upstream.release.set()
+
+    await flights.run("key", upstream)
+    await flights.run("key", upstream)
+
+    assert upstream.calls == 2
+    assert flights.in_flight == 0
+
+
+async def test_errors_are_shared():
+    flights = SingleFlight()
+
+    async def fail() -> None:
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream failed")
+
+    results = await asyncio.gather(
+        flights.run("key", fail), flights.run("key", fail), return_exceptions=True
+    )
+
+    assert [str(r) for r in results] == ["upstream failed", "upstream failed"]
+
+
+async def test_cancelled_caller_does_not_cancel_others():
+    flights = SingleFlight()
+    upstream = Upstream()
+    first = asyncio.create_task(flights.run("key", upstream))
+    second = asyncio.create_task(flights.run("key", upstream))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    assert await second == "result 1"
+
+
+async def test_upstream_cancelled_when_every_caller_gives_up():
+    flights = SingleFlight()
+    upstream = Upstream()
+    caller = asyncio.create_task(flights.run("key", upstream))
+    await asyncio.sleep(0)
+    caller.cancel()
+    await asyncio.gather(caller, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert flights.in_flight == 0
+
+
+class Feed:
+    """Yields items as they are put, until None."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.closed = False
+        self.items: asyncio.Queue[int | None] = asyncio.Queue()
+
+    async def __call__(self) -> AsyncGenerator[int]:
+        self.calls += 1
+        try:
+            while (item := await self.items.get()) is not None:
+                yield item
+        finally:
+            self.closed = True
+
+    def put(self, *items: int | None) -> None:
+        for item in items:
+            self.items.put_nowait(item)
+
+
+async def read(flights: SingleFlight, key: str, feed: Feed) -> list:
+    return [item async for item in flights.stream(key, feed)]
+
+
+class TestStream:
+    async def test_concurrent_identical_streams_share_one_call(self):
+        flights = SingleFlight()
+        feed = Feed()
+        first = asyncio.create_task(read(flights, "key", feed))
+        second = asyncio.create_task(read(flights, "key", feed))
+        feed.put(0, 1, 2, None)
+
+        assert await asyncio.gather(first, second) == [[0, 1, 2], [0, 1, 2]]
+        assert feed.calls == 1
+        assert (flights.hits, flights.misses) == (1, 1)
+        assert flights.in_flight == 0
+
+    async def test_late_callers_get_the_items_so_far(self):
+        flights = SingleFlight()
+        feed = Feed()
+        first = flights.stream("key", feed)
+        feed.put(0)
+        assert await anext(first) == 0
+
+        second = flights.stream("key", feed)
+        assert await anext(second) == 0
+        feed.put(1, None)
+        assert [item async for item in first] == [1]
+        assert [item async for item in second] == [1]
+
+    async def test_errors_are_shared_after_the_items_before_them(self):
+        flights = SingleFlight()
+
+        async def fail() -> AsyncGenerator[int]:
+            yield 1
+            raise RuntimeError("upstream failed")
+
+        first = flights.stream("key", fail)
+        second = flights.stream("key", fail)
+        for items in [first, second]:
+            assert await anext(items) == 1
+            with pytest.raises(RuntimeError, match="upstream failed"):
+                await anext(items)
+
+    async def test_call_closed_when_every_caller_stops(self):
+        flights = SingleFlight()
+        feed = Feed()
+        first = flights.stream("key", feed)
+        second = flights.stream("key", feed)
+        feed.put(0)
+        await anext(first)
+        await anext(second)
+
+        await first.aclose()
+        await asyncio.sleep(0)
+        assert not feed.closed
+        await second.aclose()
+        await asyncio.sleep(0)
+        assert feed.closed
+        await asyncio.sleep(0)
+        assert flights.in_flight == 0
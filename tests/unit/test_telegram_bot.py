@@ -1,3 +1,4 @@
+import asyncio
 from types import SimpleNamespace
 from typing import Any
 from unittest.mock import AsyncMock, patch
@@ -8,6 +9,7 @@ from src.cost_tracker import CostTracker
 from src.message import Message
 from src.simulacrum import Generation
 from src.telegram.telegram_bot import TelegramBot
+from src.telegram.telegram_context import TelegramContext
 
 pytestmark = pytest.mark.asyncio
 
@@ -15,9 +17,18 @@ pytestmark = pytest.mark.asyncio
 class FakeBotAPI:
     def __init__(self) -> None:
         self.sent: list[str] = []
+        self.edits: list[tuple[int, str]] = []
+        self.deleted: list[int] = []
 
-    async def send_message(self, _chat_id, text, **_kwargs) -> None:
+    async def send_message(self, _chat_id, text, **_kwargs) -> SimpleNamespace:
         self.sent.append(text)
+        return SimpleNamespace(message_id=len(self.sent))
+
+    async def edit_message_text(self, text, _chat_id, message_id, **_kwargs) -> None:
+        self.edits.append((message_id, text))
+
+    async def delete_message(self, _chat_id, message_id) -> None:
+        self.deleted.append(message_id)
 
     async def send_chat_action(self, **_kwargs) -> None:
         pass
@@ -184,6 +195,72 @@ class TestConversationGuards:
         assert sent[0].startswith("`❌")
 
 
+class TestStreamingChat:
+    @pytest.fixture(autouse=True)
+    def no_edit_interval(self):
+        with patch.object(TelegramContext, "STREAM_EDIT_INTERVAL", 0):
+            yield
+
+    async def test_edits_the_first_message_as_text_arrives(self, bot, sent):
+        async def generate(**kwargs):
+            kwargs["on_partial"]("Hel")
+            kwargs["on_partial"]("Hello the")
+            return Generation("Hello there (waves)", "Hello there (waves)")
+
+        with patch.object(bot.sim, "_generate", side_effect=generate):
+            await bot.chat_message_handler(command("Hi"), None)
+
+        edits = bot.app.bot.edits
+        assert sent == ["Hel"]
+        assert edits == [(1, "Hello the"), (1, "Hello there _(waves)_")]
+
+    async def test_removes_partial_messages_when_superseded(self, bot, sent):
+        async def generate(**kwargs):
+            kwargs["on_partial"]("Partial")
+            bot.sim.context._session_version += 1
+            return Generation("Done", "Done")
+
+        with patch.object(bot.sim, "_generate", side_effect=generate):
+            await bot.chat_message_handler(command("Hi"), None)
+
+        assert sent == ["Partial"]
+        assert bot.app.bot.deleted == [1]
+
+    async def test_removes_partial_messages_when_the_reply_fails(self, bot, sent):
+        async def generate(**kwargs):
+            kwargs["on_partial"]("Part")
+            kwargs["on_partial"]("Partial")
+            raise RuntimeError("Response was empty")
+
+        with (
+            patch.object(bot.sim, "_generate", side_effect=generate),
+            pytest.raises(RuntimeError, match="Response was empty"),
+        ):
+            await bot.chat_message_handler(command("Hi"), None)
+
+        assert sent == ["Part"]
+        assert bot.app.bot.deleted == [1]
+
+    async def test_removes_partial_messages_when_cancelled(self, bot, sent):
+        shown = asyncio.Event()
+
+        async def generate(**kwargs):
+            kwargs["on_partial"]("Part")
+            kwargs["on_partial"]("Partial")
+            await asyncio.sleep(0)
+            shown.set()
+            await asyncio.Event().wait()
+
+        with patch.object(bot.sim, "_generate", side_effect=generate):
+            chat = asyncio.create_task(bot.chat_message_handler(command("Hi"), None))
+            await shown.wait()
+            chat.cancel()
+            await asyncio.gather(chat, return_exceptions=True)
+
+        assert sent == ["Part"]
+        assert bot.app.bot.deleted == [1]
+
+
 class TestErrorHandler:
     async def test_redacts_the_bot_token(self, bot, sent):
         error = RuntimeError(f"Request to bot{bot._token} failed")
@@ -0,0 +1,30 @@
+import os
+from unittest.mock import patch
+
+from jinja2 import DictLoader, Environment
+
+from src.template_cache import BytecodeCache
+
+
+def environment() -> Environment:
+    return Environment(
+        loader=DictLoader({"greeting.j2": "Hello, {{ name }}!"}),
+        bytecode_cache=BytecodeCache("test"),
+    )
+
+
+def test_reuses_bytecode_across_environments(fs):  # noqa: ARG001
+    environment().get_template("greeting.j2")
+    env = environment()
+    with patch.object(env, "compile", wraps=env.compile) as compile:
+        template = env.get_template("greeting.j2")
+    assert template.render(name="World") == "Hello, World!"
+    compile.assert_not_called()
+
+
+def test_unwritable_cache_only_recompiles(fs):
+    directory = BytecodeCache("test").directory
+    fs.create_file(directory)  # A file where the directory should be
+    template = environment().get_template("greeting.j2")
+    assert template.render(name="World") == "Hello, World!"
+    assert os.path.isfile(directory)
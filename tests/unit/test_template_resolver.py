@@ -1,5 +1,11 @@
+import os
+import random
+import re
+from unittest.mock import patch
+
 import pytest
 
+from src import template_resolver
 from src.template_resolver import TemplateResolver
 
 
@@ -23,6 +29,81 @@ def test_resolves_chained_variables():
     assert result["a"] == "final"
 
 
+def test_renders_each_key_once():
+    data = {"a": "{{ b }}+{{ c }}", "b": "{{ c }}!", "c": "{{ name }}"}
+    compile = template_resolver._compile
+    with patch.object(template_resolver, "_compile", wraps=compile) as compiled:
+        result = dict(TemplateResolver("/").resolve(data, {"name": "C"}))
+    assert result["a"] == "C!+C"
+    sources = [call.args[0] for call in compiled.call_args_list]
+    assert sorted(sources) == sorted(data.values())
+
+
+def test_renders_keys_on_first_access():
+    data = {"a": "{{ b }}", "b": "B {{ name }}", "c": "{{ name }}"}
+    compile = template_resolver._compile
+    with patch.object(template_resolver, "_compile", wraps=compile) as compiled:
+        result = TemplateResolver("/").resolve(data, {"name": "C"})
+        assert compiled.call_count == 0
+        assert result["a"] == "B C"
+        assert result["a"] == "B C"
+    assert [call.args[0] for call in compiled.call_args_list] == [
+        "{{ b }}",
+        "B {{ name }}",
+    ]
+
+
+def test_renders_templates_that_render_to_templates():
+    data = {"a": "{{ b }}", "b": "{{ '{{ c }}' }}", "c": "C"}
+    assert TemplateResolver("/").resolve(data, {})["a"] == "C"
+
+
+def test_reports_cycles():
+    data = {"a": "{{ b }}", "b": "x {{ c }}", "c": "{{ a if flag else '' }}"}
+    with pytest.raises(ValueError, match="Template cycle: a -> b -> c -> a"):
+        TemplateResolver("/").resolve(data, {"flag": True})["a"]
+
+
+def test_reports_cycles_through_files(fs):
+    fs.create_file("/templates/part.md", contents="{{ b }}")
+    data = {"a": "{{ load_string('part.md') }}", "b": "{{ a }}"}
+    with pytest.raises(ValueError, match="Template cycle: a -> b -> a"):
+        TemplateResolver("/templates").resolve(data, {})["a"]
+
+
+def test_values_read_siblings_in_the_same_key():
+    data = {"prompts": {"b": "{{ prompts.a }}-y", "a": "{{ name }}", "c": "x"}}
+    result = TemplateResolver("/").resolve(data, {"name": "x"})
+    assert result["prompts"] == {"b": "x-y", "a": "x", "c": "x"}
+
+
+def test_values_read_keys_that_read_their_key_back():
+    data = {
+        "char": {"intro": "{{ char.name }} {{ greeting }}", "name": "Ann"},
+        "greeting": "Hi {{ char.name }}",
+    }
+    result = TemplateResolver("/").resolve(data, {})
+    assert result["char"]["intro"] == "Ann Hi Ann"
+    assert result["greeting"] == "Hi Ann"
+
+
+def test_reports_cycles_between_values():
+    data = {"char": {"intro": "{{ greeting }}"}, "greeting": "{{ char.intro }}"}
+    cycle = "Template cycle: char.intro -> greeting -> char.intro"
+    with pytest.raises(ValueError, match=re.escape(cycle)):
+        TemplateResolver("/").resolve(data, {})["char"]
+
+
+def test_key_read_by_a_file_loads_relative_to_base(fs):
+    fs.create_file("/t/sub/inner.md", contents="{{ b }}")
+    fs.create_file("/t/local.md", contents="local")
+    data = {
+        "a": "{{ load_string('sub/inner.md') }}",
+        "b": "{{ load_string('local.md') }}",
+    }
+    assert TemplateResolver("/t").resolve(data, {})["a"] == "local"
+
+
 def test_resolves_nested_structures():
     resolver = TemplateResolver("/")
     data = {"outer": {"inner": "{{ value }}"}, "items": ["{{ value }}", "static"]}
@@ -74,3 +155,134 @@ def test_load_string_empty_output_returns_empty_string(fs):
     data = {"content": "x{{ load_string('empty.j2') }}"}
     result = resolver.resolve(data, {})
     assert result["content"] == "x"
+
+
+def test_loaded_template_compiles_once_until_changed(fs):
+    path = "/templates/compiled_once.j2"
+    fs.create_file(path, contents="Hello, {{ name }}!")
+    data = {"content": "{{ load_string('compiled_once.j2') }}"}
+    env = template_resolver._env
+    with patch.object(env, "compile", wraps=env.compile) as compile:
+
+        def file_compiles():
+            return sum(call.args[1:2] == (path,) for call in compile.call_args_list)
+
+        for _ in range(3):
+            dict(TemplateResolver("/templates").resolve(data, {"name": "World"}))
+        assert file_compiles() == 1
+
+        fs.get_object(path).set_contents("Hi!")
+        os.utime(path, (1, 1))
+        result = dict(TemplateResolver("/templates").resolve(data, {"name": "World"}))
+
+    assert result["content"] == "Hi!"
+    assert file_compiles() == 2
+
+
+def test_inline_template_compiles_once():
+    data = {"content": "Compiled once, {{ name }}"}
+    env = template_resolver._env
+    with patch.object(env, "compile", wraps=env.compile) as compile:
+        for name in ["Alice", "Bob"]:
+            result = dict(TemplateResolver("/").resolve(data, {"name": name}))
+    assert result["content"] == "Compiled once, Bob"
+    assert compile.call_count == 1
+
+
+class TestIncrementalResolve:
+    @pytest.fixture
+    def rendered(self):
+        compile = template_resolver._compile
+        with patch.object(template_resolver, "_compile", wraps=compile) as compiled:
+            yield lambda: [call.args[0] for call in compiled.call_args_list]
+
+    def test_rerenders_only_keys_reading_a_changed_variable(self, rendered):
+        resolver = TemplateResolver("/")
+        data = {"mood": "Mood: {{ vars.mood }}", "intro": "Name: {{ name }}"}
+        dict(resolver.resolve(data, {"name": "Alice", "vars": {"mood": "calm"}}))
+        result = dict(
+            resolver.resolve(data, {"name": "Alice", "vars": {"mood": "happy"}})
+        )
+        assert result == {
+            "mood": "Mood: happy",
+            "intro": "Name: Alice",
+            "name": "Alice",
+            "vars": {"mood": "happy"},
+        }
+        assert rendered().count("Mood: {{ vars.mood }}") == 2
+        assert rendered().count("Name: {{ name }}") == 1
+
+    def test_rerenders_keys_reading_a_rerendered_key(self):
+        resolver = TemplateResolver("/")
+        data = {"a": "{{ b }}!", "b": "{{ vars.x }}"}
+        dict(resolver.resolve(data, {"vars": {"x": 1}}))
+        assert resolver.resolve(data, {"vars": {"x": 2}})["a"] == "2!"
+
+    def test_returns_the_last_result_when_nothing_changed(self):
+        resolver = TemplateResolver("/")
+        data = {"a": "{{ b }}", "b": "B"}
+        assert resolver.resolve(data, {}) is resolver.resolve(data, {})
+
+    def test_rerenders_keys_loading_a_changed_file(self, fs, rendered):
+        fs.create_file("/templates/part.md", contents="first")
+        resolver = TemplateResolver("/templates")
+        data = {"a": "{{ load_string('part.md') }}", "b": "{{ name }}"}
+        dict(resolver.resolve(data, {"name": "Alice"}))
+        with open("/templates/part.md", "w") as f:
+            f.write("second")
+        os.utime("/templates/part.md", (1, 1))
+        assert resolver.resolve(data, {"name": "Alice"})["a"] == "second"
+        assert rendered().count("{{ name }}") == 1
+
+    def test_matches_a_full_resolve(self, fs):
+        fs.create_file("/t/inner.j2", contents="A{{ vars.x }}")
+        fs.create_file(
+            "/t/outer.j2", contents="{{ load_string('inner.j2') }}-{{ name }}"
+        )
+        data = {
+            "name": "N",
+            "greet": "Hi {{ name }}",
+            "chain": "{{ greet }} / {{ last }}",
+            "last": "{{ memories[-1] if memories else 'none' }}",
+            "file": "{{ load_string('outer.j2') }}",
+            "cond": "{% if vars.flag %}{{ greet }}{% else %}{{ last }}{% endif %}",
+            "nested": {"list": ["{{ vars.x }}", "static"], "n": 3},
+            "prompts": {"a": "{{ greet }}", "b": "{{ prompts.a }}-y"},
+            "char": {"intro": "{{ char.name }} {{ greeting }}", "name": "{{ name }}"},
+            "greeting": "Hi {{ char.name }}",
+        }
+        extra = {"memories": [], "vars": {"x": 0, "flag": False}}
+        rng = random.Random(0)
+
+        def change(step: int) -> None:
+            kind = rng.randrange(6)
+            if kind == 0:
+                extra["vars"]["x"] = step
+            elif kind == 1:
+                extra["vars"]["flag"] = not extra["vars"]["flag"]
+            elif kind == 2:
+                extra["memories"] = [*extra["memories"], f"m{step}"]
+            elif kind == 3:
+                data["name"] = f"N{step}"
+            elif kind == 4 and "extra" in data:
+                del data["extra"]
+            elif kind == 4:
+                data["extra"] = "{{ greet }}+"
+            else:
+                _rewrite("/t/inner.j2", f"B{step} {{{{ vars.x }}}}", step)
+
+        resolver = TemplateResolver("/t")
+        for step in range(40):
+            change(step)
+            expected = dict(TemplateResolver("/t").resolve(data, extra))
+            result = resolver.resolve(data, extra)
+            # Some keys are left unread, to be rendered by a later resolve
+            for key in rng.sample(sorted(expected), k=rng.randrange(len(expected))):
+                assert result[key] == expected[key], key
+        assert dict(resolver.resolve(data, extra)) == expected
+
+
+def _rewrite(path: str, contents: str, mtime: int) -> None:
+    with open(path, "w") as f:
+        f.write(contents)
+    os.utime(path, (mtime + 10, mtime + 10))  # Jinja reloads by mtime
@@ -0,0 +1,84 @@
+from unittest.mock import patch
+
+import pytest
+import tiktoken
+
+from src import token_counter
+from src.message import Message
+from src.token_counter import (
+    IMAGE_TOKENS,
+    TokenCounter,
+    count_message,
+    count_tokens,
+    get_counter,
+    set_counter,
+)
+
+
+class WordCounter(TokenCounter):
+    name = "words"
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def count(self, text: str) -> int:
+        self.calls += 1
+        return len(text.split())
+
+
+class TestCountMessage:
+    def test_heuristic(self):
+        assert count_message(Message("user", "x" * 40)) == 10
+        assert count_tokens("x" * 40) == 10
+
+    def test_includes_images(self):
+        message = Message("user", "x" * 40, image="photo.jpg")
+        assert count_message(message) == 10 + IMAGE_TOKENS
+
+    def test_cached_in_metadata(self):
+        counter = WordCounter()
+        set_counter(counter)
+        message = Message("user", "one two three")
+        assert count_message(message) == 3
+        assert count_message(message) == 3
+        assert counter.calls == 1
+        assert message.to_dict()["metadata"]["tokens"]["count"] == 3
+
+    def test_cache_survives_reload(self):
+        message = Message("user", "one two three")
+        count_message(message)
+        counter = WordCounter()
+        set_counter(counter)
+        restored = Message.from_dict(message.to_dict())
+        count_message(restored)
+        count_message(restored)
+        assert counter.calls == 1
+
+    def test_recounted_when_content_changes(self):
+        message = Message("user", "one two three")
+        count_message(message)
+        message.content = "one two three four"
+        assert count_message(message) == 4
+
+    def test_recounted_with_another_counter(self):
+        message = Message("user", "one two three")
+        assert count_message(message) == 3
+        set_counter(WordCounter())
+        assert count_message(message) == 3
+        assert message.metadata["tokens"]["check"].startswith("words:")
+
+
+class TestDefaultCounter:
+    def test_tiktoken(self):
+        set_counter(None)
+        counter = get_counter()
+        assert type(counter) is token_counter.TiktokenCounter
+        assert counter.count("Hello there, how are you today?") == 8
+
+    @pytest.mark.parametrize(
+        "error", [OSError("Connection refused"), ValueError("Hash mismatch")]
+    )
+    def test_heuristic_when_encoding_unavailable(self, error):
+        set_counter(None)
+        with patch.object(tiktoken, "get_encoding", side_effect=error):
+            assert type(get_counter()) is TokenCounter
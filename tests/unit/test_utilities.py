@@ -4,8 +4,9 @@ import pytest
 
 from src.utilities import (
     extract_url_content,
-    make_base64_loader,
     merge_dicts,
+    overlay_dicts,
+    overlay_mapping,
     parse_pdf,
     parse_value,
 )
@@ -33,6 +34,34 @@ class TestMergeDicts:
         assert d2 == {"a": {"y": 2}}
 
 
+class TestOverlayDicts:
+    def test_merges_like_merge_dicts(self):
+        base = {"a": {"x": 1, "y": 2}, "b": [1]}
+        overrides = {"a": {"y": 3, "z": 4}, "c": 5}
+        assert overlay_dicts(base, overrides) == merge_dicts(base, overrides)
+
+    def test_shares_untouched_values(self):
+        base = {"a": {"x": 1}, "b": {"y": 2}}
+        result = overlay_dicts(base, {"a": {"x": 3}})
+        assert result["b"] is base["b"]
+        assert base == {"a": {"x": 1}, "b": {"y": 2}}
+
+
+class TestOverlayMapping:
+    def test_reads_only_overridden_keys(self):
+        read = []
+
+        class Base(dict):
+            def __getitem__(self, key):
+                read.append(key)
+                return super().__getitem__(key)
+
+        base = Base(a={"x": 1, "y": 2}, b="untouched")
+        result = overlay_mapping(base, {"a": {"y": 3}, "c": 4})
+        assert read == ["a"]
+        assert dict(result) == {"a": {"x": 1, "y": 3}, "b": "untouched", "c": 4}
+
+
 class TestParseValue:
     def test_true(self):
         assert parse_value("true") is True
@@ -100,10 +129,3 @@ class TestParsePdf:
         with patch("src.utilities.pdfplumber.open", return_value=ctx):
             result = parse_pdf(b"fake")
         assert result == "office"
-
-
-class TestMakeBase64Loader:
-    def test_loads_and_encodes_file(self, fs):
-        fs.create_file("/data/image.png", contents=b"\x89PNG")
-        loader = make_base64_loader("/data")
-        assert loader("image.png") == "iVBORw=="